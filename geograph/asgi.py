@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'geograph.settings')
+# The event loop lives as long as the process, so async HTTP clients can be pooled
+os.environ.setdefault('GEOIMPORTER_ASGI', '1')
 
 application = get_asgi_application()
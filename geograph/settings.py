@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,6 +59,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Reserves large upload bodies in the import scratch quota before they are read
+    'modules.GeoImporter.scratch.ScratchUploadMiddleware',
+    # No-op unless a request carries a signed profiling header or is sampled
+    'modules.GeoImporter.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'geograph.urls'
@@ -83,6 +88,24 @@ WSGI_APPLICATION = 'geograph.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection pooling (psycopg 3 pool, see
+# https://docs.djangoproject.com/en/5.2/ref/databases/#connection-pool)
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', '1') == '1'
+
+
+def _pool_options(prefix):
+    """psycopg_pool.ConnectionPool options for a database alias, read from <prefix>_* env vars"""
+    return {
+        'min_size': int(os.getenv(f'{prefix}_MIN_SIZE', '2')),
+        'max_size': int(os.getenv(f'{prefix}_MAX_SIZE', '20')),
+        # Recycle connections after this many seconds
+        'max_lifetime': float(os.getenv(f'{prefix}_MAX_LIFETIME', '1800')),
+        'max_idle': float(os.getenv(f'{prefix}_MAX_IDLE', '300')),
+        # Seconds to wait for a free connection before failing
+        'timeout': float(os.getenv(f'{prefix}_TIMEOUT', '10')),
+    }
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
@@ -91,6 +114,9 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'geograph'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'OPTIONS': {'pool': _pool_options('POSTGRES_POOL')} if DB_POOL_ENABLED else {},
+        # With a pool this checks every connection on checkout
+        'CONN_HEALTH_CHECKS': True,
     },
     'datastore': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
@@ -99,6 +125,9 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD_DATASTORE', 'geograph'),
         'HOST': os.getenv('POSTGRES_HOST_DATASTORE', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT_DATASTORE', '5432'),
+        'OPTIONS': {'pool': _pool_options('POSTGRES_POOL_DATASTORE')} if DB_POOL_ENABLED else {},
+        # With a pool this checks every connection on checkout
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -140,6 +169,10 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded and generated files (layer thumbnails)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -158,3 +191,102 @@ GEOSERVER_PASSWORD = os.getenv('GEOSERVER_PASSWORD', 'geoserver')
 GEOSERVER_WORKSPACE = os.getenv('GEOSERVER_WORKSPACE', 'geograph')
 GEOSERVER_DATASTORE = os.getenv('GEOSERVER_DATASTORE', 'geograph_datastore')
 
+
+# Shared GeoServer HTTP connection pool (async endpoints)
+GEOSERVER_HTTP_MAX_CONNECTIONS = int(os.getenv('GEOSERVER_HTTP_MAX_CONNECTIONS', '1000'))
+GEOSERVER_HTTP_MAX_KEEPALIVE = int(os.getenv('GEOSERVER_HTTP_MAX_KEEPALIVE', '100'))
+GEOSERVER_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('GEOSERVER_HTTP_KEEPALIVE_EXPIRY', '30'))
+GEOSERVER_HTTP_TIMEOUT = float(os.getenv('GEOSERVER_HTTP_TIMEOUT', '30'))
+# Set by geograph/asgi.py: async clients are pooled per event loop only under an ASGI server
+GEOIMPORTER_ASGI = os.getenv('GEOIMPORTER_ASGI', '0') == '1'
+
+# GeoServer Importer task tracking
+GEOSERVER_IMPORTER_POLL_MIN_INTERVAL = float(os.getenv('GEOSERVER_IMPORTER_POLL_MIN_INTERVAL', '1'))
+GEOSERVER_IMPORTER_POLL_MAX_INTERVAL = float(os.getenv('GEOSERVER_IMPORTER_POLL_MAX_INTERVAL', '60'))
+GEOSERVER_IMPORTER_POLL_MAX_AGE = int(os.getenv('GEOSERVER_IMPORTER_POLL_MAX_AGE', str(24 * 3600)))
+# Set to False when running `manage.py poll_geoserver_imports` as a dedicated worker
+GEOSERVER_IMPORTER_POLLER_IN_PROCESS = os.getenv('GEOSERVER_IMPORTER_POLLER_IN_PROCESS', '1') == '1'
+
+# Parallel partitioned loading of large shapefiles
+GEOIMPORTER_PARALLEL_MIN_FEATURES = int(os.getenv('GEOIMPORTER_PARALLEL_MIN_FEATURES', '1000000'))
+# 0 uses one ogr2ogr process per CPU core
+GEOIMPORTER_PARALLEL_WORKERS = int(os.getenv('GEOIMPORTER_PARALLEL_WORKERS', '0'))
+
+# Maximum wait for the table lock when swapping replaced layer data in
+GEOIMPORTER_SWAP_LOCK_TIMEOUT = os.getenv('GEOIMPORTER_SWAP_LOCK_TIMEOUT', '10s')
+
+# Rows fetched per round trip by server-side cursors (modules.GeoImporter.db)
+GEOIMPORTER_CURSOR_BATCH_SIZE = int(os.getenv('GEOIMPORTER_CURSOR_BATCH_SIZE', '5000'))
+
+# Schema catalog cache lifetime (entries are also keyed by table version)
+GEOIMPORTER_CATALOG_CACHE_TIMEOUT = int(os.getenv('GEOIMPORTER_CATALOG_CACHE_TIMEOUT', str(24 * 3600)))
+
+# Maximum features returned per spatial query page
+GEOIMPORTER_QUERY_MAX_LIMIT = int(os.getenv('GEOIMPORTER_QUERY_MAX_LIMIT', '1000'))
+
+# Layer attribute statistics
+GEOIMPORTER_STATS_ON_IMPORT = os.getenv('GEOIMPORTER_STATS_ON_IMPORT', '0') == '1'
+GEOIMPORTER_STATS_QUANTILES = int(os.getenv('GEOIMPORTER_STATS_QUANTILES', '5'))
+GEOIMPORTER_STATS_TOP_K = int(os.getenv('GEOIMPORTER_STATS_TOP_K', '10'))
+
+# Rows per Arrow record batch when bulk-loading FlatGeobuf/GeoPackage/GeoParquet with COPY
+GEOIMPORTER_COPY_BATCH_SIZE = int(os.getenv('GEOIMPORTER_COPY_BATCH_SIZE', '65536'))
+
+# Rows sampled to infer attribute types of uploaded CSVs
+GEOIMPORTER_CSV_SAMPLE_ROWS = int(os.getenv('GEOIMPORTER_CSV_SAMPLE_ROWS', '1000'))
+
+# Storage of new imports: 'table' (one table and layer each) or 'partitioned'
+# (list partitions of one shared table, published as one parameterized SQL view layer)
+GEOIMPORTER_STORAGE_MODE = os.getenv('GEOIMPORTER_STORAGE_MODE', 'table')
+GEOIMPORTER_SHARED_TABLE = os.getenv('GEOIMPORTER_SHARED_TABLE', 'geograph_features')
+GEOIMPORTER_SHARED_LAYER = os.getenv('GEOIMPORTER_SHARED_LAYER', 'geograph_features')
+
+# Layers with more estimated rows take their extent from ST_EstimatedExtent instead of a scan
+GEOIMPORTER_EXACT_EXTENT_MAX_ROWS = int(os.getenv('GEOIMPORTER_EXACT_EXTENT_MAX_ROWS', '1000000'))
+
+# Orphaned tables/layers are reaped once they have been orphaned this long (reap_orphans command)
+GEOIMPORTER_REAPER_GRACE_SECONDS = int(os.getenv('GEOIMPORTER_REAPER_GRACE_SECONDS', str(24 * 3600)))
+GEOIMPORTER_REAPER_BATCH_SIZE = int(os.getenv('GEOIMPORTER_REAPER_BATCH_SIZE', '50'))
+
+# Scratch space of the import pipeline: uploads and extracted archives live here
+# under a global byte quota shared by all workers; uploads that don't fit get 429
+GEOIMPORTER_SCRATCH_ROOT = os.getenv('GEOIMPORTER_SCRATCH_ROOT', '') or None
+GEOIMPORTER_SCRATCH_QUOTA_BYTES = int(os.getenv('GEOIMPORTER_SCRATCH_QUOTA_BYTES', str(20 * 1024 ** 3)))
+# Optional faster root (e.g. a tmpfs such as /dev/shm/geoimporter) for reservations up to FAST_MAX_BYTES
+GEOIMPORTER_SCRATCH_FAST_ROOT = os.getenv('GEOIMPORTER_SCRATCH_FAST_ROOT', '') or None
+GEOIMPORTER_SCRATCH_FAST_MAX_BYTES = int(os.getenv('GEOIMPORTER_SCRATCH_FAST_MAX_BYTES', str(64 * 1024 ** 2)))
+# Assumed uncompressed size of a zip relative to its size, corrected once the zip is opened
+GEOIMPORTER_SCRATCH_ZIP_EXPANSION = int(os.getenv('GEOIMPORTER_SCRATCH_ZIP_EXPANSION', '3'))
+GEOIMPORTER_SCRATCH_RETRY_AFTER = int(os.getenv('GEOIMPORTER_SCRATCH_RETRY_AFTER', '30'))
+# Uploads Django spools to disk are written under the scratch root too
+FILE_UPLOAD_TEMP_DIR = os.path.join(GEOIMPORTER_SCRATCH_ROOT or os.path.join(tempfile.gettempdir(), 'geoimporter'), 'uploads')
+
+# Import status long-polling: request limits, and the delay before the LISTEN connection reconnects
+GEOIMPORTER_STATUS_WAIT_MAX_SECONDS = float(os.getenv('GEOIMPORTER_STATUS_WAIT_MAX_SECONDS', '30'))
+GEOIMPORTER_STATUS_WAIT_MAX_IDS = int(os.getenv('GEOIMPORTER_STATUS_WAIT_MAX_IDS', '1000'))
+GEOIMPORTER_STATUS_LISTEN_RETRY_SECONDS = float(os.getenv('GEOIMPORTER_STATUS_LISTEN_RETRY_SECONDS', '5'))
+
+# Narrow attribute column types (numeric/text to int/float8/date/boolean) after each load unless the upload says otherwise
+GEOIMPORTER_NARROW_TYPES = os.getenv('GEOIMPORTER_NARROW_TYPES', '0') == '1'
+
+# Default grid in metres imported coordinates are snapped to (converted to degrees for geographic layers); unset keeps full precision
+GEOIMPORTER_SNAP_GRID = float(os.getenv('GEOIMPORTER_SNAP_GRID')) if os.getenv('GEOIMPORTER_SNAP_GRID') else None
+
+# Request profiling (ProfilingMiddleware): fraction of API requests sampled, header token lifetime,
+# profiles kept in the ring buffer, and SQL queries / GeoServer calls / functions kept per profile
+GEOIMPORTER_PROFILING_SAMPLE_RATE = float(os.getenv('GEOIMPORTER_PROFILING_SAMPLE_RATE', '0'))
+GEOIMPORTER_PROFILING_TOKEN_MAX_AGE = int(os.getenv('GEOIMPORTER_PROFILING_TOKEN_MAX_AGE', '3600'))
+GEOIMPORTER_PROFILING_MAX_PROFILES = int(os.getenv('GEOIMPORTER_PROFILING_MAX_PROFILES', '200'))
+GEOIMPORTER_PROFILING_MAX_QUERIES = int(os.getenv('GEOIMPORTER_PROFILING_MAX_QUERIES', '500'))
+GEOIMPORTER_PROFILING_TOP_FUNCTIONS = int(os.getenv('GEOIMPORTER_PROFILING_TOP_FUNCTIONS', '40'))
+GEOIMPORTER_PROFILING_PATH_PREFIX = os.getenv('GEOIMPORTER_PROFILING_PATH_PREFIX', '/api/geoimporter/')
+
+# Tiles per parallel worker the left layer extent is cut into when overlaying two imports
+GEOIMPORTER_OVERLAY_TILES_PER_WORKER = int(os.getenv('GEOIMPORTER_OVERLAY_TILES_PER_WORKER', '4'))
+
+# Layer thumbnails: rendered after each load (SVG side in pixels, features drawn at most),
+# and Cache-Control max-age of versioned thumbnail URLs
+GEOIMPORTER_THUMBNAILS_ON_IMPORT = os.getenv('GEOIMPORTER_THUMBNAILS_ON_IMPORT', '1') == '1'
+GEOIMPORTER_THUMBNAIL_SIZE = int(os.getenv('GEOIMPORTER_THUMBNAIL_SIZE', '256'))
+GEOIMPORTER_THUMBNAIL_MAX_FEATURES = int(os.getenv('GEOIMPORTER_THUMBNAIL_MAX_FEATURES', '5000'))
+GEOIMPORTER_THUMBNAIL_MAX_AGE = int(os.getenv('GEOIMPORTER_THUMBNAIL_MAX_AGE', str(365 * 24 * 3600)))
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import ShapefileImport
+from .models import ShapefileImport, GeoServerImportTask, OrphanCandidate, RequestProfile
 
 
 @admin.register(ShapefileImport)
@@ -10,12 +10,12 @@ class ShapefileImportAdmin(admin.ModelAdmin):
     """Admin interface for ShapefileImport model"""
     
     list_display = [
-        'id', 'name', 'table_name', 'status', 'created_at', 
+        'id', 'thumbnail_preview', 'name', 'table_name', 'status', 'created_at', 
         'published_to_geoserver', 'geoserver_layer_link', 'row_count'
     ]
     
     list_filter = [
-        'status', 'published_to_geoserver', 'created_at'
+        'status', 'source_format', 'storage_mode', 'published_to_geoserver', 'created_at'
     ]
     
     search_fields = [
@@ -23,24 +23,26 @@ class ShapefileImportAdmin(admin.ModelAdmin):
     ]
     
     readonly_fields = [
-        'id', 'created_at', 'table_name', 'file_path', 
-        'geoserver_layer', 'geoserver_wms_url', 'geoserver_wfs_url',
-        'table_info_display', 'wms_preview_link', 'wfs_preview_link'
+        'id', 'created_at', 'table_name', 'file_path', 'srid', 'keep_native_crs',
+        'source_format', 'source_bytes', 'load_seconds', 'storage_mode', 'extent', 'latlon_extent',
+        'narrow_types', 'narrowing_report', 'snap_grid', 'precision_report', 'geoserver_layer', 'geoserver_wms_url', 'geoserver_wfs_url',
+        'table_info_display', 'wms_preview_link', 'wfs_preview_link', 'thumbnail_preview'
     ]
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('id', 'name', 'file_path', 'table_name', 'status', 'created_at')
+            'fields': ('id', 'thumbnail_preview', 'name', 'file_path', 'table_name', 'status', 'created_at', 'srid', 'keep_native_crs',
+                       'source_format', 'source_bytes', 'load_seconds', 'storage_mode')
         }),
         ('GeoServer Information', {
             'fields': (
                 'published_to_geoserver', 'geoserver_layer', 
-                'wms_preview_link', 'wfs_preview_link'
+                'wms_preview_link', 'wfs_preview_link', 'extent', 'latlon_extent'
             ),
             'classes': ('collapse',)
         }),
         ('Table Information', {
-            'fields': ('table_info_display',),
+            'fields': ('table_info_display', 'narrow_types', 'narrowing_report', 'snap_grid', 'precision_report'),
             'classes': ('collapse',)
         })
     )
@@ -69,6 +71,17 @@ class ShapefileImportAdmin(admin.ModelAdmin):
         return "Not available"
     wms_preview_link.short_description = "WMS URL"
     
+    def thumbnail_preview(self, obj):
+        """Display the pre-rendered thumbnail instead of a live WMS render"""
+        if obj.status == 'success':
+            url = reverse('api-1.0.0:layer_thumbnail', kwargs={'import_id': obj.id})
+            return format_html(
+                '<img src="{}?v={}" width="64" height="64" loading="lazy" alt="">',
+                url, obj.table_version
+            )
+        return "Not available"
+    thumbnail_preview.short_description = "Preview"
+    
     def wfs_preview_link(self, obj):
         """Display WFS URL as a clickable link"""
         if obj.geoserver_wfs_url:
@@ -134,7 +147,7 @@ class ShapefileImportAdmin(admin.ModelAdmin):
         """Allow deleting records"""
         return True
     
-    actions = ['publish_to_geoserver', 'unpublish_from_geoserver', 'refresh_table_info']
+    actions = ['publish_to_geoserver', 'unpublish_from_geoserver', 'sync_with_geoserver', 'refresh_table_info']
     
     def publish_to_geoserver(self, request, queryset):
         """Action to publish selected imports to GeoServer"""
@@ -160,14 +173,8 @@ class ShapefileImportAdmin(admin.ModelAdmin):
                             continue
                     
                     # Publish layer
-                    layer_name = f"layer_{obj.table_name}"
-                    if geoserver.publish_layer(datastore_name, obj.table_name, layer_name):
-                        # Update model
-                        obj.geoserver_layer = layer_name
-                        obj.geoserver_wms_url = geoserver.get_wms_url(layer_name)
-                        obj.geoserver_wfs_url = geoserver.get_wfs_url(layer_name)
-                        obj.published_to_geoserver = True
-                        obj.save()
+                    success, _ = obj.publish(geoserver)
+                    if success:
                         success_count += 1
                     else:
                         error_count += 1
@@ -192,7 +199,8 @@ class ShapefileImportAdmin(admin.ModelAdmin):
         for obj in queryset:
             if obj.published_to_geoserver and obj.geoserver_layer:
                 try:
-                    if geoserver.delete_layer(obj.geoserver_layer):
+                    # The shared layer of partitioned imports stays published for the others
+                    if obj.storage_mode == 'partitioned' or geoserver.delete_layer(obj.geoserver_layer):
                         # Update model
                         obj.geoserver_layer = None
                         obj.geoserver_wms_url = None
@@ -212,6 +220,21 @@ class ShapefileImportAdmin(admin.ModelAdmin):
     
     unpublish_from_geoserver.short_description = "Unpublish selected imports from GeoServer"
     
+    def sync_with_geoserver(self, request, queryset):
+        """Action to reconcile the publication state of selected imports with the GeoServer catalog"""
+        from .geoserver_sync import sync_geoserver
+        
+        report = sync_geoserver(queryset)
+        self.message_user(
+            request,
+            f"Checked {report['checked']} import(s): {report['in_sync']} in sync, {report['relinked']} relinked, "
+            f"{report['republished']} republished, {report['unpublished']} marked unpublished."
+        )
+        for error in report['errors']:
+            self.message_user(request, error, level='WARNING')
+    
+    sync_with_geoserver.short_description = "Sync selected imports with GeoServer"
+    
     def refresh_table_info(self, request, queryset):
         """Action to refresh table information for selected imports"""
         success_count = 0
@@ -235,3 +258,100 @@ class ShapefileImportAdmin(admin.ModelAdmin):
             self.message_user(request, f"Failed to refresh table info for {error_count} import(s).", level='WARNING')
     
     refresh_table_info.short_description = "Refresh table information"
+
+
+
+@admin.register(GeoServerImportTask)
+class GeoServerImportTaskAdmin(admin.ModelAdmin):
+    """Admin interface for mirrored GeoServer Importer tasks"""
+    
+    list_display = [
+        'geoserver_import_id', 'name', 'state', 'created_at',
+        'last_polled_at', 'next_poll_at', 'poll_failures'
+    ]
+    
+    list_filter = ['state', 'created_at']
+    
+    search_fields = ['name', 'geoserver_import_id']
+    
+    readonly_fields = [
+        'geoserver_import_id', 'name', 'state', 'payload', 'created_at', 'updated_at',
+        'last_polled_at', 'next_poll_at', 'poll_interval', 'poll_failures'
+    ]
+    
+    ordering = ['-created_at']
+    
+    def has_add_permission(self, request):
+        """Tasks are created by the importer upload endpoint"""
+        return False
+
+
+@admin.register(OrphanCandidate)
+class OrphanCandidateAdmin(admin.ModelAdmin):
+    """Admin interface for tables and layers waiting to be reaped"""
+    
+    list_display = ['kind', 'name', 'size_bytes', 'first_seen', 'last_seen']
+    
+    list_filter = ['kind']
+    
+    search_fields = ['name']
+    
+    readonly_fields = ['kind', 'name', 'size_bytes', 'first_seen', 'last_seen']
+    
+    ordering = ['first_seen']
+    
+    def has_add_permission(self, request):
+        """Candidates are recorded by the reap_orphans command"""
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Read-only browser of the stored API request profiles"""
+    
+    list_display = ['created_at', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms',
+                    'http_count', 'http_ms', 'trigger']
+    
+    list_filter = ['trigger', 'method', 'status_code']
+    
+    search_fields = ['path']
+    
+    readonly_fields = [
+        'created_at', 'method', 'path', 'status_code', 'trigger', 'duration_ms',
+        'sql_count', 'sql_ms', 'http_count', 'http_ms', 'queries_display', 'http_calls_display', 'profile_display'
+    ]
+    
+    exclude = ['queries', 'http_calls', 'profile']
+    
+    ordering = ['-created_at']
+    
+    def queries_display(self, obj):
+        """SQL queries with their database and duration"""
+        return format_html(
+            '<pre style="white-space: pre-wrap">{}</pre>',
+            '\n'.join(f"[{query['database']}] {query['ms']} ms  {query['sql']}" for query in obj.queries)
+        )
+    
+    queries_display.short_description = "SQL queries"
+    
+    def http_calls_display(self, obj):
+        """Outbound calls with their status and duration"""
+        return format_html(
+            '<pre style="white-space: pre-wrap">{}</pre>',
+            '\n'.join(f"{call['method']} {call['url']} -> {call['status']} in {call['ms']} ms" for call in obj.http_calls)
+        )
+    
+    http_calls_display.short_description = "GeoServer calls"
+    
+    def profile_display(self, obj):
+        """cProfile statistics"""
+        return format_html('<pre>{}</pre>', obj.profile)
+    
+    profile_display.short_description = "Profile"
+    
+    def has_add_permission(self, request):
+        """Profiles are recorded by the profiling middleware"""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
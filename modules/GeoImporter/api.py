@@ -1,131 +1,183 @@
-from ninja import NinjaAPI, File, UploadedFile
+from ninja import NinjaAPI, File, UploadedFile, Query
+from typing import List
 from ninja.errors import HttpError
-from django.shortcuts import get_object_or_404
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, aget_object_or_404
+from django.urls import reverse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.conf import settings
 import os
-import zipfile
-import tempfile
-import shutil
-import requests
 from urllib.parse import unquote
-from .models import ShapefileImport
+from .models import ShapefileImport, GeoServerImportTask
 from .schemas import (
     ShapefileImportSchema,
     ImportStatusResponse,
     ImportListResponse,
+    CatalogResponse,
+    SpatialQuerySchema,
+    OverlaySchema,
     SuccessResponse,
     ErrorResponse,
     GeoServerLayerInfoSchema,
     GeoServerUserCreateSchema,
-    GeoServerUserResponseSchema
+    GeoServerUserResponseSchema,
+    StatusWaitSchema,
+    StatusChangesResponse
 )
 from .geoserver_service import GeoServerService
 from .geoserver_importer_service import GeoServerImporterService
+from .http_client import get_client
+from .importer_poller import ensure_poller_running
+from .catalog import get_catalog
+from .spatial_query import run_query, SpatialQueryError
+from .layer_stats import get_statistics
+from .thumbnails import get_thumbnail
+from . import format_loader, shared_storage
+from .csv_loader import CsvMapping, CsvMappingError, validate_mapping
+from .scratch import ScratchSpace, ScratchQuotaExceeded, estimate_upload_bytes
+from .status_events import wait_for_changes
+from .geoserver_sync import sync_geoserver
+from .overlay import run_overlay, OverlayError
+from .exporter import (
+    EXPORT_FORMATS, ExportFilter, ScratchStreamingResponse, iter_geojson, estimate_export_bytes, export_with_ogr,
+    iter_file, aiter_in_thread
+)
 
 # Create Ninja API instance
 api = NinjaAPI(title="GeoImporter API", version="1.0.0")
 
 
-@api.post("/upload/", response={200: SuccessResponse, 400: ErrorResponse, 500: ErrorResponse})
-def upload_shapefile(request, shapefile: UploadedFile = File(...)):
-    """Upload and import shapefile"""
+@api.exception_handler(ScratchQuotaExceeded)
+def scratch_quota_exceeded(request, exc):
+    """Turn away uploads while the scratch quota is exhausted instead of filling the disk"""
+    if not exc.fits:
+        return api.create_response(request, {'success': False, 'error': str(exc)}, status=413)
+    response = api.create_response(request, {'success': False, 'error': str(exc)}, status=429)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def _storage_mode(storage_mode, keep_native_crs):
+    """Validate the requested storage mode, defaulting to GEOIMPORTER_STORAGE_MODE"""
+    storage_mode = storage_mode or getattr(settings, 'GEOIMPORTER_STORAGE_MODE', 'table')
+    if storage_mode not in dict(ShapefileImport.STORAGE_MODES):
+        raise HttpError(400, "storage_mode must be 'table' or 'partitioned'")
+    if storage_mode == 'partitioned' and keep_native_crs:
+        raise HttpError(400, f"Partitioned storage is always in EPSG:{shared_storage.SHARED_SRID}, keep_native_crs is not supported")
+    return storage_mode
+
+
+def _publish_import(geoserver, import_record):
+    """Publish an import to GeoServer or fail the request"""
+    success, message = import_record.publish(geoserver)
+    if not success:
+        raise HttpError(500, message)
+
+
+def _narrow_types(narrow_types):
+    """Whether to narrow column types after the load, defaulting to GEOIMPORTER_NARROW_TYPES"""
+    if narrow_types is None:
+        return getattr(settings, 'GEOIMPORTER_NARROW_TYPES', False)
+    return narrow_types
+
+
+def _snap_grid(snap_grid):
+    """Grid in metres to snap coordinates to, defaulting to GEOIMPORTER_SNAP_GRID; 0 disables snapping"""
+    if snap_grid is None:
+        snap_grid = getattr(settings, 'GEOIMPORTER_SNAP_GRID', None)
+    if snap_grid is not None and snap_grid < 0:
+        raise HttpError(400, "snap_grid must be a grid size in metres, 0 or more")
+    return snap_grid or None
+
+
+def _thumbnail_url(import_record):
+    """URL of the thumbnail of a successful import, versioned so it can be cached for good"""
+    if import_record.status != 'success':
+        return None
+    url = reverse(f"{api.urls_namespace}:layer_thumbnail", kwargs={'import_id': import_record.id})
+    return f"{url}?v={import_record.table_version}"
+
+
+def _import_upload(upload, keep_native_crs, storage_mode=None, narrow_types=None, snap_grid=None):
+    """Import an uploaded dataset, one ShapefileImport per layer
+    
+    Accepts a zipped shapefile, or a FlatGeobuf, GeoPackage or GeoParquet
+    file either as is or inside a zip.
+    """
+    storage_mode = _storage_mode(storage_mode, keep_native_crs)
+    narrow_types = _narrow_types(narrow_types)
+    snap_grid = _snap_grid(snap_grid)
+    extension = os.path.splitext(upload.name)[1].lower()
+    if extension != '.zip' and not format_loader.source_format(upload.name):
+        raise HttpError(400, "Please upload a zip file containing a shapefile, or a .fgb, .gpkg or .parquet file")
+    
+    # Reserve scratch space for the upload and its extraction, removed on every exit path
+    with ScratchSpace(estimate_upload_bytes([upload])) as scratch:
+        upload_path = scratch.save_upload(upload)
+        if extension == '.zip':
+            source_path = format_loader.find_source(scratch.extract_zip(upload_path))
+        else:
+            source_path = format_loader.find_source(upload_path)
+        if not source_path:
+            raise HttpError(400, "No .shp, .fgb, .gpkg or .parquet file found in zip")
+        
+        layers = format_loader.list_layers(source_path)
+        if not layers:
+            raise HttpError(400, "No spatial layers found in GeoPackage")
+        
+        results = []
+        for layer in layers:
+            # Create ShapefileImport record
+            import_record = ShapefileImport.objects.create(
+                name=f"{upload.name}:{layer}" if layer and len(layers) > 1 else upload.name,
+                file_path=source_path,
+                status='processing',
+                keep_native_crs=keep_native_crs,
+                storage_mode=storage_mode,
+                narrow_types=narrow_types,
+                snap_grid=snap_grid
+            )
+            
+            success, message = import_record.import_dataset(source_path, layer)
+            if not success:
+                raise HttpError(500, message)
+            results.append((import_record, message))
+        
+        return results
+
+
+@api.post("/upload/", response={200: SuccessResponse, 400: ErrorResponse, 429: ErrorResponse, 500: ErrorResponse})
+def upload_shapefile(request, shapefile: UploadedFile = File(...), keep_native_crs: bool = False,
+                     storage_mode: str = None, narrow_types: bool = None, snap_grid: float = None):
+    """Upload and import a zipped shapefile, FlatGeobuf, GeoPackage (every layer) or GeoParquet file
+    
+    keep_native_crs=true keeps the source SRID instead of reprojecting to EPSG:4326.
+    storage_mode='partitioned' stores the import as a partition of the shared table.
+    narrow_types=true converts attribute columns to their tightest type after the load.
+    snap_grid snaps coordinates to a grid of that many metres, e.g. 0.01.
+    """
     try:
-        # Check if it's a zip file (shapefile)
-        if not shapefile.name.endswith('.zip'):
-            raise HttpError(400, "Please upload a zip file containing shapefile")
+        results = _import_upload(shapefile, keep_native_crs, storage_mode, narrow_types, snap_grid)
+        import_record, message = results[0]
         
-        # Save uploaded file
-        file_path = default_storage.save(f'temp/{shapefile.name}', ContentFile(shapefile.read()))
-        full_path = default_storage.path(file_path)
-        
-        # Extract zip file
-        extract_dir = tempfile.mkdtemp()
-        with zipfile.ZipFile(full_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        # Find .shp file
-        shp_file = None
-        for file in os.listdir(extract_dir):
-            if file.endswith('.shp'):
-                shp_file = os.path.join(extract_dir, file)
-                break
-        
-        if not shp_file:
-            raise HttpError(400, "No .shp file found in zip")
-        
-        # Create ShapefileImport record
-        import_record = ShapefileImport.objects.create(
-            name=shapefile.name,
-            file_path=shp_file,
-            status='processing'
+        return SuccessResponse(
+            message=' '.join(message for _, message in results),
+            import_id=import_record.id,
+            import_ids=[record.id for record, _ in results],
+            table_name=import_record.table_name
         )
-        
-        # Import shapefile
-        success, message = import_record.import_shapefile(shp_file)
-        
-        # Clean up temp files
-        os.remove(full_path)
-        shutil.rmtree(extract_dir)
-        
-        if success:
-            return SuccessResponse(
-                message=message,
-                import_id=import_record.id,
-                table_name=import_record.table_name
-            )
-        else:
-            raise HttpError(500, message)
             
-    except HttpError:
+    except (HttpError, ScratchQuotaExceeded):
         raise
     except Exception as e:
         raise HttpError(500, f"Unexpected error: {str(e)}")
 
 
-@api.post("/upload-with-geoserver/", response={200: SuccessResponse, 400: ErrorResponse, 500: ErrorResponse})
-def upload_shapefile_with_geoserver(request, shapefile: UploadedFile = File(...)):
-    """Upload shapefile and automatically publish to GeoServer"""
+@api.post("/upload-with-geoserver/", response={200: SuccessResponse, 400: ErrorResponse, 429: ErrorResponse, 500: ErrorResponse})
+def upload_shapefile_with_geoserver(request, shapefile: UploadedFile = File(...), keep_native_crs: bool = False,
+                                    storage_mode: str = None, narrow_types: bool = None, snap_grid: float = None):
+    """Upload a dataset and automatically publish each imported layer to GeoServer"""
     try:
-        # Check if it's a zip file (shapefile)
-        if not shapefile.name.endswith('.zip'):
-            raise HttpError(400, "Please upload a zip file containing shapefile")
-        
-        # Save uploaded file
-        file_path = default_storage.save(f'temp/{shapefile.name}', ContentFile(shapefile.read()))
-        full_path = default_storage.path(file_path)
-        
-        # Extract zip file
-        extract_dir = tempfile.mkdtemp()
-        with zipfile.ZipFile(full_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        # Find .shp file
-        shp_file = None
-        for file in os.listdir(extract_dir):
-            if file.endswith('.shp'):
-                shp_file = os.path.join(extract_dir, file)
-                break
-        
-        if not shp_file:
-            raise HttpError(400, "No .shp file found in zip")
-        
-        # Create ShapefileImport record
-        import_record = ShapefileImport.objects.create(
-            name=shapefile.name,
-            file_path=shp_file,
-            status='processing'
-        )
-        
-        # Import shapefile
-        success, message = import_record.import_shapefile(shp_file)
-        
-        if not success:
-            # Clean up temp files
-            os.remove(full_path)
-            shutil.rmtree(extract_dir)
-            raise HttpError(500, message)
+        results = _import_upload(shapefile, keep_native_crs, storage_mode, narrow_types, snap_grid)
         
         # Publish to GeoServer
         geoserver = GeoServerService()
@@ -137,44 +189,111 @@ def upload_shapefile_with_geoserver(request, shapefile: UploadedFile = File(...)
         # Check if datastore exists, create if not
         datastore_name = geoserver.datastore_name
         if not geoserver.datastore_exists(datastore_name):
-            if not geoserver.create_datastore(datastore_name, import_record.table_name):
+            if not geoserver.create_datastore(datastore_name, results[0][0].table_name):
                 raise HttpError(500, "Failed to create GeoServer datastore")
         
-        # Publish layer
-        layer_name = f"layer_{import_record.table_name}"
-        if not geoserver.publish_layer(datastore_name, import_record.table_name, layer_name):
-            raise HttpError(500, "Failed to publish layer to GeoServer")
-        
-        # Get layer URLs
-        wms_url = geoserver.get_wms_url(layer_name)
-        wfs_url = geoserver.get_wfs_url(layer_name)
-        
-        # Update import record with GeoServer info
-        import_record.geoserver_layer = layer_name
-        import_record.geoserver_wms_url = wms_url
-        import_record.geoserver_wfs_url = wfs_url
-        import_record.published_to_geoserver = True
-        import_record.save()
-        
-        # Clean up temp files
-        os.remove(full_path)
-        shutil.rmtree(extract_dir)
+        for import_record, _ in results:
+            _publish_import(geoserver, import_record)
         
+        import_record = results[0][0]
         return SuccessResponse(
-            message=f"Shapefile imported and published to GeoServer successfully. {message}",
+            message=f"Dataset imported and published to GeoServer successfully. {' '.join(message for _, message in results)}",
             import_id=import_record.id,
+            import_ids=[record.id for record, _ in results],
             table_name=import_record.table_name,
-            geoserver_layer=layer_name,
-            wms_url=wms_url,
-            wfs_url=wfs_url
+            geoserver_layer=import_record.geoserver_layer,
+            wms_url=import_record.geoserver_wms_url,
+            wfs_url=import_record.geoserver_wfs_url
         )
             
-    except HttpError:
+    except (HttpError, ScratchQuotaExceeded):
         raise
     except Exception as e:
         raise HttpError(500, f"Unexpected error: {str(e)}")
 
 
+@api.post("/upload-csv/", response={200: SuccessResponse, 400: ErrorResponse, 429: ErrorResponse, 500: ErrorResponse})
+def upload_csv(request, csv_file: UploadedFile = File(...), x_column: str = None, y_column: str = None,
+               wkt_column: str = None, wkb_column: str = None, srid: int = 4326, delimiter: str = ',',
+               encoding: str = 'UTF8', keep_native_crs: bool = False, storage_mode: str = None,
+               narrow_types: bool = None, snap_grid: float = None):
+    """Upload and import a CSV of x/y coordinates, WKT or hex WKB geometries
+    
+    srid is the CRS of the coordinates in the file; attribute types are
+    inferred from a sample of rows.
+    """
+    mapping = CsvMapping(
+        x_column=x_column,
+        y_column=y_column,
+        wkt_column=wkt_column,
+        wkb_column=wkb_column,
+        srid=srid,
+        delimiter=delimiter,
+        encoding=encoding
+    )
+    
+    try:
+        storage_mode = _storage_mode(storage_mode, keep_native_crs)
+        
+        with ScratchSpace(estimate_upload_bytes([csv_file])) as scratch:
+            file_path = scratch.save_upload(csv_file)
+            validate_mapping(file_path, mapping)
+            
+            # Create ShapefileImport record
+            import_record = ShapefileImport.objects.create(
+                name=csv_file.name,
+                file_path=file_path,
+                status='processing',
+                keep_native_crs=keep_native_crs,
+                storage_mode=storage_mode,
+                narrow_types=_narrow_types(narrow_types),
+                snap_grid=_snap_grid(snap_grid)
+            )
+            
+            success, message = import_record.import_dataset(file_path, csv_mapping=mapping)
+            if not success:
+                raise HttpError(500, message)
+        
+        return SuccessResponse(
+            message=message,
+            import_id=import_record.id,
+            table_name=import_record.table_name
+        )
+        
+    except CsvMappingError as e:
+        raise HttpError(400, str(e))
+    except (HttpError, ScratchQuotaExceeded):
+        raise
+    except Exception as e:
+        raise HttpError(500, f"Unexpected error: {str(e)}")
+
+
+@api.get("/throughput/", response={200: dict})
+def get_import_throughput(request):
+    """Load throughput of successful imports per source format"""
+    from django.db.models import Count, Sum
+    
+    rows = (
+        ShapefileImport.objects
+        .filter(status='success', load_seconds__gt=0, source_bytes__isnull=False)
+        .values('source_format')
+        .annotate(imports=Count('id'), total_bytes=Sum('source_bytes'), total_seconds=Sum('load_seconds'))
+        .order_by('source_format')
+    )
+    
+    return {
+        'formats': {
+            row['source_format']: {
+                'imports': row['imports'],
+                'total_bytes': row['total_bytes'],
+                'total_seconds': round(row['total_seconds'], 3),
+                'mb_per_second': round(row['total_bytes'] / row['total_seconds'] / 1024 / 1024, 3)
+            }
+            for row in rows
+        }
+    }
+
+
 @api.get("/status/{import_id}/", response={200: ImportStatusResponse, 404: ErrorResponse})
 def get_import_status(request, import_id: int):
     """Get status of shapefile import"""
@@ -190,7 +309,12 @@ def get_import_status(request, import_id: int):
             'geoserver_layer': import_record.geoserver_layer,
             'geoserver_wms_url': import_record.geoserver_wms_url,
             'geoserver_wfs_url': import_record.geoserver_wfs_url,
-            'published_to_geoserver': import_record.published_to_geoserver
+            'published_to_geoserver': import_record.published_to_geoserver,
+            'srid': import_record.srid,
+            'status_version': import_record.status_version,
+            'narrowing_report': import_record.narrowing_report,
+            'precision_report': import_record.precision_report,
+            'thumbnail_url': _thumbnail_url(import_record)
         }
         
         if import_record.status == 'success':
@@ -204,6 +328,36 @@ def get_import_status(request, import_id: int):
         raise HttpError(500, str(e))
 
 
+@api.post("/status/wait/", response={200: StatusChangesResponse, 400: ErrorResponse, 500: ErrorResponse})
+async def wait_for_status_changes(request, payload: StatusWaitSchema):
+    """Long-poll the status of many imports
+    
+    versions maps import ids to the status_version last seen by the client.
+    Returns as soon as one of them changes status or is deleted, or with
+    timed_out after timeout seconds (capped by GEOIMPORTER_STATUS_WAIT_MAX_SECONDS).
+    """
+    try:
+        max_ids = getattr(settings, 'GEOIMPORTER_STATUS_WAIT_MAX_IDS', 1000)
+        if not payload.versions:
+            raise HttpError(400, "No import ids given")
+        if len(payload.versions) > max_ids:
+            raise HttpError(400, f"At most {max_ids} imports can be watched per request")
+        
+        timeout = min(max(payload.timeout, 0), getattr(settings, 'GEOIMPORTER_STATUS_WAIT_MAX_SECONDS', 30))
+        changed, deleted = await wait_for_changes(payload.versions, timeout)
+        
+        return {
+            'changed': changed,
+            'deleted': deleted,
+            'timed_out': not (changed or deleted)
+        }
+        
+    except HttpError:
+        raise
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
 @api.get("/list/", response={200: ImportListResponse})
 def list_imports(request):
     """List all shapefile imports"""
@@ -221,7 +375,11 @@ def list_imports(request):
                 'geoserver_layer': imp.geoserver_layer,
                 'geoserver_wms_url': imp.geoserver_wms_url,
                 'geoserver_wfs_url': imp.geoserver_wfs_url,
-                'published_to_geoserver': imp.published_to_geoserver
+                'published_to_geoserver': imp.published_to_geoserver,
+                'srid': imp.srid,
+                'source_format': imp.source_format,
+                'storage_mode': imp.storage_mode,
+                'thumbnail_url': _thumbnail_url(imp)
             })
         
         return {'imports': imports_data}
@@ -230,19 +388,243 @@ def list_imports(request):
         raise HttpError(500, str(e))
 
 
+@api.get("/catalog/", response={200: CatalogResponse, 500: ErrorResponse})
+def get_schema_catalog(request, ids: List[int] = Query(None)):
+    """Column names/types, geometry type, SRID and estimated row count of imported tables
+    
+    All requested tables are read in one catalog query, cached per table version.
+    Without ids every successful import is returned.
+    """
+    try:
+        imports = ShapefileImport.objects.filter(status='success')
+        if ids:
+            imports = imports.filter(id__in=ids)
+        imports = list(imports.only('id', 'table_name', 'table_version').order_by('id'))
+        
+        catalog = get_catalog(imports)
+        
+        layers = []
+        for imp in imports:
+            if imp.id in catalog:
+                layers.append({
+                    'import_id': imp.id,
+                    'table_name': imp.table_name,
+                    **catalog[imp.id]
+                })
+        
+        return {'layers': layers}
+        
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
+@api.get("/thumbnail/{import_id}/", url_name='layer_thumbnail',
+         response={400: ErrorResponse, 404: ErrorResponse, 500: ErrorResponse})
+def get_layer_thumbnail(request, import_id: int, v: int = None, refresh: bool = False):
+    """SVG preview of an imported layer, rendered once per table version
+    
+    Requested with the current table version as v (see thumbnail_url), the
+    response is cacheable for GEOIMPORTER_THUMBNAIL_MAX_AGE; otherwise clients
+    revalidate it with its ETag.
+    """
+    try:
+        import_record = get_object_or_404(ShapefileImport, id=import_id)
+        
+        if import_record.status != 'success':
+            raise HttpError(400, "Import must be successful before it has a thumbnail")
+        
+        etag = f'"{import_record.id}-{import_record.table_version}"'
+        if v == import_record.table_version:
+            cache_control = f"public, max-age={getattr(settings, 'GEOIMPORTER_THUMBNAIL_MAX_AGE', 31536000)}, immutable"
+        else:
+            cache_control = "public, no-cache"
+        
+        if not refresh and etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(get_thumbnail(import_record, refresh=refresh), content_type='image/svg+xml')
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+        
+    except (HttpError, Http404):
+        raise
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
+@api.post("/query/{import_id}/", response={200: dict, 400: ErrorResponse, 404: ErrorResponse, 500: ErrorResponse})
+def query_features(request, import_id: int, query: SpatialQuerySchema):
+    """Query an imported layer by bbox, intersecting geometry, distance or k nearest neighbours
+    
+    Distances are in meters for geographic layers and in layer units otherwise.
+    Pages are keyed on gid: pass the returned next_after as after. Set
+    explain=true to get the query plan and whether it uses the spatial index.
+    """
+    try:
+        import_record = get_object_or_404(ShapefileImport, id=import_id)
+        
+        if import_record.status != 'success':
+            raise HttpError(400, "Import must be successful before it can be queried")
+        
+        return run_query(import_record, query)
+        
+    except SpatialQueryError as e:
+        raise HttpError(400, str(e))
+    except (HttpError, Http404):
+        raise
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
+@api.get("/stats/{import_id}/", response={200: dict, 400: ErrorResponse, 404: ErrorResponse, 500: ErrorResponse})
+def get_layer_statistics(request, import_id: int, refresh: bool = False):
+    """Per-column statistics (count, nulls, min/max, distinct estimate, quantiles, top values)
+    
+    Statistics are stored on the import and recomputed only when the layer
+    changed since, or when refresh=true.
+    """
+    try:
+        import_record = get_object_or_404(ShapefileImport, id=import_id)
+        
+        if import_record.status != 'success':
+            raise HttpError(400, "Import must be successful before computing statistics")
+        if import_record.storage_mode == 'partitioned':
+            raise HttpError(400, "Statistics are not available for partitioned imports, whose attributes are JSON")
+        
+        return {
+            'import_id': import_record.id,
+            'table_version': import_record.table_version,
+            **get_statistics(import_record, refresh=refresh)
+        }
+        
+    except (HttpError, Http404):
+        raise
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
+@api.get("/export/{import_id}/", response={400: ErrorResponse, 404: ErrorResponse, 500: ErrorResponse})
+def export_layer(request, import_id: int, format: str = 'geojson', bbox: str = None, srid: int = 4326,
+                 filter: List[str] = Query(None)):
+    """Stream an imported layer as GeoJSON, newline-delimited GeoJSON, FlatGeobuf or GeoParquet
+    
+    bbox is "minx,miny,maxx,maxy" in srid; each filter is "column=value".
+    """
+    try:
+        import_record = get_object_or_404(ShapefileImport, id=import_id)
+        
+        if import_record.status != 'success':
+            raise HttpError(400, "Import must be successful before it can be exported")
+        
+        if format not in EXPORT_FORMATS:
+            raise HttpError(400, f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        
+        export_filter = ExportFilter(srid=srid)
+        if bbox:
+            try:
+                export_filter.bbox = [float(value) for value in bbox.split(',')]
+            except ValueError:
+                raise HttpError(400, "bbox must be minx,miny,maxx,maxy")
+        if filter:
+            export_filter.filters = {}
+            for item in filter:
+                column, separator, value = item.partition('=')
+                if not separator:
+                    raise HttpError(400, "filter must be column=value")
+                export_filter.filters[column] = value
+        
+        content_type, extension, driver = EXPORT_FORMATS[format]
+        scratch = None
+        if driver:
+            # The file stays in a scratch reservation until the response is closed
+            scratch = ScratchSpace(estimate_export_bytes(import_record), prefix='export').__enter__()
+            try:
+                stream = iter_file(export_with_ogr(import_record, export_filter, format, scratch))
+            except BaseException:
+                scratch.__exit__(None, None, None)
+                raise
+        else:
+            stream = iter_geojson(import_record, export_filter, collection=(format == 'geojson'))
+        
+        # Under ASGI a blocking iterator would be read into memory before sending
+        from django.core.handlers.asgi import ASGIRequest
+        if isinstance(request, ASGIRequest):
+            stream = aiter_in_thread(stream)
+        
+        response = ScratchStreamingResponse(stream, scratch, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{import_record.table_name}.{extension}"'
+        return response
+        
+    except SpatialQueryError as e:
+        raise HttpError(400, str(e))
+    except (HttpError, Http404, ScratchQuotaExceeded):
+        raise
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
 @api.delete("/import/{import_id}/", response={200: SuccessResponse, 404: ErrorResponse})
 def delete_import(request, import_id: int):
-    """Delete a shapefile import record"""
+    """Delete an import record together with its datastore table and GeoServer layer"""
     try:
         import_record = get_object_or_404(ShapefileImport, id=import_id)
         import_record.delete()
         
-        return SuccessResponse(message="Import record deleted successfully")
+        return SuccessResponse(message="Import record, table and layer deleted successfully")
         
     except Exception as e:
         raise HttpError(500, str(e))
 
 
+@api.post("/replace/{import_id}/", response={200: SuccessResponse, 400: ErrorResponse, 404: ErrorResponse, 429: ErrorResponse, 500: ErrorResponse})
+def replace_import_data(request, import_id: int, shapefile: UploadedFile = File(...)):
+    """Replace the data of an import in place, keeping its table, layer and URLs"""
+    try:
+        import_record = get_object_or_404(ShapefileImport, id=import_id)
+        
+        if import_record.status != 'success':
+            raise HttpError(400, "Only successful imports can be replaced")
+        
+        # Check if it's a zip file (shapefile)
+        if not shapefile.name.endswith('.zip'):
+            raise HttpError(400, "Please upload a zip file containing shapefile")
+        
+        with ScratchSpace(estimate_upload_bytes([shapefile])) as scratch:
+            # Extract zip file
+            extract_dir = scratch.extract_zip(scratch.save_upload(shapefile))
+            
+            # Find .shp file
+            shp_file = None
+            for file in os.listdir(extract_dir):
+                if file.endswith('.shp'):
+                    shp_file = os.path.join(extract_dir, file)
+                    break
+            
+            if not shp_file:
+                raise HttpError(400, "No .shp file found in zip")
+            
+            # Load into a staging table and swap it in atomically
+            success, message = import_record.replace_data(shp_file)
+        
+        if not success:
+            raise HttpError(500, message)
+        
+        return SuccessResponse(
+            message=message,
+            import_id=import_record.id,
+            table_name=import_record.table_name,
+            geoserver_layer=import_record.geoserver_layer,
+            wms_url=import_record.geoserver_wms_url,
+            wfs_url=import_record.geoserver_wfs_url
+        )
+        
+    except (HttpError, Http404, ScratchQuotaExceeded):
+        raise
+    except Exception as e:
+        raise HttpError(500, f"Unexpected error: {str(e)}")
+
+
 @api.post("/publish/{import_id}/", response={200: SuccessResponse, 400: ErrorResponse, 500: ErrorResponse})
 def publish_to_geoserver(request, import_id: int):
     """Publish imported shapefile to GeoServer"""
@@ -266,27 +648,15 @@ def publish_to_geoserver(request, import_id: int):
                 raise HttpError(500, "Failed to create GeoServer datastore")
         
         # Publish layer
-        layer_name = f"layer_{import_record.table_name}"
-        if not geoserver.publish_layer(datastore_name, import_record.table_name, layer_name):
-            raise HttpError(500, "Failed to publish layer to GeoServer")
-        
-        # Get layer URLs
-        wms_url = geoserver.get_wms_url(layer_name)
-        wfs_url = geoserver.get_wfs_url(layer_name)
-        
-        # Update import record with GeoServer info
-        import_record.geoserver_layer = layer_name
-        import_record.geoserver_wms_url = wms_url
-        import_record.geoserver_wfs_url = wfs_url
-        import_record.save()
+        _publish_import(geoserver, import_record)
         
         return SuccessResponse(
             message="Layer published to GeoServer successfully",
             import_id=import_record.id,
             table_name=import_record.table_name,
-            geoserver_layer=layer_name,
-            wms_url=wms_url,
-            wfs_url=wfs_url
+            geoserver_layer=import_record.geoserver_layer,
+            wms_url=import_record.geoserver_wms_url,
+            wfs_url=import_record.geoserver_wfs_url
         )
         
     except HttpError:
@@ -295,47 +665,140 @@ def publish_to_geoserver(request, import_id: int):
         raise HttpError(500, f"Unexpected error: {str(e)}")
 
 
+@api.post("/overlay/", response={200: SuccessResponse, 400: ErrorResponse, 404: ErrorResponse, 500: ErrorResponse})
+def overlay_imports(request, payload: OverlaySchema):
+    """Intersect, clip, difference or spatially join two imports into a new import"""
+    try:
+        left = get_object_or_404(ShapefileImport, id=payload.left_id)
+        right = get_object_or_404(ShapefileImport, id=payload.right_id)
+        
+        import_record, message = run_overlay(left, right, payload.operation, payload.distance, payload.name)
+        
+        if payload.publish:
+            _ensure_importer_datastore()
+            _publish_import(GeoServerService(), import_record)
+            message += " and published to GeoServer"
+        
+        return SuccessResponse(
+            message=message,
+            import_id=import_record.id,
+            table_name=import_record.table_name,
+            geoserver_layer=import_record.geoserver_layer,
+            wms_url=import_record.geoserver_wms_url,
+            wfs_url=import_record.geoserver_wfs_url
+        )
+        
+    except OverlayError as e:
+        raise HttpError(400, str(e))
+    except (HttpError, Http404):
+        raise
+    except Exception as e:
+        raise HttpError(500, f"Unexpected error: {str(e)}")
+
+
 @api.get("/geoserver/layers/", response={200: dict, 500: ErrorResponse})
-def list_geoserver_layers(request):
+async def list_geoserver_layers(request):
     """List all layers published to GeoServer"""
     try:
         geoserver = GeoServerService()
         
         # Get layers from GeoServer
-        url = f"{geoserver.base_url}/rest/layers"
-        response = requests.get(
-            url,
-            auth=geoserver._get_auth(),
-            headers=geoserver._get_headers()
-        )
+        layers = await geoserver.alist_layers()
         
-        if response.status_code == 200:
-            layers_data = response.json()
-            return {"layers": layers_data.get('layers', {}).get('layer', [])}
-        else:
-            raise HttpError(500, f"Failed to get layers from GeoServer: {response.text}")
+        if layers is None:
+            raise HttpError(500, "Failed to get layers from GeoServer")
+        
+        return {"layers": layers}
             
+    except HttpError:
+        raise
+    except Exception as e:
+        raise HttpError(500, str(e))
+
+
+@api.post("/geoserver/sync/", response={200: dict, 500: ErrorResponse})
+def sync_with_geoserver(request, republish: bool = True, dry_run: bool = False):
+    """Reconcile the publication state of every import with the GeoServer catalog"""
+    try:
+        report = sync_geoserver(republish=republish, dry_run=dry_run)
+        
+        if report['errors'] and not report['checked']:
+            raise HttpError(500, report['errors'][0])
+        
+        return report
+        
+    except HttpError:
+        raise
     except Exception as e:
         raise HttpError(500, str(e))
 
 
+def _mirror_import_task(import_result, name):
+    """Create the local mirror of a new GeoServer import and start tracking it"""
+    from django.utils import timezone
+    
+    task = GeoServerImportTask(
+        geoserver_import_id=import_result['import']['id'],
+        name=name,
+        next_poll_at=timezone.now()
+    )
+    task.apply_payload(import_result)
+    task.save()
+    ensure_poller_running()
+    return task
+
+
+def _ensure_importer_datastore():
+    """Make sure the shared PostGIS datastore exists before the importer targets it"""
+    geoserver = GeoServerService()
+    
+    if not geoserver.create_workspace():
+        raise HttpError(500, "Failed to create GeoServer workspace")
+    
+    datastore_name = geoserver.datastore_name
+    if not geoserver.datastore_exists(datastore_name):
+        if not geoserver.create_datastore(datastore_name, None):
+            raise HttpError(500, "Failed to create GeoServer datastore")
+
+
+def _import_to_datastore(importer, uploads):
+    """Send uploads to the importer as one context targeting the PostGIS datastore"""
+    _ensure_importer_datastore()
+    
+    # Uploads are streamed from disk, scratch space only holds those Django kept in memory
+    with ScratchSpace(estimate_upload_bytes(uploads, extract=False)) as scratch:
+        files = [(scratch.save_upload(upload), upload.name) for upload in uploads]
+        return importer.import_to_datastore(files)
+
+
 # GeoServer Importer Plugin Endpoints
-@api.post("/geoserver-import/upload/", response={200: SuccessResponse, 400: ErrorResponse, 500: ErrorResponse})
-def upload_to_geoserver_importer(request, shapefile: UploadedFile = File(...)):
-    """Upload shapefile directly to GeoServer using Importer Plugin"""
+@api.post("/geoserver-import/upload/", response={200: SuccessResponse, 400: ErrorResponse, 429: ErrorResponse, 500: ErrorResponse})
+def upload_to_geoserver_importer(request, shapefile: UploadedFile = File(...), mode: str = 'new'):
+    """Upload shapefile directly to GeoServer using Importer Plugin
+    
+    mode='new' creates a file-based store per upload, mode='datastore' loads
+    the data into the shared PostGIS datastore.
+    """
     try:
         # Check if it's a zip file (shapefile)
         if not shapefile.name.endswith('.zip'):
             raise HttpError(400, "Please upload a zip file containing shapefile")
         
-        # Read file data
-        file_data = shapefile.read()
+        if mode not in ('new', 'datastore'):
+            raise HttpError(400, "mode must be 'new' or 'datastore'")
         
         # Initialize GeoServer Importer service
         importer = GeoServerImporterService()
         
-        # Create import task in GeoServer
-        import_result = importer.create_import_task(file_data, shapefile.name)
+        if mode == 'datastore':
+            import_result = _import_to_datastore(importer, [shapefile])
+        else:
+            # Stream the upload from disk instead of reading it into memory
+            with ScratchSpace(estimate_upload_bytes([shapefile], extract=False)) as scratch:
+                file_path = scratch.save_upload(shapefile)
+                
+                # Create import task in GeoServer
+                import_result = importer.create_import_task(file_path, shapefile.name)
         
         if not import_result:
             raise HttpError(500, "Failed to create import task in GeoServer")
@@ -344,6 +807,9 @@ def upload_to_geoserver_importer(request, shapefile: UploadedFile = File(...)):
         if not import_id:
             raise HttpError(500, "No import ID returned from GeoServer")
         
+        # Track the import locally so status requests don't hit GeoServer
+        _mirror_import_task(import_result, shapefile.name)
+        
         return SuccessResponse(
             message="Shapefile uploaded to GeoServer Importer successfully",
             import_id=import_id,
@@ -351,19 +817,65 @@ def upload_to_geoserver_importer(request, shapefile: UploadedFile = File(...)):
             status=import_result.get('import', {}).get('state', 'unknown')
         )
         
-    except HttpError:
+    except (HttpError, ScratchQuotaExceeded):
+        raise
+    except Exception as e:
+        raise HttpError(500, f"Unexpected error: {str(e)}")
+
+
+@api.post("/geoserver-import/upload-batch/", response={200: SuccessResponse, 400: ErrorResponse, 429: ErrorResponse, 500: ErrorResponse})
+def upload_batch_to_geoserver_importer(request, shapefiles: List[UploadedFile] = File(...)):
+    """Load several zipped shapefiles into the PostGIS datastore as one import context"""
+    try:
+        if not shapefiles:
+            raise HttpError(400, "Please upload at least one zip file")
+        
+        for shapefile in shapefiles:
+            if not shapefile.name.endswith('.zip'):
+                raise HttpError(400, f"{shapefile.name} is not a zip file containing shapefile")
+        
+        importer = GeoServerImporterService()
+        
+        # One import context with a task per file, executed asynchronously
+        import_result = _import_to_datastore(importer, shapefiles)
+        
+        if not import_result:
+            raise HttpError(500, "Failed to create import task in GeoServer")
+        
+        import_id = import_result.get('import', {}).get('id')
+        if not import_id:
+            raise HttpError(500, "No import ID returned from GeoServer")
+        
+        _mirror_import_task(import_result, ', '.join(shapefile.name for shapefile in shapefiles)[:255])
+        
+        return SuccessResponse(
+            message=f"{len(shapefiles)} shapefile(s) queued for import into the PostGIS datastore",
+            import_id=import_id,
+            geoserver_import_id=import_id,
+            status=import_result.get('import', {}).get('state', 'unknown')
+        )
+        
+    except (HttpError, ScratchQuotaExceeded):
         raise
     except Exception as e:
         raise HttpError(500, f"Unexpected error: {str(e)}")
 
 
 @api.get("/geoserver-import/status/{import_id}/", response={200: dict, 404: ErrorResponse, 500: ErrorResponse})
-def get_geoserver_import_status(request, import_id: int):
+async def get_geoserver_import_status(request, import_id: int):
     """Get status of GeoServer import task"""
     try:
+        # Served from the local mirror kept up to date by the importer poller
+        task = await GeoServerImportTask.objects.filter(geoserver_import_id=import_id).afirst()
+        if task:
+            if task.next_poll_at is not None:
+                ensure_poller_running()
+            return task.payload
+        
+        # Import not created through this API, ask GeoServer directly
         importer = GeoServerImporterService()
         
-        import_status = importer.get_import_status(import_id)
+        import_status = await importer.aget_import_status(import_id)
         
         if not import_status:
             raise HttpError(404, "Import task not found")
@@ -377,17 +889,20 @@ def get_geoserver_import_status(request, import_id: int):
 
 
 @api.get("/geoserver-import/list/", response={200: dict, 500: ErrorResponse})
-def list_geoserver_imports(request):
+async def list_geoserver_imports(request):
     """List all GeoServer import tasks"""
     try:
-        importer = GeoServerImporterService()
-        
-        imports_data = importer.list_imports()
-        
-        if not imports_data:
-            return {"imports": []}
+        imports_data = []
+        async for task in GeoServerImportTask.objects.order_by('-created_at'):
+            imports_data.append({
+                'id': task.geoserver_import_id,
+                'name': task.name,
+                'state': task.state,
+                'created_at': task.created_at,
+                'updated_at': task.updated_at
+            })
         
-        return imports_data
+        return {"imports": imports_data}
         
     except Exception as e:
         raise HttpError(500, str(e))
@@ -404,6 +919,8 @@ def delete_geoserver_import(request, import_id: int):
         if not success:
             raise HttpError(404, "Import task not found or could not be deleted")
         
+        GeoServerImportTask.objects.filter(geoserver_import_id=import_id).delete()
+        
         return SuccessResponse(message="GeoServer import task deleted successfully")
         
     except HttpError:
@@ -413,17 +930,17 @@ def delete_geoserver_import(request, import_id: int):
 
 
 @api.get("/geoserver-info/{import_id}/", response={200: GeoServerLayerInfoSchema, 404: ErrorResponse, 500: ErrorResponse})
-def get_geoserver_info(request, import_id: int):
+async def get_geoserver_info(request, import_id: int):
     """Get GeoServer information for a specific import"""
     try:
-        import_record = get_object_or_404(ShapefileImport, id=import_id)
+        import_record = await aget_object_or_404(ShapefileImport, id=import_id)
         
         if not import_record.published_to_geoserver or not import_record.geoserver_layer:
             raise HttpError(404, "Layer not published to GeoServer")
         
         # Get additional layer info from GeoServer
         geoserver = GeoServerService()
-        layer_info = geoserver.get_layer_info(import_record.geoserver_layer)
+        layer_info = await geoserver.aget_layer_info(import_record.geoserver_layer)
         
         response_data = {
             'layer_name': import_record.geoserver_layer,
@@ -433,7 +950,7 @@ def get_geoserver_info(request, import_id: int):
             'workspace': geoserver.workspace,
             'datastore': geoserver.datastore_name,
             'geometry_type': layer_info.get('geometry_type') if layer_info else None,
-            'srid': layer_info.get('srid') if layer_info else None,
+            'srid': import_record.srid,
             'feature_count': layer_info.get('feature_count') if layer_info else None
         }
         
@@ -446,12 +963,12 @@ def get_geoserver_info(request, import_id: int):
 
 
 @api.get("/geoserver-import/layer-info/{layer_name}/", response={200: GeoServerLayerInfoSchema, 404: ErrorResponse, 500: ErrorResponse})
-def get_geoserver_layer_info(request, layer_name: str):
+async def get_geoserver_layer_info(request, layer_name: str):
     """Get information about a layer created by GeoServer Importer"""
     try:
         importer = GeoServerImporterService()
         
-        layer_info = importer.get_layer_info(layer_name)
+        layer_info = await importer.aget_layer_info(layer_name)
         
         if not layer_info:
             raise HttpError(404, "Layer not found")
@@ -479,7 +996,11 @@ def get_geoserver_layer_info(request, layer_name: str):
 
 @api.get("/proxy/")
 def proxy_geoserver(request, url: str):
-    """Simple proxy for GeoServer WFS requests"""
+    """Simple proxy for GeoServer WFS requests
+    
+    Streams the GeoServer response through the shared sync client, which
+    works the same under runserver (WSGI) and ASGI servers.
+    """
     try:
         print(f"Proxy request received for URL: {url}")
         # Decode the URL parameter
@@ -491,12 +1012,25 @@ def proxy_geoserver(request, url: str):
         
         print(f"Modified URL for GeoJSON: {geojson_url}")
         
-        # Make request to GeoServer
-        response = requests.get(geojson_url, timeout=30)
-        
-        # Return the response with proper headers
-        return HttpResponse(
-            response.content,
+        # Make request to GeoServer through the shared connection pool
+        client = get_client()
+        response = client.send(client.build_request('GET', geojson_url), stream=True)
+        
+        def stream_body():
+            try:
+                yield from response.iter_bytes()
+            finally:
+                response.close()
+        
+        stream = stream_body()
+        # Under ASGI a blocking iterator would be read into memory before sending
+        from django.core.handlers.asgi import ASGIRequest
+        if isinstance(request, ASGIRequest):
+            stream = aiter_in_thread(stream)
+        
+        # Stream the response back with proper headers
+        return StreamingHttpResponse(
+            stream,
             content_type='application/json',
             status=response.status_code
         )
@@ -1,6 +1,15 @@
+import os
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class GeoimporterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'modules.GeoImporter'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
+        
+        # Spooled uploads go under the scratch root, which may not exist yet
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
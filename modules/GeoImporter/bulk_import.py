@@ -0,0 +1,202 @@
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from django.conf import settings
+from . import format_loader
+from .scratch import ScratchSpace, ScratchQuotaExceeded
+
+# Files picked up when walking a directory
+BULK_EXTENSIONS = ('.zip',) + tuple(format_loader.SOURCE_FORMATS)
+
+
+def discover(paths: Iterable[str]) -> List[str]:
+    """Importable files under the given files and directories, as sorted absolute paths"""
+    found = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in files:
+                    if file.lower().endswith(BULK_EXTENSIONS):
+                        found.add(os.path.join(root, file))
+        elif path.lower().endswith(BULK_EXTENSIONS):
+            found.add(path)
+    return sorted(found)
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """Paths listed one per line, relative ones resolved against the manifest's directory"""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+
+def read_checkpoint(checkpoint_path: str) -> Dict[str, Dict[str, Any]]:
+    """Last recorded result per path, with the progress of its layers under 'layers'
+
+    A path only has a 'status' once the whole file finished; its layers map
+    layer keys to their last entry (import_id, status). A line cut short by an
+    interrupted run is ignored.
+    """
+    results = {}
+    if not os.path.exists(checkpoint_path):
+        return results
+    with open(checkpoint_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            result = results.setdefault(entry['path'], {'path': entry['path'], 'layers': {}})
+            if 'layer' in entry:
+                result['layers'][entry['layer']] = entry
+            else:
+                result.update({key: value for key, value in entry.items() if key != 'layers'})
+    return results
+
+
+def append_checkpoint(checkpoint_file, result: Dict[str, Any]):
+    """Record a finished file durably before moving on"""
+    checkpoint_file.write(json.dumps(result) + '\n')
+    checkpoint_file.flush()
+    os.fsync(checkpoint_file.fileno())
+
+
+def _record_layer(checkpoint_path: Optional[str], path: str, layer: str, import_id: int, status: str):
+    """Record the progress of one layer from a pool process
+
+    Lines are appended with a single write to a file opened in append mode,
+    so they do not interleave with those of the other processes.
+    """
+    if not checkpoint_path:
+        return
+    with open(checkpoint_path, 'a') as checkpoint_file:
+        append_checkpoint(checkpoint_file, {'path': path, 'layer': layer, 'import_id': import_id, 'status': status})
+
+
+def layer_key(layer: Optional[str]) -> str:
+    """Checkpoint key of a layer; single-layer sources have no layer name"""
+    return layer or ''
+
+
+def resume_layers(result: Dict[str, Any], publish: bool = False) -> Dict[str, int]:
+    """Layers of a file already imported by a previous run, deleting the imports it left unfinished
+
+    Imports of layers the checkpoint shows as processing (interrupted) or
+    failed, or not published when publish is set, are deleted, which drops
+    their tables, so that retrying the file does not leave duplicates.
+    Returns layer keys mapped to the import ids of the layers to skip.
+    """
+    from .models import ShapefileImport
+
+    layers = result.get('layers') or {}
+    records = ShapefileImport.objects.in_bulk([entry['import_id'] for entry in layers.values()])
+    done = {}
+    for key, entry in layers.items():
+        record = records.get(entry['import_id'])
+        if record is None:
+            continue
+        # The load may have finished after the last recorded line
+        if record.status == 'success' and (record.published_to_geoserver or not publish):
+            done[key] = record.id
+        else:
+            record.delete()
+    return done
+
+
+def init_worker(parallel_workers: Optional[int] = None):
+    """Set up Django in a pool process and share the CPUs between the processes"""
+    import django
+    django.setup()
+    if parallel_workers:
+        settings.GEOIMPORTER_PARALLEL_WORKERS = parallel_workers
+
+
+def _import_source(path: str, source_path: Optional[str], options: Dict[str, Any], result: Dict[str, Any],
+                   done_layers: Dict[str, int]):
+    """Create and load one ShapefileImport per layer of a dataset, filling in result
+
+    Layers in done_layers were imported by a previous run and are skipped.
+    """
+    from .models import ShapefileImport
+
+    if not source_path:
+        result['message'] = "No .shp, .fgb, .gpkg or .parquet file found"
+        return
+
+    result['bytes'] = format_loader.source_size(source_path)
+    layers = format_loader.list_layers(source_path)
+    if not layers:
+        result['message'] = "No spatial layers found"
+        return
+
+    messages = []
+    name = os.path.basename(path)
+    for layer in layers:
+        if layer_key(layer) in done_layers:
+            result['import_ids'].append(done_layers[layer_key(layer)])
+            continue
+
+        import_record = ShapefileImport.objects.create(
+            name=f"{name}:{layer}" if layer and len(layers) > 1 else name,
+            file_path=source_path,
+            status='processing',
+            keep_native_crs=options.get('keep_native_crs', False),
+            storage_mode=options.get('storage_mode') or 'table',
+            narrow_types=options.get('narrow_types', False),
+            snap_grid=options.get('snap_grid')
+        )
+        result['import_ids'].append(import_record.id)
+        _record_layer(options.get('checkpoint'), path, layer_key(layer), import_record.id, 'processing')
+
+        success, message = import_record.import_dataset(source_path, layer)
+        if success and options.get('publish'):
+            success, message = import_record.publish()
+        _record_layer(options.get('checkpoint'), path, layer_key(layer), import_record.id,
+                      'success' if success else 'error')
+        if not success:
+            result['message'] = message
+            return
+        messages.append(message)
+
+    result['status'] = 'success'
+    result['message'] = ' '.join(messages) or "All layers were imported by a previous run."
+
+
+def import_file(path: str, options: Dict[str, Any], done_layers: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Import one file into one ShapefileImport per layer, publishing them when asked
+
+    Runs in a pool process. Files are read where they are; only zips are
+    extracted, into a scratch space, waiting while the scratch quota is
+    taken by other imports. Each layer's progress is appended to
+    options['checkpoint'] as it goes. Returns the checkpoint entry of the file.
+    """
+    from django.db import close_old_connections
+
+    close_old_connections()
+    started = time.monotonic()
+    done_layers = done_layers or {}
+    result = {'path': path, 'status': 'error', 'import_ids': [], 'bytes': 0, 'message': ''}
+
+    try:
+        if not path.lower().endswith('.zip'):
+            _import_source(path, format_loader.find_source(path), options, result, done_layers)
+        else:
+            reserve_bytes = os.path.getsize(path) * getattr(settings, 'GEOIMPORTER_SCRATCH_ZIP_EXPANSION', 3)
+            while True:
+                try:
+                    with ScratchSpace(reserve_bytes, prefix='bulk') as scratch:
+                        source_path = format_loader.find_source(scratch.extract_zip(path))
+                        _import_source(path, source_path, options, result, done_layers)
+                    break
+                except ScratchQuotaExceeded as e:
+                    if not e.fits or result['import_ids']:
+                        raise
+                    time.sleep(e.retry_after)
+    except Exception as e:
+        result['message'] = str(e)
+
+    result['seconds'] = round(time.monotonic() - started, 3)
+    return result
@@ -0,0 +1,80 @@
+from typing import Any, Dict, Iterable
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Columns, geometry type/SRID and planner row estimate of many tables in one
+# round trip, straight from the system catalogs
+CATALOG_SQL = """
+    SELECT c.relname,
+           a.attname,
+           format_type(a.atttypid, a.atttypmod),
+           gc.type,
+           gc.srid,
+           c.reltuples::bigint
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN geometry_columns gc
+           ON gc.f_table_schema = n.nspname
+          AND gc.f_table_name = c.relname
+          AND gc.f_geometry_column = a.attname
+    WHERE n.nspname = 'public'
+      AND c.relname = ANY(%s)
+    ORDER BY c.relname, a.attnum
+"""
+
+
+def _cache_key(table_name: str, table_version: int) -> str:
+    return f"geoimporter:catalog:{table_name}:{table_version}"
+
+
+def fetch_table_schemas(table_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Read the schema of a set of datastore tables with a single query"""
+    schemas = {}
+
+    with connections['datastore'].cursor() as cursor:
+        cursor.execute(CATALOG_SQL, [list(table_names)])
+        for table_name, column, data_type, geometry_type, srid, reltuples in cursor.fetchall():
+            schema = schemas.setdefault(table_name, {
+                'columns': [],
+                'geometry_type': None,
+                'srid': None,
+                # -1 means the table has never been analyzed
+                'estimated_row_count': max(reltuples, 0),
+                'analyzed': reltuples >= 0
+            })
+            schema['columns'].append([column, data_type])
+            if geometry_type and schema['geometry_type'] is None:
+                schema['geometry_type'] = geometry_type
+                schema['srid'] = srid
+
+    return schemas
+
+
+def get_catalog(imports) -> Dict[int, Dict[str, Any]]:
+    """Schema catalog of ShapefileImports, keyed by import id
+
+    Entries are cached per table_version, so only tables changed since the
+    last call are read from the datastore, all in one query.
+    """
+    imports = [imp for imp in imports if imp.table_name]
+    keys = {imp.id: _cache_key(imp.table_name, imp.table_version) for imp in imports}
+    cached = cache.get_many(keys.values())
+
+    missing = [imp for imp in imports if keys[imp.id] not in cached]
+    if missing:
+        schemas = fetch_table_schemas(imp.table_name for imp in missing)
+        fresh = {keys[imp.id]: schemas[imp.table_name] for imp in missing if imp.table_name in schemas}
+        # Tables never analyzed have no row estimate yet, so they are read again next time
+        cache.set_many(
+            {key: schema for key, schema in fresh.items() if schema['analyzed']},
+            getattr(settings, 'GEOIMPORTER_CATALOG_CACHE_TIMEOUT', 24 * 3600)
+        )
+        cached.update(fresh)
+
+    return {
+        imp.id: cached[keys[imp.id]]
+        for imp in imports
+        if keys[imp.id] in cached
+    }
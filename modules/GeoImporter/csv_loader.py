@@ -0,0 +1,231 @@
+import csv
+import datetime
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.db import DataError, connections
+from . import partitioned_loader
+from .format_loader import launder_column_name
+
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+BOOLEAN_VALUES = ('true', 'false', 't', 'f', 'yes', 'no')
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}$')
+
+
+class CsvMappingError(ValueError):
+    """Raised when the column mapping does not match the CSV header"""
+
+
+@dataclass
+class CsvMapping:
+    """How the geometry of each CSV row is built: x/y columns, a WKT column or a hex WKB column"""
+    x_column: Optional[str] = None
+    y_column: Optional[str] = None
+    wkt_column: Optional[str] = None
+    wkb_column: Optional[str] = None
+    srid: int = 4326
+    delimiter: str = ','
+    encoding: str = 'UTF8'
+
+    @property
+    def geometry_columns(self) -> List[str]:
+        """Source columns of the geometry that are not kept as attributes"""
+        return [column for column in (self.wkt_column, self.wkb_column) if column]
+
+
+def read_header(csv_path: str, mapping: CsvMapping) -> List[str]:
+    """Column names of a CSV file"""
+    with open(csv_path, newline='', encoding=_python_encoding(mapping.encoding)) as f:
+        return next(csv.reader(f, delimiter=mapping.delimiter), [])
+
+
+def validate_mapping(csv_path: str, mapping: CsvMapping) -> List[str]:
+    """Check the mapping against the CSV header and return the header"""
+    if len(mapping.delimiter) != 1:
+        raise CsvMappingError("delimiter must be a single character")
+
+    modes = [bool(mapping.x_column or mapping.y_column), bool(mapping.wkt_column), bool(mapping.wkb_column)]
+    if sum(modes) != 1:
+        raise CsvMappingError("Map either x_column and y_column, wkt_column or wkb_column")
+    if modes[0] and not (mapping.x_column and mapping.y_column):
+        raise CsvMappingError("x_column and y_column must both be given")
+
+    header = read_header(csv_path, mapping)
+    for column in (mapping.x_column, mapping.y_column, mapping.wkt_column, mapping.wkb_column):
+        if column and column not in header:
+            raise CsvMappingError(f"Column not found in CSV header: {column}")
+    return header
+
+
+def _python_encoding(encoding: str) -> str:
+    """Python codec name of a PostgreSQL encoding name"""
+    return {'UTF8': 'utf-8', 'LATIN1': 'latin-1', 'WIN1252': 'cp1252'}.get(encoding.upper(), encoding)
+
+
+def _value_type(value: str) -> str:
+    """Narrowest column type a single non-empty CSV value fits"""
+    try:
+        number = int(value)
+        return 'bigint' if INT64_RANGE[0] <= number <= INT64_RANGE[1] else 'numeric'
+    except ValueError:
+        pass
+    try:
+        float(value)
+        return 'double precision'
+    except ValueError:
+        pass
+    if value.lower() in BOOLEAN_VALUES:
+        return 'boolean'
+    if DATE_PATTERN.match(value):
+        try:
+            datetime.date.fromisoformat(value)
+            return 'date'
+        except ValueError:
+            return 'text'
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+        return 'timestamptz' if parsed.tzinfo else 'timestamp'
+    except ValueError:
+        return 'text'
+
+
+# Types a column is widened to when its sampled values disagree
+WIDENING = {
+    frozenset(['bigint', 'numeric']): 'numeric',
+    frozenset(['bigint', 'double precision']): 'double precision',
+    frozenset(['numeric', 'double precision']): 'double precision',
+    frozenset(['bigint', 'numeric', 'double precision']): 'double precision',
+    frozenset(['date', 'timestamp']): 'timestamp',
+    frozenset(['timestamp', 'timestamptz']): 'timestamptz',
+}
+
+
+def infer_types(csv_path: str, mapping: CsvMapping, header: List[str]) -> List[str]:
+    """Infer a PostgreSQL type per column from the first GEOIMPORTER_CSV_SAMPLE_ROWS rows"""
+    sample_rows = getattr(settings, 'GEOIMPORTER_CSV_SAMPLE_ROWS', 1000)
+    seen = [set() for _ in header]
+
+    with open(csv_path, newline='', encoding=_python_encoding(mapping.encoding)) as f:
+        reader = csv.reader(f, delimiter=mapping.delimiter)
+        next(reader, None)
+        for row_number, row in enumerate(reader):
+            if row_number >= sample_rows:
+                break
+            for index, value in enumerate(row[:len(header)]):
+                if value != '':
+                    seen[index].add(_value_type(value))
+
+    types = []
+    for kinds in seen:
+        if len(kinds) == 1:
+            types.append(kinds.pop())
+        else:
+            types.append(WIDENING.get(frozenset(kinds), 'text'))
+    return types
+
+
+def _geometry_sql(mapping: CsvMapping, raw_columns: dict) -> Tuple[str, str]:
+    """SQL building the geometry from the raw text columns, and its PostGIS type"""
+    if mapping.wkt_column:
+        column = raw_columns[mapping.wkt_column]
+        return f"ST_SetSRID(ST_GeomFromEWKT(NULLIF({column}, '')), %s)", 'Geometry'
+    if mapping.wkb_column:
+        column = raw_columns[mapping.wkb_column]
+        return f"ST_SetSRID(ST_GeomFromEWKB(decode(NULLIF({column}, ''), 'hex')), %s)", 'Geometry'
+    x_column, y_column = raw_columns[mapping.x_column], raw_columns[mapping.y_column]
+    return (
+        f"ST_SetSRID(ST_MakePoint(NULLIF({x_column}, '')::float8, NULLIF({y_column}, '')::float8), %s)",
+        'Point'
+    )
+
+
+def load_csv(import_record, csv_path: str, mapping: CsvMapping, target_srid: Optional[int] = None) -> Tuple[int, str]:
+    """Stream a CSV into the datastore with COPY and build its geometry in the database
+
+    The file is copied as is into an UNLOGGED table of text columns, so
+    PostgreSQL does the CSV parsing. One INSERT ... SELECT then casts the
+    attributes to their inferred types and builds (and reprojects) the
+    geometry into the final table, which is indexed once. Returns the row
+    count and a note when the inferred types had to be given up.
+    """
+    header = validate_mapping(csv_path, mapping)
+    types = infer_types(csv_path, mapping, header)
+    if target_srid is None and not import_record.keep_native_crs:
+        target_srid = 4326
+
+    connection = connections['datastore']
+    quote = connection.ops.quote_name
+    table_name = import_record.table_name
+    raw_table_name = f"{table_name}_raw"
+    table, raw_table = quote(table_name), quote(raw_table_name)
+
+    # Raw columns are positional, attributes get ogr2ogr style laundered names
+    raw = [f"c{index}" for index in range(len(header))]
+    raw_columns = {name: raw[index] for index, name in reversed(list(enumerate(header)))}
+    taken = set()
+    attributes = [
+        (launder_column_name(name, taken), raw[index], column_type)
+        for index, (name, column_type) in enumerate(zip(header, types))
+        if name not in mapping.geometry_columns
+    ]
+    geometry_sql, geometry_type = _geometry_sql(mapping, raw_columns)
+    srid = target_srid or mapping.srid
+    if srid != mapping.srid:
+        geometry_sql = f"ST_Transform({geometry_sql}, {int(srid)})"
+
+    note = ''
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {raw_table}")
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {raw_table} ({', '.join(f'{column} text' for column in raw)})"
+            )
+            with open(csv_path, 'rb') as f:
+                with cursor.copy(
+                    f"COPY {raw_table} FROM STDIN (FORMAT csv, HEADER true, DELIMITER %s, ENCODING %s)",
+                    [mapping.delimiter, mapping.encoding]
+                ) as copy:
+                    while True:
+                        chunk = f.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        copy.write(chunk)
+
+            for typed in (True, False):
+                definitions = ', '.join(
+                    f"{quote(column)} {column_type if typed else 'text'}" for column, _, column_type in attributes
+                )
+                cursor.execute(
+                    f"CREATE UNLOGGED TABLE {table} (gid serial PRIMARY KEY"
+                    f"{', ' + definitions if definitions else ''}, "
+                    f"geom geometry({geometry_type}, {int(srid)}))"
+                )
+                columns = [quote(column) for column, _, _ in attributes] + ['geom']
+                select = [
+                    f"NULLIF({raw}, '')" + (f"::{column_type}" if typed else '')
+                    for _, raw, column_type in attributes
+                ] + [geometry_sql]
+                try:
+                    cursor.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(select)} FROM {raw_table}",
+                        [mapping.srid]
+                    )
+                    rows = cursor.rowcount
+                    break
+                except DataError as e:
+                    if not typed:
+                        raise
+                    # A value past the sample did not fit its inferred type
+                    note = f" Attributes were loaded as text: {str(e).splitlines()[0]}"
+                    cursor.execute(f"DROP TABLE {table}")
+
+            cursor.execute(f"DROP TABLE {raw_table}")
+
+        partitioned_loader.finalize_table(table_name)
+    except Exception:
+        partitioned_loader.drop_table(raw_table_name)
+        partitioned_loader.drop_table(table_name)
+        raise
+
+    return rows, note
@@ -0,0 +1,41 @@
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections, transaction
+
+
+@contextmanager
+def server_side_cursor(using: str = 'datastore', name: str = None):
+    """Open a named (server-side) cursor on a pooled connection
+    
+    Rows stay on the server until they are fetched, so large reads against
+    imported tables can be consumed in batches with fetch_batches(). The
+    cursor lives inside a transaction on the given alias.
+    """
+    connection = connections[using]
+    
+    with transaction.atomic(using=using):
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(name=name or f"geoimporter_{uuid.uuid4().hex[:12]}")
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def fetch_batches(cursor, batch_size: int = None):
+    """Yield lists of rows from a cursor, batch_size rows per round trip"""
+    batch_size = batch_size or getattr(settings, 'GEOIMPORTER_CURSOR_BATCH_SIZE', 5000)
+    
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def stream_query(sql: str, params=None, using: str = 'datastore', batch_size: int = None):
+    """Run a query on a server-side cursor and yield its rows in batches"""
+    with server_side_cursor(using) as cursor:
+        cursor.execute(sql, params)
+        yield from fetch_batches(cursor, batch_size)
@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+from django.db import connections
+from django.http import StreamingHttpResponse
+from .catalog import get_catalog
+from .db import stream_query
+from .scratch import ScratchSpace
+from .spatial_query import SpatialQueryError, build_where, properties_sql
+
+# format -> (content type, file extension, OGR driver for file-based formats)
+EXPORT_FORMATS = {
+    'geojson': ('application/geo+json', 'geojson', None),
+    'ndjson': ('application/x-ndjson', 'ndjson', None),
+    'fgb': ('application/flatgeobuf', 'fgb', 'FlatGeobuf'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', 'Parquet'),
+}
+
+
+@dataclass
+class ExportFilter:
+    """Optional bbox (in srid) and attribute equality filters for an export"""
+    bbox: Optional[List[float]] = None
+    srid: int = 4326
+    filters: Optional[Dict[str, Any]] = None
+
+
+def _filtered_select(import_record, export_filter: ExportFilter, select: str):
+    """SELECT over an imported table with the export filters applied"""
+    catalog = get_catalog([import_record]).get(import_record.id)
+    if not catalog:
+        raise ValueError("Table not found in datastore")
+    columns = [column[0] for column in catalog['columns']]
+
+    conditions, params = build_where(import_record, export_filter, columns)
+    table = connections['datastore'].ops.quote_name(import_record.table_name)
+    sql = f"SELECT {select} FROM {table} t WHERE {' AND '.join(conditions) or 'TRUE'}"
+    return sql, params
+
+
+def iter_geojson(import_record, export_filter: ExportFilter, collection: bool = True) -> Iterator[bytes]:
+    """Stream features as a GeoJSON FeatureCollection or newline-delimited GeoJSON
+
+    Features are encoded by PostGIS and read from a server-side cursor in
+    batches, so memory use does not depend on the layer size.
+    """
+    sql, params = _filtered_select(
+        import_record, export_filter,
+        "json_build_object("
+        "'type', 'Feature', "
+        "'id', t.gid, "
+        "'geometry', ST_AsGeoJSON(ST_Transform(t.geom, 4326))::json, "
+        f"'properties', {properties_sql(import_record, include_gid=False)}"
+        ")::text"
+    )
+
+    if collection:
+        yield b'{"type": "FeatureCollection", "features": [\n'
+
+    first = True
+    for rows in stream_query(sql, params):
+        if collection:
+            chunk = ',\n'.join(row[0] for row in rows)
+            if not first:
+                chunk = ',\n' + chunk
+            first = False
+        else:
+            chunk = ''.join(row[0] + '\n' for row in rows)
+        yield chunk.encode('utf-8')
+
+    if collection:
+        yield b'\n]}\n'
+
+
+def estimate_export_bytes(import_record) -> int:
+    """Scratch bytes reserved for an ogr2ogr export: twice the table, for the file and its index"""
+    table = connections['datastore'].ops.quote_name(import_record.table_name)
+    with connections['datastore'].cursor() as cursor:
+        cursor.execute("SELECT pg_table_size(%s::regclass)", [table])
+        return 2 * cursor.fetchone()[0]
+
+
+def export_with_ogr(import_record, export_filter: ExportFilter, export_format: str, scratch: ScratchSpace) -> str:
+    """Write a filtered layer with ogr2ogr into a scratch directory and return the file path
+
+    Used for formats whose spatial index or footer is only known once every
+    feature is written (FlatGeobuf, GeoParquet); ogr2ogr reads the datastore
+    through its own cursor in batches. The reservation grows to the size of
+    the file when the estimate was short. Partitioned imports, whose
+    attributes are one JSONB column, are rejected.
+    """
+    if import_record.storage_mode == 'partitioned':
+        raise SpatialQueryError(
+            f"{export_format} exports of partitioned imports are not supported, their attributes are JSON; "
+            f"use geojson or ndjson"
+        )
+    _, extension, driver = EXPORT_FORMATS[export_format]
+    sql, params = _filtered_select(import_record, export_filter, "t.*")
+    connection = connections['datastore']
+    sql = connection.ops.compose_sql(sql, params)
+
+    output_path = os.path.join(scratch.path, f"{import_record.table_name}.{extension}")
+
+    cmd = [
+        'ogr2ogr',
+        '-f', driver,
+        output_path,
+        import_record._get_datastore_conn_str(),
+        '-sql', sql,
+        '-nln', import_record.table_name,
+    ]
+    if driver == 'FlatGeobuf':
+        cmd += ['-lco', 'SPATIAL_INDEX=YES']
+    else:
+        cmd += ['-lco', 'GEOMETRY_ENCODING=WKB', '-lco', 'COMPRESSION=ZSTD']
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Error exporting layer: {result.stderr}")
+
+    size = os.path.getsize(output_path)
+    if size > scratch.reserved:
+        scratch.reserve(size - scratch.reserved)
+    return output_path
+
+
+def iter_file(path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Stream a file in chunks"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class ScratchStreamingResponse(StreamingHttpResponse):
+    """Streaming response releasing a ScratchSpace when the server closes it
+
+    The server closes every response it was given, so the scratch directory
+    is removed even when the client goes away before the body is read.
+    """
+
+    def __init__(self, streaming_content, scratch: Optional[ScratchSpace] = None, *args, **kwargs):
+        super().__init__(streaming_content, *args, **kwargs)
+        self.scratch = scratch
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.scratch is not None:
+                self.scratch.__exit__(None, None, None)
+                self.scratch = None
+
+
+def _close_iterator(iterator):
+    """Close a generator and the database connections of the current thread"""
+    close = getattr(iterator, 'close', None)
+    if close:
+        close()
+    connections.close_all()
+
+
+async def aiter_in_thread(iterator: Iterator[bytes]):
+    """Consume a blocking iterator from one dedicated thread for ASGI streaming
+
+    A server-side cursor is bound to the connection of the thread that opened
+    it, so every batch has to be fetched from the same thread. Each batch runs
+    in a copy of the caller's context, like sync_to_async.
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, contextvars.copy_context().run, next, iterator, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        await loop.run_in_executor(executor, _close_iterator, iterator)
+        executor.shutdown(wait=False)
@@ -0,0 +1,376 @@
+import decimal
+import json
+import os
+import re
+import sys
+from typing import Any, List, Optional, Tuple
+from django.conf import settings
+from django.db import connections
+from psycopg.adapt import PyFormat, Transformer
+from . import partitioned_loader
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - the fast path is optional
+    pa = pc = pq = None
+
+try:
+    from pyogrio.raw import open_arrow
+    from pyogrio import list_layers as ogr_list_layers
+except ImportError:  # pragma: no cover - the fast path is optional
+    open_arrow = ogr_list_layers = None
+
+# extension -> source format name, in the order a zip is searched
+SOURCE_FORMATS = {
+    '.shp': 'shapefile',
+    '.fgb': 'flatgeobuf',
+    '.gpkg': 'geopackage',
+    '.parquet': 'geoparquet',
+}
+
+# Files making up a shapefile, counted in its source size
+SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+POSTGIS_GEOMETRY_TYPES = (
+    'Point', 'LineString', 'Polygon', 'MultiPoint', 'MultiLineString', 'MultiPolygon', 'GeometryCollection'
+)
+
+# Framing of the binary COPY format: signature, flags and header extension length, then the trailer
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00' + b'\x00' * 8
+COPY_TRAILER = b'\xff\xff'
+# Length -1 marks a NULL field
+NULL_FIELD = b'\xff\xff\xff\xff'
+# Binary dates and timestamps count from 2000-01-01 instead of 1970-01-01
+PG_EPOCH_DAYS = 10957
+PG_EPOCH_MICROSECONDS = PG_EPOCH_DAYS * 86400 * 1000000
+
+# Byte width of the fixed-width binary COPY types, encoded with Arrow compute like
+# text and bytea; the others (numeric, time, JSON of nested values) go through
+# the psycopg dumpers
+FIXED_WIDTH_TYPES = {'boolean': 1, 'int2': 2, 'int4': 4, 'int8': 8, 'float4': 4, 'float8': 8, 'date': 4,
+                     'timestamp': 8, 'timestamptz': 8}
+
+
+class UnsupportedSource(ValueError):
+    """Raised when a source cannot take the COPY fast path and needs ogr2ogr"""
+
+
+def source_format(path: str) -> Optional[str]:
+    """Source format name of a dataset path, None if not supported"""
+    return SOURCE_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def source_size(path: str) -> int:
+    """Size in bytes of a dataset, including the sidecar files of a shapefile"""
+    if source_format(path) != 'shapefile':
+        return os.path.getsize(path)
+    base_path = os.path.splitext(path)[0]
+    return sum(
+        os.path.getsize(base_path + ext)
+        for part in SHAPEFILE_PARTS
+        for ext in (part, part.upper())
+        if os.path.exists(base_path + ext)
+    )
+
+
+def find_source(path: str) -> Optional[str]:
+    """Dataset to import: a supported file itself, or the first supported dataset in an extracted directory"""
+    if not os.path.isdir(path):
+        return path if source_format(path) else None
+
+    found = {}
+    for root, _, files in os.walk(path):
+        for file in sorted(files):
+            found.setdefault(source_format(file), os.path.join(root, file))
+    for format_name in SOURCE_FORMATS.values():
+        if format_name in found:
+            return found[format_name]
+    return None
+
+
+def list_layers(path: str) -> List[Optional[str]]:
+    """Layers to import from a dataset: every spatial GeoPackage layer, else [None]"""
+    if source_format(path) != 'geopackage':
+        return [None]
+
+    if ogr_list_layers is not None:
+        return [name for name, geometry_type in ogr_list_layers(path) if geometry_type]
+
+    # Without pyogrio read the layer list from ogrinfo
+    import subprocess
+    result = subprocess.run(['ogrinfo', '-ro', '-q', path], capture_output=True, text=True)
+    layers = []
+    for line in result.stdout.splitlines():
+        match = re.match(r'\d+: (\S+) \((.+)\)', line.strip())
+        if match and match.group(2) != 'None':
+            layers.append(match.group(1))
+    return layers
+
+
+def launder_column_name(name: str, taken: set) -> str:
+    """Column name as ogr2ogr would create it: lower case, [a-z0-9_] only, unique"""
+    column = re.sub(r'[^a-z0-9_]', '_', name.lower()) or 'field'
+    if column in ('gid', 'geom'):
+        column += '_1'
+    base, n = column, 1
+    while column in taken:
+        n += 1
+        column = f"{base}_{n}"
+    taken.add(column)
+    return column
+
+
+def _column_type(arrow_type) -> Tuple[str, str]:
+    """PostgreSQL column type and binary COPY type of an Arrow type"""
+    if pa.types.is_dictionary(arrow_type):
+        return _column_type(arrow_type.value_type)
+    if pa.types.is_boolean(arrow_type):
+        return 'boolean', 'boolean'
+    if pa.types.is_int8(arrow_type) or pa.types.is_int16(arrow_type) or pa.types.is_uint8(arrow_type):
+        return 'smallint', 'int2'
+    if pa.types.is_int32(arrow_type) or pa.types.is_uint16(arrow_type):
+        return 'integer', 'int4'
+    if pa.types.is_uint64(arrow_type):
+        return 'numeric', 'numeric'
+    if pa.types.is_integer(arrow_type):
+        return 'bigint', 'int8'
+    if pa.types.is_float16(arrow_type) or pa.types.is_float32(arrow_type):
+        return 'real', 'float4'
+    if pa.types.is_floating(arrow_type):
+        return 'double precision', 'float8'
+    if pa.types.is_decimal(arrow_type):
+        return 'numeric', 'numeric'
+    if pa.types.is_date(arrow_type):
+        return 'date', 'date'
+    if pa.types.is_timestamp(arrow_type):
+        return ('timestamptz', 'timestamptz') if arrow_type.tz else ('timestamp', 'timestamp')
+    if pa.types.is_time(arrow_type):
+        return 'time', 'time'
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return 'bytea', 'bytea'
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return 'text', 'text'
+    # Lists, structs and maps are stored as JSON text
+    return 'text', 'text'
+
+
+def _postgis_type(geometry_types: List[str]) -> str:
+    """PostGIS geometry type modifier for a set of source geometry type names"""
+    bases = {geometry_type.split(' ')[0] for geometry_type in geometry_types}
+    base = bases.pop() if len(bases) == 1 else 'Geometry'
+    if base not in POSTGIS_GEOMETRY_TYPES:
+        base = 'Geometry'
+    dims = {geometry_type.partition(' ')[2] for geometry_type in geometry_types}
+    if any('M' in dim for dim in dims):
+        raise UnsupportedSource("Measured geometries are loaded with ogr2ogr")
+    return base + ('Z' if any('Z' in dim for dim in dims) else '')
+
+
+def _epsg_from_crs(crs: Any) -> Optional[int]:
+    """EPSG code of a CRS given as 'EPSG:xxxx' or PROJJSON, None if unknown"""
+    if isinstance(crs, str):
+        match = re.match(r'EPSG:(\d+)$', crs.strip(), re.IGNORECASE)
+        if match:
+            return int(match.group(1))
+        if crs.strip().upper() == 'OGC:CRS84':
+            return 4326
+        return None
+    if isinstance(crs, dict):
+        crs_id = crs.get('id') or {}
+        if crs_id.get('authority', '').upper() == 'EPSG':
+            return int(crs_id['code'])
+        if crs_id.get('authority', '').upper() == 'OGC' and str(crs_id.get('code')) == 'CRS84':
+            return 4326
+    return None
+
+
+def _open_parquet(path: str, batch_size: int):
+    """Schema, geometry column, SRID, geometry types and batches of a GeoParquet file"""
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.schema_arrow.metadata or {}
+    if b'geo' not in metadata:
+        raise UnsupportedSource("Parquet file has no GeoParquet metadata")
+
+    geo = json.loads(metadata[b'geo'])
+    geometry_column = geo['primary_column']
+    column_meta = geo['columns'][geometry_column]
+    if column_meta.get('encoding', 'WKB').upper() != 'WKB':
+        raise UnsupportedSource("Only WKB encoded GeoParquet geometries are bulk-loaded")
+
+    # A missing crs means OGC:CRS84, an explicit null means unknown
+    srid = _epsg_from_crs(column_meta['crs']) if 'crs' in column_meta else 4326
+    batches = parquet_file.iter_batches(batch_size=batch_size)
+    return parquet_file.schema_arrow, geometry_column, srid, column_meta.get('geometry_types') or [], batches
+
+
+def copy_load(import_record, path: str, layer: Optional[str] = None, table_name: str = None) -> int:
+    """Bulk-load a FlatGeobuf, GeoPackage layer or GeoParquet file with binary COPY
+
+    Arrow record batches are written to an UNLOGGED table without indexes, then
+    reprojected if needed, indexed and made durable once. Returns the number of
+    features loaded; raises UnsupportedSource when ogr2ogr has to be used instead.
+    """
+    if pa is None:
+        raise UnsupportedSource("pyarrow is not installed")
+
+    table_name = table_name or import_record.table_name
+    batch_size = getattr(settings, 'GEOIMPORTER_COPY_BATCH_SIZE', 65536)
+    format_name = source_format(path)
+
+    if format_name == 'geoparquet':
+        schema, geometry_column, srid, geometry_types, batches = _open_parquet(path, batch_size)
+        return _copy_batches(import_record, table_name, schema, geometry_column, srid, geometry_types, batches)
+
+    if open_arrow is None:
+        raise UnsupportedSource("pyogrio is not installed")
+
+    with open_arrow(path, layer=layer, batch_size=batch_size, use_pyarrow=True) as (meta, reader):
+        # pyogrio reports an empty name when the driver has none and then uses wkb_geometry
+        geometry_column = meta.get('geometry_name') or 'wkb_geometry'
+        srid = _epsg_from_crs(meta.get('crs'))
+        geometry_type = meta.get('geometry_type') or 'Unknown'
+        return _copy_batches(
+            import_record, table_name, reader.schema, geometry_column, srid,
+            [geometry_type], reader
+        )
+
+
+def _copy_batches(import_record, table_name, schema, geometry_column, source_srid, geometry_types, batches) -> int:
+    """Create the table for an Arrow schema and COPY the batches into it"""
+    if source_srid is None:
+        raise UnsupportedSource("Source CRS has no EPSG code")
+    if geometry_column not in schema.names:
+        raise UnsupportedSource("Source has no geometry column")
+
+    target_srid = None if import_record.keep_native_crs else 4326
+    geometry_type = _postgis_type(geometry_types)
+
+    taken = set()
+    fields = []
+    for index, field in enumerate(schema):
+        if field.name == geometry_column:
+            continue
+        column_type, copy_type = _column_type(field.type)
+        fields.append((index, launder_column_name(field.name, taken), column_type, copy_type, field.type))
+
+    connection = connections['datastore']
+    quote = connection.ops.quote_name
+    table = quote(table_name)
+    geometry_index = schema.get_field_index(geometry_column)
+    copy_columns = [quote(column) for _, column, _, _, _ in fields] + ['geom']
+    copy_fields = [(index, copy_type) for index, _, _, copy_type, _ in fields] + [(geometry_index, 'bytea')]
+
+    rows = 0
+    try:
+        with connection.cursor() as cursor:
+            definitions = ', '.join(f"{quote(column)} {column_type}" for _, column, column_type, _, _ in fields)
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {table} (gid serial PRIMARY KEY"
+                f"{', ' + definitions if definitions else ''}, "
+                f"geom geometry({geometry_type}, {int(source_srid)}))"
+            )
+
+            # WKB is the binary input format of geometry, so it is sent as raw bytes
+            with cursor.copy(f"COPY {table} ({', '.join(copy_columns)}) FROM STDIN (FORMAT BINARY)") as copy:
+                transformer = Transformer(cursor.connection)
+                copy.write(COPY_SIGNATURE)
+                for batch in batches:
+                    if batch.num_rows:
+                        copy.write(encode_copy_rows(batch, copy_fields, transformer))
+                        rows += batch.num_rows
+                copy.write(COPY_TRAILER)
+
+            if target_srid and target_srid != source_srid:
+                # One rewrite before the index is built
+                cursor.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN geom TYPE geometry({geometry_type}, {int(target_srid)}) "
+                    f"USING ST_Transform(geom, {int(target_srid)})"
+                )
+
+        partitioned_loader.finalize_table(table_name)
+    except Exception:
+        partitioned_loader.drop_table(table_name)
+        raise
+
+    return rows
+
+
+def _fixed_width_bytes(array, width: int):
+    """Big-endian bytes of the values of a primitive Arrow array, as large_binary"""
+    values = pa.Array.from_buffers(pa.binary(width), len(array), array.buffers()[:2], offset=array.offset)
+    values = values.cast(pa.large_binary())
+    return pc.binary_reverse(values) if sys.byteorder == 'little' else values
+
+
+def _fixed_width_values(column, copy_type: str):
+    """Arrow array of the binary representation width of a COPY type"""
+    if copy_type == 'boolean':
+        return column.cast(pa.uint8())
+    if copy_type == 'date':
+        return pc.subtract(column.cast(pa.date32()).cast(pa.int32()), pa.scalar(PG_EPOCH_DAYS, pa.int32()))
+    if copy_type in ('timestamp', 'timestamptz'):
+        microseconds = column.cast(pa.timestamp('us', tz=column.type.tz), safe=False).cast(pa.int64())
+        return pc.subtract(microseconds, pa.scalar(PG_EPOCH_MICROSECONDS, pa.int64()))
+    if copy_type == 'float4':
+        return column.cast(pa.float32())
+    if copy_type == 'float8':
+        return column.cast(pa.float64())
+    return column.cast({'int2': pa.int16(), 'int4': pa.int32(), 'int8': pa.int64()}[copy_type])
+
+
+def _copy_field(column, copy_type: str, transformer) -> Tuple[Any, Any]:
+    """Length prefixes and value bytes of the binary COPY fields of an Arrow column"""
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+
+    width = FIXED_WIDTH_TYPES.get(copy_type)
+    if width:
+        values = _fixed_width_bytes(_fixed_width_values(column, copy_type), width)
+        length = pa.scalar(width.to_bytes(4, 'big'), pa.large_binary())
+    else:
+        if copy_type in ('text', 'bytea') and (
+            pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+            or pa.types.is_binary(column.type) or pa.types.is_large_binary(column.type)
+        ):
+            values = column.cast(pa.large_binary())
+        else:
+            values = pa.array(
+                [None if value is None else bytes(transformer.get_dumper(value, PyFormat.BINARY).dump(value))
+                 for value in _column_values(column, column.type)],
+                pa.large_binary()
+            )
+        length = _fixed_width_bytes(pc.binary_length(values).cast(pa.int32()), 4)
+
+    if column.null_count:
+        # A NULL field is its length, -1, without a value
+        length = pc.if_else(column.is_null(), pa.scalar(NULL_FIELD, pa.large_binary()), length)
+        values = values.fill_null(b'')
+    return length, values
+
+
+def encode_copy_rows(batch, copy_fields: List[Tuple[int, str]], transformer) -> memoryview:
+    """Rows of an Arrow record batch in the binary COPY format, encoded column by column
+
+    Each (column index, COPY type) becomes arrays of length prefixes and value
+    bytes with Arrow compute, and Arrow joins them into rows, which come out
+    as one contiguous buffer written to COPY as it is.
+    """
+    parts = [pa.scalar(len(copy_fields).to_bytes(2, 'big'), pa.large_binary())]
+    for index, copy_type in copy_fields:
+        parts.extend(_copy_field(batch.column(index), copy_type, transformer))
+    rows = pc.binary_join_element_wise(*parts, pa.scalar(b'', pa.large_binary()))
+    _, offsets, data = rows.buffers()
+    offsets = memoryview(offsets).cast('q')
+    return memoryview(data)[offsets[rows.offset]:offsets[rows.offset + len(rows)]]
+
+
+def _column_values(column, arrow_type) -> List[Any]:
+    """Python values of an Arrow column in the form their COPY type expects"""
+    values = column.to_pylist()
+    if pa.types.is_uint64(arrow_type):
+        return [value if value is None else decimal.Decimal(value) for value in values]
+    if pa.types.is_nested(arrow_type):
+        return [value if value is None else json.dumps(value, default=str) for value in values]
+    return values
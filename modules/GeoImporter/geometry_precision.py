@@ -0,0 +1,79 @@
+from typing import Any, Dict, Tuple
+from django.db import connections
+
+# Metres per degree at the equator, to express a metric grid on geographic layers
+METRES_PER_DEGREE = 111320.0
+
+
+def grid_size(cursor, table_name: str, grid_metres: float) -> Tuple[float, bool]:
+    """Grid size in the units of the table SRS, and whether those units are degrees"""
+    cursor.execute(
+        "SELECT position('+proj=longlat' in proj4text) > 0 FROM spatial_ref_sys "
+        "WHERE srid = Find_SRID('public', %s, 'geom')",
+        [table_name]
+    )
+    row = cursor.fetchone()
+    geographic = bool(row and row[0])
+    return (grid_metres / METRES_PER_DEGREE if geographic else grid_metres), geographic
+
+
+def _measure(cursor, table: str) -> Dict[str, int]:
+    cursor.execute(
+        f"SELECT COALESCE(sum(ST_NPoints(geom)), 0), COALESCE(sum(ST_MemSize(geom)), 0), count(geom), "
+        f"pg_total_relation_size(%s::regclass) FROM {table}",
+        [table]
+    )
+    vertices, geometry_bytes, geometries, table_bytes = cursor.fetchone()
+    return {
+        'vertices': int(vertices),
+        'geometry_bytes': int(geometry_bytes),
+        'geometries': geometries,
+        'table_bytes': table_bytes,
+    }
+
+
+def snap_table(table_name: str, grid_metres: float) -> Dict[str, Any]:
+    """Snap the geometries of a table to a grid and drop the points and parts that collapse
+
+    The grid is given in metres and converted to degrees for geographic
+    layers. Coordinates are rounded with ST_SnapToGrid, which also removes
+    rings and parts collapsing to nothing, then ST_RemoveRepeatedPoints drops
+    the consecutive duplicates the snapping creates. Geometries collapsing
+    entirely become NULL. The column is rewritten with ALTER TABLE ... USING,
+    a single table rewrite leaving no dead rows. Returns vertex, geometry
+    byte and table byte counts before and after.
+    """
+    quote = connections['datastore'].ops.quote_name
+    table = quote(table_name)
+
+    with connections['datastore'].cursor() as cursor:
+        grid, geographic = grid_size(cursor, table_name, grid_metres)
+        before = _measure(cursor, table)
+
+        cursor.execute(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = 'geom'",
+            [table]
+        )
+        geometry_type = cursor.fetchone()[0]
+
+        snapped = f"ST_RemoveRepeatedPoints(ST_SnapToGrid(geom, {float(grid)!r}))"
+        # Transform expressions cannot hold subqueries, so the snapped geometry is written twice
+        cursor.execute(
+            f"ALTER TABLE {table} ALTER COLUMN geom TYPE {geometry_type} "
+            f"USING CASE WHEN ST_IsEmpty({snapped}) THEN NULL ELSE {snapped} END"
+        )
+        cursor.execute(f"ANALYZE {table}")
+        after = _measure(cursor, table)
+
+    return {
+        'grid_metres': grid_metres,
+        'grid': grid,
+        'geographic': geographic,
+        'before': before,
+        'after': after,
+        'collapsed': before['geometries'] - after['geometries'],
+        'vertices_removed': before['vertices'] - after['vertices'],
+        'geometry_bytes_saved': before['geometry_bytes'] - after['geometry_bytes'],
+        'table_bytes_saved': before['table_bytes'] - after['table_bytes'],
+    }
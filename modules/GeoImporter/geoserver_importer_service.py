@@ -1,8 +1,56 @@
 import requests
 import json
 import os
+import uuid
 from django.conf import settings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from .http_client import async_client
+
+
+class MultipartFileStream:
+    """multipart/form-data body that streams a file from disk in chunks"""
+    
+    chunk_size = 1024 * 1024
+    
+    def __init__(self, file_path: str, filename: str, fields: Dict[str, str] = None,
+                 field_name: str = 'file', content_type: str = 'application/zip'):
+        self.file_path = file_path
+        self.boundary = uuid.uuid4().hex
+        
+        head = b''
+        for key, value in (fields or {}).items():
+            head += (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                f'{value}\r\n'
+            ).encode('utf-8')
+        head += (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        
+        self.head = head
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+    
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+    
+    def __len__(self):
+        # Lets requests send a Content-Length instead of a chunked body
+        return len(self.head) + os.path.getsize(self.file_path) + len(self.tail)
+    
+    def __iter__(self):
+        yield self.head
+        with open(self.file_path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
+
 
 class GeoServerImporterService:
     """Service for using GeoServer Importer Plugin directly"""
@@ -12,6 +60,7 @@ class GeoServerImporterService:
         self.username = getattr(settings, 'GEOSERVER_USERNAME', 'admin')
         self.password = getattr(settings, 'GEOSERVER_PASSWORD', 'geoserver')
         self.workspace = getattr(settings, 'GEOSERVER_WORKSPACE', 'geograph')
+        self.datastore_name = getattr(settings, 'GEOSERVER_DATASTORE', 'geograph_datastore')
         
     def _get_auth(self):
         """Get authentication tuple for requests"""
@@ -30,29 +79,27 @@ class GeoServerImporterService:
             'Accept': 'application/json'
         }
     
-    def create_import_task(self, file_data: bytes, filename: str) -> Optional[Dict[str, Any]]:
-        """Create a new import task in GeoServer"""
+    def create_import_task(self, file_path: str, filename: str) -> Optional[Dict[str, Any]]:
+        """Create a new import task in GeoServer, streaming the zip from disk"""
         url = f"{self.base_url}/rest/imports"
         
-        # Prepare multipart form data
-        files = {
-            'file': (filename, file_data, 'application/zip')
-        }
-        
-        data = {
+        # Prepare multipart form data without loading the file into memory
+        body = MultipartFileStream(file_path, filename, fields={
             'targetWorkspace': self.workspace,
             'targetStore': 'new',  # Create new store
             'targetLayerName': filename.replace('.zip', ''),
             'createLayer': 'true'
-        }
+        })
+        
+        headers = self._get_multipart_headers()
+        headers['Content-Type'] = body.content_type
         
         try:
             response = requests.post(
                 url,
                 auth=self._get_auth(),
-                headers=self._get_multipart_headers(),
-                files=files,
-                data=data
+                headers=headers,
+                data=body
             )
             
             if response.status_code in [200, 201]:
@@ -65,6 +112,106 @@ class GeoServerImporterService:
             print(f"Exception creating import task: {str(e)}")
             return None
     
+    def create_import_context(self, target_store: str = None) -> Optional[Dict[str, Any]]:
+        """Create an empty import context that loads into an existing store"""
+        if not target_store:
+            target_store = self.datastore_name
+            
+        url = f"{self.base_url}/rest/imports"
+        
+        data = {
+            "import": {
+                "targetWorkspace": {"workspace": {"name": self.workspace}},
+                "targetStore": {"dataStore": {"name": target_store}}
+            }
+        }
+        
+        try:
+            response = requests.post(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers(),
+                data=json.dumps(data)
+            )
+            
+            if response.status_code in [200, 201]:
+                return response.json()
+            else:
+                print(f"Error creating import context: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception creating import context: {str(e)}")
+            return None
+    
+    def add_import_task(self, import_id: int, file_path: str, filename: str) -> Optional[Dict[str, Any]]:
+        """Add a file to an import context as a new task, streaming it from disk"""
+        url = f"{self.base_url}/rest/imports/{import_id}/tasks"
+        
+        body = MultipartFileStream(file_path, filename, fields={'name': filename}, field_name='filedata')
+        
+        headers = self._get_multipart_headers()
+        headers['Content-Type'] = body.content_type
+        
+        try:
+            response = requests.post(
+                url,
+                auth=self._get_auth(),
+                headers=headers,
+                data=body
+            )
+            
+            if response.status_code in [200, 201]:
+                return response.json()
+            else:
+                print(f"Error adding import task: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception adding import task: {str(e)}")
+            return None
+    
+    def execute_import(self, import_id: int, asynchronous: bool = True) -> bool:
+        """Run all tasks of an import context, in the background by default"""
+        url = f"{self.base_url}/rest/imports/{import_id}"
+        if asynchronous:
+            url += "?async=true"
+        
+        try:
+            response = requests.post(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers()
+            )
+            
+            if response.status_code in [200, 202, 204]:
+                return True
+            else:
+                print(f"Error executing import: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"Exception executing import: {str(e)}")
+            return False
+    
+    def import_to_datastore(self, files: List[Tuple[str, str]], target_store: str = None) -> Optional[Dict[str, Any]]:
+        """Load several (file_path, filename) uploads into the PostGIS store as one import context"""
+        context = self.create_import_context(target_store)
+        if not context:
+            return None
+        
+        import_id = context['import']['id']
+        for file_path, filename in files:
+            if not self.add_import_task(import_id, file_path, filename):
+                self.delete_import(import_id)
+                return None
+        
+        if not self.execute_import(import_id):
+            self.delete_import(import_id)
+            return None
+        
+        return self.get_import_status(import_id) or context
+    
     def get_import_status(self, import_id: int) -> Optional[Dict[str, Any]]:
         """Get status of an import task"""
         url = f"{self.base_url}/rest/imports/{import_id}"
@@ -86,6 +233,28 @@ class GeoServerImporterService:
             print(f"Exception getting import status: {str(e)}")
             return None
     
+    async def aget_import_status(self, import_id: int) -> Optional[Dict[str, Any]]:
+        """Async version of get_import_status using the shared connection pool"""
+        url = f"{self.base_url}/rest/imports/{import_id}"
+        
+        try:
+            async with async_client() as client:
+                response = await client.get(
+                    url,
+                    auth=self._get_auth(),
+                    headers=self._get_headers()
+                )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"Error getting import status: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception getting import status: {str(e)}")
+            return None
+    
     def list_imports(self) -> Optional[Dict[str, Any]]:
         """List all import tasks"""
         url = f"{self.base_url}/rest/imports"
@@ -149,6 +318,28 @@ class GeoServerImporterService:
             print(f"Exception getting layer info: {str(e)}")
             return None
     
+    async def aget_layer_info(self, layer_name: str) -> Optional[Dict[str, Any]]:
+        """Async version of get_layer_info using the shared connection pool"""
+        url = f"{self.base_url}/rest/layers/{self.workspace}:{layer_name}"
+        
+        try:
+            async with async_client() as client:
+                response = await client.get(
+                    url,
+                    auth=self._get_auth(),
+                    headers=self._get_headers()
+                )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"Error getting layer info: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception getting layer info: {str(e)}")
+            return None
+    
     def get_wms_url(self, layer_name: str) -> str:
         """Get WMS URL for a layer"""
         return f"{self.base_url}/wms?service=WMS&version=1.1.0&request=GetMap&layers={self.workspace}:{layer_name}&styles=&bbox=-180,-90,180,90&width=768&height=384&srs=EPSG:4326&format=image/png"
@@ -2,7 +2,8 @@ import requests
 import json
 import os
 from django.conf import settings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+from .http_client import async_client
 
 class GeoServerService:
     """Service for interacting with GeoServer REST API"""
@@ -128,8 +129,16 @@ class GeoServerService:
             print(f"Exception creating datastore: {str(e)}")
             return False
     
-    def publish_layer(self, datastore_name: str, table_name: str, layer_name: str = None) -> bool:
-        """Publish a layer from PostGIS table to GeoServer"""
+    def _bounding_box(self, bbox: List[float], crs: str) -> Dict[str, Any]:
+        """GeoServer bounding box from [minx, miny, maxx, maxy]"""
+        return {"minx": bbox[0], "miny": bbox[1], "maxx": bbox[2], "maxy": bbox[3], "crs": crs}
+    
+    def publish_layer(self, datastore_name: str, table_name: str, layer_name: str = None, srs: str = 'EPSG:4326',
+                      native_bbox: Optional[List[float]] = None, latlon_bbox: Optional[List[float]] = None) -> bool:
+        """Publish a layer from PostGIS table to GeoServer in the table's native SRS
+        
+        Declared bounds spare GeoServer from scanning the table to compute them.
+        """
         if not layer_name:
             layer_name = table_name
             
@@ -142,11 +151,14 @@ class GeoServerService:
                 "title": layer_name,
                 "abstract": f"Layer imported from {table_name}",
                 "enabled": True,
-                "srs": "EPSG:4326",
-                "nativeCRS": "EPSG:4326",
+                "srs": srs,
+                "nativeCRS": srs,
                 "projectionPolicy": "FORCE_DECLARED"
             }
         }
+        if native_bbox and latlon_bbox:
+            data["featureType"]["nativeBoundingBox"] = self._bounding_box(native_bbox, srs)
+            data["featureType"]["latLonBoundingBox"] = self._bounding_box(latlon_bbox, "EPSG:4326")
         
         try:
             response = requests.post(
@@ -168,6 +180,58 @@ class GeoServerService:
             print(f"Exception publishing layer: {str(e)}")
             return False
     
+    def publish_sql_view(self, datastore_name: str, layer_name: str, sql: str, parameters: List[Dict[str, str]],
+                         key_column: str = 'gid', srid: int = 4326) -> bool:
+        """Publish a parameterized SQL view layer over the PostGIS datastore"""
+        url = f"{self.base_url}/rest/workspaces/{self.workspace}/datastores/{datastore_name}/featuretypes"
+        srs = f"EPSG:{srid}"
+        
+        data = {
+            "featureType": {
+                "name": layer_name,
+                "nativeName": layer_name,
+                "title": layer_name,
+                "abstract": "Shared layer of partitioned imports, select one with viewparams",
+                "enabled": True,
+                "srs": srs,
+                "nativeCRS": srs,
+                "projectionPolicy": "FORCE_DECLARED",
+                "metadata": {
+                    "entry": [{
+                        "@key": "JDBC_VIRTUAL_TABLE",
+                        "virtualTable": {
+                            "name": layer_name,
+                            "sql": sql,
+                            "escapeSql": False,
+                            "keyColumn": key_column,
+                            "geometry": {"name": "geom", "type": "Geometry", "srid": srid},
+                            "parameter": parameters
+                        }
+                    }]
+                }
+            }
+        }
+        
+        try:
+            response = requests.post(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers(),
+                data=json.dumps(data)
+            )
+            
+            if response.status_code in [200, 201]:
+                return True
+            elif response.status_code == 409:  # Layer already exists
+                return True
+            else:
+                print(f"Error publishing SQL view: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"Exception publishing SQL view: {str(e)}")
+            return False
+    
     def get_layer_info(self, layer_name: str) -> Optional[Dict[str, Any]]:
         """Get information about a published layer"""
         url = f"{self.base_url}/rest/layers/{layer_name}"
@@ -189,6 +253,52 @@ class GeoServerService:
             print(f"Exception getting layer info: {str(e)}")
             return None
     
+    async def aget_layer_info(self, layer_name: str) -> Optional[Dict[str, Any]]:
+        """Async version of get_layer_info using the shared connection pool"""
+        url = f"{self.base_url}/rest/layers/{layer_name}"
+        
+        try:
+            async with async_client() as client:
+                response = await client.get(
+                    url,
+                    auth=self._get_auth(),
+                    headers=self._get_headers()
+                )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"Error getting layer info: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception getting layer info: {str(e)}")
+            return None
+    
+    async def alist_layers(self) -> Optional[List[Dict[str, Any]]]:
+        """List all layers published to GeoServer using the shared connection pool"""
+        url = f"{self.base_url}/rest/layers"
+        
+        try:
+            async with async_client() as client:
+                response = await client.get(
+                    url,
+                    auth=self._get_auth(),
+                    headers=self._get_headers()
+                )
+            
+            if response.status_code == 200:
+                layers_data = response.json()
+                layers = layers_data.get('layers') or {}
+                return layers.get('layer', [])
+            else:
+                print(f"Error listing layers: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception listing layers: {str(e)}")
+            return None
+    
     def delete_layer(self, layer_name: str) -> bool:
         """Delete a layer from GeoServer"""
         url = f"{self.base_url}/rest/layers/{layer_name}"
@@ -210,13 +320,189 @@ class GeoServerService:
             print(f"Exception deleting layer: {str(e)}")
             return False
     
-    def get_wms_url(self, layer_name: str) -> str:
-        """Get WMS URL for a layer"""
-        return f"{self.base_url}/wms?service=WMS&version=1.1.0&request=GetMap&layers={self.workspace}:{layer_name}&styles=&bbox=-180,-90,180,90&width=768&height=384&srs=EPSG:4326&format=image/png"
+    def list_featuretypes(self, datastore_name: str) -> Optional[List[str]]:
+        """Names of all feature types configured on a datastore, None on error"""
+        url = f"{self.base_url}/rest/workspaces/{self.workspace}/datastores/{datastore_name}/featuretypes.json"
+        
+        try:
+            response = requests.get(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers()
+            )
+            
+            if response.status_code == 200:
+                # An empty list comes back as "featureTypes": ""
+                featuretypes = response.json().get('featureTypes') or {}
+                return [featuretype['name'] for featuretype in featuretypes.get('featureType', [])]
+            elif response.status_code == 404:
+                return []
+            else:
+                print(f"Error listing feature types: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception listing feature types: {str(e)}")
+            return None
+    
+    def list_workspace_layers(self, workspace_name: str = None) -> Optional[List[str]]:
+        """Names of all layers of a workspace in one call, None on error"""
+        url = f"{self.base_url}/rest/workspaces/{workspace_name or self.workspace}/layers.json"
+        
+        try:
+            response = requests.get(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers()
+            )
+            
+            if response.status_code == 200:
+                # An empty list comes back as "layers": ""
+                layers = response.json().get('layers') or {}
+                return [layer['name'] for layer in layers.get('layer', [])]
+            elif response.status_code == 404:
+                return []
+            else:
+                print(f"Error listing workspace layers: {response.status_code} - {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"Exception listing workspace layers: {str(e)}")
+            return None
+    
+    def delete_featuretype(self, datastore_name: str, featuretype_name: str) -> bool:
+        """Delete a feature type together with its layer"""
+        url = f"{self.base_url}/rest/workspaces/{self.workspace}/datastores/{datastore_name}/featuretypes/{featuretype_name}"
+        
+        try:
+            response = requests.delete(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers(),
+                params={'recurse': 'true'}
+            )
+            
+            if response.status_code in [200, 204, 404]:
+                return True
+            else:
+                print(f"Error deleting feature type: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"Exception deleting feature type: {str(e)}")
+            return False
+    
+    def reset_featuretype(self, datastore_name: str, layer_name: str) -> bool:
+        """Drop GeoServer's cached schema and bounds of one feature type"""
+        url = f"{self.base_url}/rest/workspaces/{self.workspace}/datastores/{datastore_name}/featuretypes/{layer_name}/reset"
+        
+        try:
+            response = requests.post(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers()
+            )
+            
+            if response.status_code == 200:
+                return True
+            else:
+                print(f"Error resetting feature type: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"Exception resetting feature type: {str(e)}")
+            return False
+    
+    def update_bounds(self, datastore_name: str, layer_name: str, native_bbox: List[float],
+                      latlon_bbox: List[float], srs: str = 'EPSG:4326') -> bool:
+        """Replace the declared bounds of a published feature type"""
+        url = f"{self.base_url}/rest/workspaces/{self.workspace}/datastores/{datastore_name}/featuretypes/{layer_name}"
+        
+        data = {
+            "featureType": {
+                "nativeBoundingBox": self._bounding_box(native_bbox, srs),
+                "latLonBoundingBox": self._bounding_box(latlon_bbox, "EPSG:4326")
+            }
+        }
+        
+        try:
+            response = requests.put(
+                url,
+                auth=self._get_auth(),
+                headers=self._get_headers(),
+                data=json.dumps(data)
+            )
+            
+            if response.status_code == 200:
+                return True
+            else:
+                print(f"Error updating bounds: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"Exception updating bounds: {str(e)}")
+            return False
+    
+    def truncate_tile_cache(self, layer_name: str, viewparams: Optional[Dict[str, Any]] = None) -> bool:
+        """Remove the cached tiles of a layer from GeoWebCache, only those of one viewparams value if given"""
+        url = f"{self.base_url}/gwc/rest/masstruncate"
+        
+        if viewparams:
+            xml_data = (
+                f"<truncateParameters><layerName>{self.workspace}:{layer_name}</layerName>"
+                f"<parameters><entry><string>VIEWPARAMS</string><string>{self._format_viewparams(viewparams)}</string></entry></parameters>"
+                f"</truncateParameters>"
+            )
+        else:
+            xml_data = f"<truncateLayer><layerName>{self.workspace}:{layer_name}</layerName></truncateLayer>"
+        
+        try:
+            response = requests.post(
+                url,
+                auth=self._get_auth(),
+                headers={'Content-Type': 'text/xml'},
+                data=xml_data
+            )
+            
+            if response.status_code == 200:
+                return True
+            else:
+                print(f"Error truncating tile cache: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"Exception truncating tile cache: {str(e)}")
+            return False
+    
+    def _format_viewparams(self, viewparams: Dict[str, Any]) -> str:
+        """Encode SQL view parameters as GeoServer's key:value;key:value"""
+        return ';'.join(f"{key}:{value}" for key, value in viewparams.items())
+    
+    def get_wms_url(self, layer_name: str, viewparams: Optional[Dict[str, Any]] = None,
+                    latlon_bbox: Optional[List[float]] = None) -> str:
+        """Get WMS URL for a layer, framed on its EPSG:4326 extent when known"""
+        bbox, width, height = [-180, -90, 180, 90], 768, 384
+        if latlon_bbox:
+            minx, miny, maxx, maxy = latlon_bbox
+            # Pad point-like extents so the map has an area
+            pad = 0.001 if maxx - minx < 0.001 or maxy - miny < 0.001 else 0
+            bbox = [minx - pad, miny - pad, maxx + pad, maxy + pad]
+            height = max(1, min(int(width * (bbox[3] - bbox[1]) / (bbox[2] - bbox[0])), 2048))
+        
+        url = f"{self.base_url}/wms?service=WMS&version=1.1.0&request=GetMap&layers={self.workspace}:{layer_name}&styles=&bbox={','.join(str(value) for value in bbox)}&width={width}&height={height}&srs=EPSG:4326&format=image/png"
+        if viewparams:
+            url += f"&viewparams={self._format_viewparams(viewparams)}"
+        return url
     
-    def get_wfs_url(self, layer_name: str) -> str:
-        """Get WFS URL for a layer"""
-        return f"{self.base_url}/wfs?service=WFS&version=1.0.0&request=GetFeature&typeName={self.workspace}:{layer_name}&maxFeatures=50"
+    def get_wfs_url(self, layer_name: str, viewparams: Optional[Dict[str, Any]] = None,
+                    native_bbox: Optional[List[float]] = None) -> str:
+        """Get WFS URL for a layer, limited to its native extent when known"""
+        url = f"{self.base_url}/wfs?service=WFS&version=1.0.0&request=GetFeature&typeName={self.workspace}:{layer_name}&maxFeatures=50"
+        if native_bbox:
+            url += f"&bbox={','.join(str(value) for value in native_bbox)}"
+        if viewparams:
+            url += f"&viewparams={self._format_viewparams(viewparams)}"
+        return url
     
     def create_user(self, username: str, password: str, enabled: bool = True) -> bool:
         """Create a new user in GeoServer"""
@@ -0,0 +1,133 @@
+import time
+from typing import Any, Dict
+from django.db.models import Q
+from .models import ShapefileImport
+from .geoserver_service import GeoServerService
+
+# Fields describing how an import is published, rewritten in bulk by sync_geoserver()
+PUBLISH_FIELDS = ['geoserver_layer', 'geoserver_wms_url', 'geoserver_wfs_url', 'published_to_geoserver']
+
+
+def _link(import_record, layer_name: str, geoserver: GeoServerService) -> bool:
+    """Point an import at its existing layer, True when a field changed"""
+    values = {
+        'geoserver_layer': layer_name,
+        'geoserver_wms_url': geoserver.get_wms_url(layer_name, import_record.viewparams, import_record.latlon_extent),
+        'geoserver_wfs_url': geoserver.get_wfs_url(layer_name, import_record.viewparams, import_record.extent),
+        'published_to_geoserver': True,
+    }
+    return _assign(import_record, values)
+
+
+def _unlink(import_record) -> bool:
+    values = {
+        'geoserver_layer': None,
+        'geoserver_wms_url': None,
+        'geoserver_wfs_url': None,
+        'published_to_geoserver': False,
+    }
+    return _assign(import_record, values)
+
+
+def _assign(import_record, values: Dict[str, Any]) -> bool:
+    changed = any(getattr(import_record, field) != value for field, value in values.items())
+    for field, value in values.items():
+        setattr(import_record, field, value)
+    return changed
+
+
+def sync_geoserver(queryset=None, republish: bool = True, dry_run: bool = False) -> Dict[str, Any]:
+    """Reconcile published_to_geoserver and the layer URLs with the GeoServer catalog
+
+    The feature types of the datastore and the layers of the workspace are
+    read in two calls and diffed against the imports in memory. Imports whose
+    layer exists are relinked (flag and URLs rebuilt), flagged imports whose
+    layer is gone are republished (or cleared when republish is False or
+    fails), and the changed rows are written with bulk_update. Returns a
+    report of what was found and fixed.
+    """
+    started = time.monotonic()
+    report = {
+        'dry_run': dry_run,
+        'checked': 0,
+        'in_sync': 0,
+        'relinked': 0,
+        'republished': 0,
+        'unpublished': 0,
+        'errors': [],
+    }
+
+    geoserver = GeoServerService()
+    datastore_name = geoserver.datastore_name
+    featuretypes = geoserver.list_featuretypes(datastore_name)
+    layers = geoserver.list_workspace_layers()
+    if featuretypes is None or layers is None:
+        report['errors'].append("Could not read the GeoServer catalog, nothing was changed")
+        return report
+
+    # A layer is served when both its feature type and its layer entry exist
+    published = set(featuretypes) & set(layers)
+
+    if queryset is None:
+        queryset = ShapefileImport.objects.all()
+    changed, missing = [], []
+    for record in queryset.filter(Q(status='success') | Q(published_to_geoserver=True)).iterator(chunk_size=2000):
+        report['checked'] += 1
+        layer_name = record.geoserver_layer_name
+
+        # The shared layer existing does not mean a partitioned import was published
+        if record.status == 'success' and layer_name in published and (
+                record.published_to_geoserver or record.storage_mode != 'partitioned'):
+            if _link(record, layer_name, geoserver):
+                changed.append(record)
+                report['relinked'] += 1
+            else:
+                report['in_sync'] += 1
+        elif record.status == 'success' and record.published_to_geoserver and republish:
+            missing.append(record)
+        elif record.published_to_geoserver:
+            _unlink(record)
+            changed.append(record)
+            report['unpublished'] += 1
+        else:
+            report['in_sync'] += 1
+
+    if missing and not dry_run and not geoserver.create_workspace():
+        report['errors'].append("Failed to create GeoServer workspace, missing layers were not republished")
+        missing = []
+    if missing and not dry_run and not geoserver.datastore_exists(datastore_name):
+        if not geoserver.create_datastore(datastore_name, None):
+            report['errors'].append("Failed to create GeoServer datastore, missing layers were not republished")
+            missing = []
+
+    for record in missing:
+        layer_name = record.geoserver_layer_name
+        if layer_name in published:
+            # Partitioned imports share a layer that was republished for another import
+            _link(record, layer_name, geoserver)
+            changed.append(record)
+            report['republished'] += 1
+            continue
+        if dry_run:
+            published.add(layer_name)
+            report['republished'] += 1
+            continue
+
+        try:
+            success, message = record.publish(geoserver)
+        except Exception as e:
+            success, message = False, str(e)
+        if success:
+            published.add(layer_name)
+            report['republished'] += 1
+        else:
+            report['errors'].append(f"Could not republish import {record.id}: {message}")
+            _unlink(record)
+            changed.append(record)
+            report['unpublished'] += 1
+
+    if changed and not dry_run:
+        ShapefileImport.objects.bulk_update(changed, PUBLISH_FIELDS, batch_size=1000)
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
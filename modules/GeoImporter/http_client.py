@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+import httpx
+from django.conf import settings
+from .profiling import httpx_event_hooks
+
+# One pooled async client per event loop, only under an ASGI server where the
+# loop lives as long as the process (GEOIMPORTER_ASGI, set by geograph/asgi.py)
+_async_clients = weakref.WeakKeyDictionary()
+
+# Pooled sync client shared by the threads of the process
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_limits() -> httpx.Limits:
+    """Get connection pool limits for GeoServer requests"""
+    return httpx.Limits(
+        max_connections=getattr(settings, 'GEOSERVER_HTTP_MAX_CONNECTIONS', 1000),
+        max_keepalive_connections=getattr(settings, 'GEOSERVER_HTTP_MAX_KEEPALIVE', 100),
+        keepalive_expiry=getattr(settings, 'GEOSERVER_HTTP_KEEPALIVE_EXPIRY', 30)
+    )
+
+
+def _get_timeout() -> httpx.Timeout:
+    """Get default timeout for GeoServer requests"""
+    return httpx.Timeout(getattr(settings, 'GEOSERVER_HTTP_TIMEOUT', 30))
+
+
+def get_client() -> httpx.Client:
+    """Get the shared sync HTTP client of the process"""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(limits=_get_limits(), timeout=_get_timeout(),
+                                   event_hooks=httpx_event_hooks(asynchronous=False))
+        return _client
+
+
+def _new_async_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(limits=_get_limits(), timeout=_get_timeout(), event_hooks=httpx_event_hooks())
+
+
+@asynccontextmanager
+async def async_client():
+    """Async HTTP client for one GeoServer call
+
+    Under ASGI the pooled client of the running loop is shared. Under WSGI
+    (runserver) Django runs each async view in a loop of its own that is
+    discarded afterwards, so the client is opened for the call and closed
+    with it instead of being left bound to a dead loop.
+    """
+    if not getattr(settings, 'GEOIMPORTER_ASGI', False):
+        async with _new_async_client() as client:
+            yield client
+        return
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _new_async_client()
+        _async_clients[loop] = client
+    yield client
@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Optional
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+from .models import GeoServerImportTask
+from .geoserver_importer_service import GeoServerImporterService
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def poll_due_tasks(limit: int = 100) -> int:
+    """Refresh every mirrored import task whose next poll is due"""
+    due = GeoServerImportTask.objects.filter(
+        next_poll_at__lte=timezone.now()
+    ).order_by('next_poll_at')[:limit]
+    
+    importer = GeoServerImporterService()
+    polled = 0
+    for task in due:
+        try:
+            task.refresh_from_geoserver(importer)
+            polled += 1
+        except Exception as e:
+            print(f"Exception polling import {task.geoserver_import_id}: {str(e)}")
+    return polled
+
+
+def seconds_until_next_poll(max_wait: float) -> Optional[float]:
+    """Time until the earliest scheduled poll capped at max_wait, None when nothing is scheduled"""
+    next_poll_at = GeoServerImportTask.objects.filter(
+        next_poll_at__isnull=False
+    ).aggregate(next_poll_at=Min('next_poll_at'))['next_poll_at']
+    
+    if next_poll_at is None:
+        return None
+    return min(max((next_poll_at - timezone.now()).total_seconds(), 0), max_wait)
+
+
+def run_poller(stop_event: threading.Event = None, once: bool = False, stop_when_idle: bool = False):
+    """Poll GeoServer Importer until every mirrored task is terminal"""
+    max_wait = getattr(settings, 'GEOSERVER_IMPORTER_POLL_MIN_INTERVAL', 1.0)
+    
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        try:
+            poll_due_tasks()
+            wait = seconds_until_next_poll(max_wait)
+        except Exception as e:
+            print(f"Exception in importer poller: {str(e)}")
+            wait = max_wait
+        
+        if once or (wait is None and stop_when_idle):
+            break
+        if wait is None:
+            wait = max_wait
+        if stop_event is not None:
+            stop_event.wait(wait)
+        else:
+            time.sleep(wait)
+    
+    close_old_connections()
+
+
+def ensure_poller_running():
+    """Start the in-process poller thread unless a dedicated worker is used"""
+    global _poller
+    
+    if not getattr(settings, 'GEOSERVER_IMPORTER_POLLER_IN_PROCESS', True):
+        return
+    
+    with _poller_lock:
+        if _poller is None or not _poller.is_alive():
+            _poller = threading.Thread(
+                target=run_poller,
+                kwargs={'stop_when_idle': True},
+                name='geoserver-importer-poller',
+                daemon=True
+            )
+            _poller.start()
@@ -0,0 +1,59 @@
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.db import connections
+
+
+def _read_extent(cursor, import_record, srid: int, estimated: bool) -> Tuple[Optional[List[float]], Optional[List[float]]]:
+    """Native and EPSG:4326 extent of a table, exact or from the planner statistics"""
+    if estimated:
+        # Read from the statistics gathered by ANALYZE, no table scan
+        source = "SELECT ST_EstimatedExtent('public', %s, 'geom')::box2d AS e"
+        params = [import_record.table_name]
+    else:
+        source = f"SELECT ST_Extent(geom) AS e FROM {connections['datastore'].ops.quote_name(import_record.table_name)}"
+        params = []
+
+    cursor.execute(
+        f"SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e), "
+        f"ST_XMin(l), ST_YMin(l), ST_XMax(l), ST_YMax(l) "
+        f"FROM ({source}) s, "
+        f"LATERAL (SELECT Box2D(ST_Transform(ST_SetSRID(e::geometry, %s), 4326)) AS l) t",
+        params + [srid]
+    )
+    row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None, None
+    return list(row[:4]), list(row[4:])
+
+
+def compute_extent(import_record) -> Optional[List[float]]:
+    """Compute the extent of an imported table once and store it on the import
+
+    Layers with more than GEOIMPORTER_EXACT_EXTENT_MAX_ROWS estimated rows use
+    ST_EstimatedExtent, which PostGIS derives from the ANALYZE statistics;
+    smaller layers get an exact ST_Extent scan.
+    """
+    max_rows = getattr(settings, 'GEOIMPORTER_EXACT_EXTENT_MAX_ROWS', 1000000)
+    srid = import_record.srid or 4326
+
+    with connections['datastore'].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+            [connections['datastore'].ops.quote_name(import_record.table_name)]
+        )
+        row = cursor.fetchone()
+        estimated = bool(row and row[0] > max_rows)
+
+        extent = latlon_extent = None
+        if estimated:
+            try:
+                extent, latlon_extent = _read_extent(cursor, import_record, srid, True)
+            except Exception as e:
+                print(f"No estimated extent for {import_record.table_name}: {str(e)}")
+        if extent is None:
+            extent, latlon_extent = _read_extent(cursor, import_record, srid, False)
+
+    import_record.extent = extent
+    import_record.latlon_extent = latlon_extent
+    import_record.save(update_fields=['extent', 'latlon_extent'])
+    return extent
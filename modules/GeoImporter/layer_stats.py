@@ -0,0 +1,131 @@
+import datetime
+import decimal
+from typing import Any, Dict, List
+from django.conf import settings
+from django.db import connections
+from .catalog import get_catalog
+
+NUMERIC_TYPES = ('smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision')
+TEXT_TYPES = ('character varying', 'character', 'text')
+TEMPORAL_TYPES = ('date', 'timestamp', 'time')
+
+
+def _column_kind(data_type: str) -> str:
+    """Classify a formatted PostgreSQL type into numeric/text/temporal/boolean/other"""
+    base_type = data_type.split('(')[0]
+    if base_type in NUMERIC_TYPES:
+        return 'numeric'
+    if base_type in TEXT_TYPES:
+        return 'text'
+    if base_type.startswith(TEMPORAL_TYPES):
+        return 'temporal'
+    if base_type == 'boolean':
+        return 'boolean'
+    return 'other'
+
+
+def _json_value(value: Any) -> Any:
+    """Make a database value storable in a JSONField"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    return value
+
+
+def compute_statistics(import_record) -> Dict[str, Any]:
+    """Compute per-column statistics of an imported table and store them on the import
+
+    count, nulls, min/max and quantile breaks come from a single aggregate scan
+    of the table. Distinct estimates and top-k values come from the planner
+    statistics gathered by ANALYZE, which samples instead of scanning.
+    """
+    if import_record.storage_mode == 'partitioned':
+        raise ValueError("Statistics are not available for partitioned imports, whose attributes are JSON")
+
+    quantile_count = getattr(settings, 'GEOIMPORTER_STATS_QUANTILES', 5)
+    top_k = getattr(settings, 'GEOIMPORTER_STATS_TOP_K', 10)
+    fractions = [i / quantile_count for i in range(1, quantile_count)]
+
+    catalog = get_catalog([import_record]).get(import_record.id)
+    if not catalog:
+        raise ValueError("Table not found in datastore")
+
+    connection = connections['datastore']
+    quote = connection.ops.quote_name
+    table = quote(import_record.table_name)
+
+    columns = []
+    select = ["count(*)"]
+    params: List[Any] = []
+    for name, data_type in catalog['columns']:
+        kind = _column_kind(data_type)
+        if name in ('gid', 'geom') or kind == 'other':
+            continue
+        column = quote(name)
+        columns.append((name, data_type, kind))
+        select.append(f"count({column})")
+        if kind == 'boolean':
+            select += [f"bool_and({column})", f"bool_or({column})"]
+        else:
+            select += [f"min({column})", f"max({column})"]
+        if kind == 'numeric':
+            select.append(f"percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY {column})")
+            params.append(fractions)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(select)} FROM {table}", params)
+        row = list(cursor.fetchone())
+
+        cursor.execute(f"ANALYZE {table}")
+        cursor.execute(
+            "SELECT attname, n_distinct, most_common_vals::text::text[], most_common_freqs "
+            "FROM pg_stats WHERE schemaname = 'public' AND tablename = %s",
+            [import_record.table_name]
+        )
+        planner_stats = {name: (n_distinct, values, freqs) for name, n_distinct, values, freqs in cursor.fetchall()}
+
+    total = row.pop(0)
+    statistics = {'row_count': total, 'columns': {}}
+    for name, data_type, kind in columns:
+        count = row.pop(0)
+        minimum, maximum = row.pop(0), row.pop(0)
+        column_stats = {
+            'type': data_type,
+            'count': count,
+            'nulls': total - count,
+            'min': _json_value(minimum),
+            'max': _json_value(maximum),
+        }
+        if kind == 'numeric':
+            column_stats['quantiles'] = _json_value(row.pop(0))
+
+        n_distinct, values, freqs = planner_stats.get(name, (None, None, None))
+        if n_distinct is not None:
+            # Negative n_distinct is a fraction of the row count
+            column_stats['distinct_estimate'] = round(-n_distinct * total) if n_distinct < 0 else round(n_distinct)
+        if values:
+            column_stats['top_values'] = [
+                {'value': value, 'count': round(freq * total)}
+                for value, freq in list(zip(values, freqs))[:top_k]
+            ]
+
+        statistics['columns'][name] = column_stats
+
+    import_record.statistics = statistics
+    import_record.statistics_version = import_record.table_version
+    import_record.save(update_fields=['statistics', 'statistics_version'])
+    return statistics
+
+
+def get_statistics(import_record, refresh: bool = False) -> Dict[str, Any]:
+    """Stored statistics of an import, recomputed when the table changed since"""
+    if (
+        not refresh
+        and import_record.statistics is not None
+        and import_record.statistics_version == import_record.table_version
+    ):
+        return import_record.statistics
+    return compute_statistics(import_record)
@@ -0,0 +1,133 @@
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from modules.GeoImporter.bulk_import import (
+    discover, read_manifest, read_checkpoint, append_checkpoint, resume_layers, init_worker, import_file
+)
+from modules.GeoImporter.geoserver_service import GeoServerService
+from modules.GeoImporter.models import ShapefileImport
+
+
+class Command(BaseCommand):
+    help = "Import every zip, shapefile, FlatGeobuf, GeoPackage and GeoParquet file under directories or in a manifest"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Files or directories to import")
+        parser.add_argument('--manifest', help="File listing the paths to import, one per line")
+        parser.add_argument('--checkpoint', default='bulk_import.checkpoint.jsonl',
+                            help="JSONL file recording finished files; rerunning resumes after them")
+        parser.add_argument('--retry-failed', action='store_true', help="Import again files that failed last time")
+        parser.add_argument('--workers', type=int, default=None, help="Import processes (default: CPU count)")
+        parser.add_argument('--publish', action='store_true', help="Publish every imported layer to GeoServer")
+        parser.add_argument('--keep-native-crs', action='store_true', help="Keep the source SRID instead of EPSG:4326")
+        parser.add_argument('--storage-mode', choices=[mode for mode, _ in ShapefileImport.STORAGE_MODES],
+                            default=None, help="Own table per import or partition of the shared table")
+        parser.add_argument('--narrow-types', action=argparse.BooleanOptionalAction, default=None,
+                            help="Narrow attribute column types after each load (default: GEOIMPORTER_NARROW_TYPES)")
+        parser.add_argument('--snap-grid', type=float, default=None,
+                            help="Snap coordinates to a grid of this many metres, 0 disables (default: GEOIMPORTER_SNAP_GRID)")
+    
+    def handle(self, *args, **options):
+        paths = list(options['paths'])
+        if options['manifest']:
+            paths += read_manifest(options['manifest'])
+        if not paths:
+            raise CommandError("Give files or directories to import, or --manifest")
+        
+        storage_mode = options['storage_mode'] or getattr(settings, 'GEOIMPORTER_STORAGE_MODE', 'table')
+        if storage_mode == 'partitioned' and options['keep_native_crs']:
+            raise CommandError("Partitioned storage is always in EPSG:4326, --keep-native-crs is not supported")
+        
+        narrow_types = options['narrow_types']
+        if narrow_types is None:
+            narrow_types = getattr(settings, 'GEOIMPORTER_NARROW_TYPES', False)
+        snap_grid = options['snap_grid']
+        if snap_grid is None:
+            snap_grid = getattr(settings, 'GEOIMPORTER_SNAP_GRID', None)
+        if snap_grid is not None and snap_grid < 0:
+            raise CommandError("--snap-grid must be a grid size in metres, 0 or more")
+        
+        files = discover(paths)
+        done = read_checkpoint(options['checkpoint'])
+        skip = {'success', 'error'} if not options['retry_failed'] else {'success'}
+        pending = [path for path in files if done.get(path, {}).get('status') not in skip]
+        self.stdout.write(f"{len(files)} file(s) found, {len(files) - len(pending)} already done, {len(pending)} to import")
+        if not pending:
+            return
+        
+        if options['publish']:
+            self._ensure_datastore()
+        
+        # Layers finished by an earlier run are kept, imports it left unfinished are deleted
+        done_layers = {path: resume_layers(done[path], options['publish']) for path in pending if path in done}
+        
+        workers = max(options['workers'] or os.cpu_count() or 1, 1)
+        import_options = {
+            'checkpoint': os.path.abspath(options['checkpoint']),
+            'publish': options['publish'],
+            'keep_native_crs': options['keep_native_crs'],
+            'storage_mode': storage_mode,
+            'narrow_types': narrow_types,
+            'snap_grid': snap_grid or None,
+        }
+        
+        # Pool processes open their own connections
+        connections.close_all()
+        started = time.monotonic()
+        finished = failed = total_bytes = 0
+        
+        with open(options['checkpoint'], 'a') as checkpoint, ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(max((os.cpu_count() or 1) // workers, 1),)
+        ) as pool:
+            queue = iter(pending)
+            running = set()
+            try:
+                while True:
+                    # Keep a bounded number of files in flight instead of queueing thousands
+                    for path in queue:
+                        running.add(pool.submit(import_file, path, import_options, done_layers.get(path)))
+                        if len(running) >= workers * 2:
+                            break
+                    if not running:
+                        break
+                    
+                    completed, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        result = future.result()
+                        append_checkpoint(checkpoint, result)
+                        finished += 1
+                        total_bytes += result['bytes']
+                        elapsed = max(time.monotonic() - started, 1e-6)
+                        
+                        if result['status'] == 'success':
+                            outcome = f"imported as {', '.join(str(import_id) for import_id in result['import_ids'])}"
+                        else:
+                            failed += 1
+                            outcome = f"FAILED: {result['message']}"
+                        self.stdout.write(
+                            f"[{finished}/{len(pending)}] {result['path']}: {outcome} ({result['seconds']:.1f} s) | "
+                            f"{finished / elapsed * 60:.1f} files/min, {total_bytes / elapsed / 1024 / 1024:.1f} MB/s"
+                        )
+            except KeyboardInterrupt:
+                pool.shutdown(wait=True, cancel_futures=True)
+                self.stderr.write("Interrupted; rerun with the same --checkpoint to resume")
+                raise
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Imported {finished - failed} file(s), {failed} failed, {total_bytes / 1024 / 1024:.1f} MB in {elapsed:.1f} s"
+        )
+    
+    def _ensure_datastore(self):
+        geoserver = GeoServerService()
+        if not geoserver.create_workspace():
+            raise CommandError("Failed to create GeoServer workspace")
+        if not geoserver.datastore_exists(geoserver.datastore_name):
+            if not geoserver.create_datastore(geoserver.datastore_name, None):
+                raise CommandError("Failed to create GeoServer datastore")
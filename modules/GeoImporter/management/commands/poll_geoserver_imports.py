@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from modules.GeoImporter.importer_poller import run_poller
+
+
+class Command(BaseCommand):
+    help = "Track GeoServer Importer tasks until they reach a terminal state"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Poll due tasks once and exit")
+    
+    def handle(self, *args, **options):
+        if options['once']:
+            run_poller(once=True)
+            return
+        
+        self.stdout.write("Polling GeoServer Importer tasks (Ctrl+C to stop)...")
+        try:
+            run_poller()
+        except KeyboardInterrupt:
+            pass
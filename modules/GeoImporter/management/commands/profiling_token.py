@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from modules.GeoImporter.profiling import HEADER, make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed header that makes the API profile a request"
+    
+    def handle(self, *args, **options):
+        self.stdout.write(f"{HEADER}: {make_token()}")
+        self.stderr.write(
+            f"Valid for {getattr(settings, 'GEOIMPORTER_PROFILING_TOKEN_MAX_AGE', 3600)} seconds; "
+            f"profiles are listed in the admin under Request profiles"
+        )
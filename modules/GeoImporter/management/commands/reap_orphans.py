@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from modules.GeoImporter.reaper import reap_orphans
+
+
+class Command(BaseCommand):
+    help = "Drop datastore tables and GeoServer layers that no import references any more"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be reaped without dropping")
+        parser.add_argument('--grace', type=int, default=None,
+                            help="Seconds an orphan must stay orphaned before it is reaped")
+        parser.add_argument('--batch-size', type=int, default=None, help="Tables dropped per statement")
+    
+    def handle(self, *args, **options):
+        report = reap_orphans(
+            dry_run=options['dry_run'],
+            grace_seconds=options['grace'],
+            batch_size=options['batch_size']
+        )
+        
+        prefix = "Would reap" if report['dry_run'] else "Reaped"
+        self.stdout.write(
+            f"{prefix} {report['tables_dropped']} table(s) and {report['layers_deleted']} layer(s), "
+            f"{report['bytes_reclaimed'] / 1024 / 1024:.1f} MB reclaimed"
+        )
+        self.stdout.write(
+            f"In grace period: {report['pending_tables']} table(s), {report['pending_layers']} layer(s)"
+        )
+        for error in report['errors']:
+            self.stderr.write(error)
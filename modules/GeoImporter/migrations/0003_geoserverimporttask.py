@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0002_shapefileimport_geoserver_layer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoServerImportTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geoserver_import_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('state', models.CharField(default='PENDING', max_length=50)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_polled_at', models.DateTimeField(blank=True, null=True)),
+                ('next_poll_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('poll_interval', models.FloatField(default=1.0)),
+                ('poll_failures', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0003_geoserverimporttask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='keep_native_crs',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='srid',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
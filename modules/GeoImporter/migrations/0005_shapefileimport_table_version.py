@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0004_shapefileimport_native_crs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='table_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0005_shapefileimport_table_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='statistics',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='statistics_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
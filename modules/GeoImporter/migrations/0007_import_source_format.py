@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0006_shapefileimport_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='load_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='source_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='source_format',
+            field=models.CharField(default='shapefile', max_length=50),
+        ),
+    ]
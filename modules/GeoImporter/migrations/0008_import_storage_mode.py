@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0007_import_source_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='storage_mode',
+            field=models.CharField(choices=[('table', 'Own table'), ('partitioned', 'Partition of the shared table')], default='table', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0008_import_storage_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='extent',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='latlon_extent',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
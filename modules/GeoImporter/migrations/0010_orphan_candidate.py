@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0009_import_extent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('table', 'Datastore table'), ('layer', 'GeoServer feature type')], max_length=20)),
+                ('name', models.CharField(max_length=255)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'name')},
+            },
+        ),
+    ]
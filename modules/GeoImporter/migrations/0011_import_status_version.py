@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0010_orphan_candidate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='status_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0011_import_status_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='narrow_types',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='narrowing_report',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0012_import_type_narrowing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='precision_report',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='snap_grid',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
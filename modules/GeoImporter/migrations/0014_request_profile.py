@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0013_import_snap_grid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('status_code', models.IntegerField(blank=True, null=True)),
+                ('trigger', models.CharField(choices=[('header', 'Signed header'), ('sample', 'Sampled')], max_length=20)),
+                ('duration_ms', models.FloatField()),
+                ('sql_count', models.IntegerField(default=0)),
+                ('sql_ms', models.FloatField(default=0)),
+                ('queries', models.JSONField(default=list)),
+                ('http_count', models.IntegerField(default=0)),
+                ('http_ms', models.FloatField(default=0)),
+                ('http_calls', models.JSONField(default=list)),
+                ('profile', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
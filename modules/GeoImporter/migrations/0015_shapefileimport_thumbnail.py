@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GeoImporter', '0014_request_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='thumbnail',
+            field=models.FileField(blank=True, null=True, upload_to='geoimporter/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='shapefileimport',
+            name='thumbnail_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
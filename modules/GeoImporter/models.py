@@ -2,13 +2,21 @@ from django.db import models
 from django.contrib.gis.db import models as gis_models
 from django.contrib.gis.geos import GEOSGeometry
 import os
+import re
 import tempfile
 from django.conf import settings
 from django.db import connections
 import subprocess
+import time
+from . import partitioned_loader, format_loader, shared_storage, status_events
 
 class ShapefileImport(models.Model):
     """Model to track shapefile imports"""
+    STORAGE_MODES = [
+        ('table', 'Own table'),
+        ('partitioned', 'Partition of the shared table'),
+    ]
+    
     name = models.CharField(max_length=255)
     file_path = models.CharField(max_length=500)
     table_name = models.CharField(max_length=255)
@@ -21,9 +29,172 @@ class ShapefileImport(models.Model):
     geoserver_wfs_url = models.URLField(blank=True, null=True)
     published_to_geoserver = models.BooleanField(default=False)
     
+    # Coordinate reference system
+    keep_native_crs = models.BooleanField(default=False)
+    srid = models.IntegerField(blank=True, null=True)
+    
+    # Incremented whenever the table contents or schema change; keys caches
+    table_version = models.PositiveIntegerField(default=1)
+    
+    # Per-column attribute statistics, valid while statistics_version == table_version
+    statistics = models.JSONField(blank=True, null=True)
+    statistics_version = models.PositiveIntegerField(blank=True, null=True)
+    
+    # 'partitioned' imports live in a list partition of the shared features table
+    storage_mode = models.CharField(max_length=20, choices=STORAGE_MODES, default='table')
+    
+    # [minx, miny, maxx, maxy] in the table SRS and in EPSG:4326, declared to GeoServer
+    extent = models.JSONField(blank=True, null=True)
+    latlon_extent = models.JSONField(blank=True, null=True)
+    
+    # Source dataset and load throughput
+    source_format = models.CharField(max_length=50, default='shapefile')
+    source_bytes = models.BigIntegerField(blank=True, null=True)
+    load_seconds = models.FloatField(blank=True, null=True)
+    
+    # Optional post-load pass converting attribute columns to their tightest type
+    narrow_types = models.BooleanField(default=False)
+    narrowing_report = models.JSONField(blank=True, null=True)
+    
+    # Optional grid in metres (degrees for geographic layers are derived) coordinates are snapped to
+    snap_grid = models.FloatField(blank=True, null=True)
+    precision_report = models.JSONField(blank=True, null=True)
+    
+    # Incremented on every status change, which is announced with NOTIFY (see status_events)
+    status_version = models.PositiveIntegerField(default=0)
+    
+    # Pre-rendered SVG preview, valid while thumbnail_version == table_version
+    thumbnail = models.FileField(upload_to='geoimporter/thumbnails/', blank=True, null=True)
+    thumbnail_version = models.PositiveIntegerField(blank=True, null=True)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Status as last saved, to detect transitions in save(); DEFERRED
+        # when loaded without it (.only() / .defer())
+        self._saved_status = self.__dict__.get('status', models.DEFERRED)
+    
     def __str__(self):
         return f"{self.name} - {self.table_name}"
     
+    def save(self, *args, **kwargs):
+        """Save the import, bumping status_version and notifying listeners when the status changed"""
+        # A status that was neither loaded nor assigned cannot have changed
+        status_changed = self._state.adding or (
+            'status' in self.__dict__ and self.status != self._saved_status
+        )
+        if status_changed:
+            self.status_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'status_version'}
+        
+        super().save(*args, **kwargs)
+        self._saved_status = self.__dict__.get('status', models.DEFERRED)
+        
+        if status_changed:
+            status_events.notify(self.id, self.status_version)
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """Reload from the database, taking a reloaded status as the saved one"""
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if (fields is None or 'status' in fields) and 'status' in self.__dict__:
+            self._saved_status = self.status
+    
+    @property
+    def viewparams(self):
+        """GeoServer view parameters selecting this import from the shared layer"""
+        if self.storage_mode == 'partitioned':
+            return {'import_id': self.id}
+        return None
+    
+    @property
+    def geoserver_layer_name(self):
+        """Name of the GeoServer layer serving this import"""
+        if self.storage_mode == 'partitioned':
+            return shared_storage.get_layer_name()
+        return f"layer_{self.table_name}"
+    
+    @property
+    def srs(self):
+        """SRS identifier for GeoServer and feature APIs"""
+        return f"EPSG:{self.srid or 4326}"
+    
+    def import_dataset(self, source_path, layer=None, csv_mapping=None):
+        """Import a shapefile, FlatGeobuf, GeoPackage layer, GeoParquet or mapped CSV file and time the load"""
+        started = time.monotonic()
+        if csv_mapping is not None:
+            self.source_format = 'csv'
+            self.source_bytes = os.path.getsize(source_path)
+        else:
+            self.source_format = format_loader.source_format(source_path) or 'unknown'
+            self.source_bytes = format_loader.source_size(source_path)
+        
+        if csv_mapping is not None:
+            success, message = self._import_csv(source_path, csv_mapping)
+        elif self.source_format == 'shapefile':
+            success, message = self.import_shapefile(source_path)
+        else:
+            success, message = self._import_vector(source_path, layer)
+        
+        if success:
+            self.load_seconds = time.monotonic() - started
+            self.save(update_fields=['source_format', 'source_bytes', 'load_seconds'])
+        return success, message
+    
+    def _import_vector(self, source_path, layer=None):
+        """Load a columnar or indexed dataset with binary COPY, falling back to ogr2ogr"""
+        try:
+            import uuid
+            self.table_name = f"shapefile_{uuid.uuid4().hex[:8]}"
+            
+            rows = None
+            try:
+                rows = format_loader.copy_load(self, source_path, layer)
+            except format_loader.UnsupportedSource as e:
+                print(f"Loading {source_path} with ogr2ogr: {str(e)}")
+            except Exception as e:
+                # e.g. geometries not matching the declared type; ogr2ogr handles them
+                partitioned_loader.drop_table(self.table_name)
+                print(f"Binary COPY of {source_path} failed, loading with ogr2ogr: {str(e)}")
+            if rows is not None:
+                self._finish_import()
+                return True, f"{self.source_format} imported successfully with binary COPY ({rows} features). SRS: {self.srs}"
+            
+            conn_str = self._get_datastore_conn_str()
+            source_srid = self._detect_source_srid(source_path, layer)
+            for geometry_type_flag in ('PROMOTE_TO_MULTI', 'GEOMETRY'):
+                cmd = self._build_ogr2ogr_cmd(source_path, conn_str, geometry_type_flag, source_srid, layer=layer)
+                result = subprocess.run(cmd, capture_output=True, text=True)
+                if result.returncode == 0:
+                    self._finish_import()
+                    return True, f"{self.source_format} imported successfully. SRS: {self.srs}"
+            
+            self.status = 'error'
+            self.save()
+            return False, f"Error importing {self.source_format}: {result.stderr}"
+            
+        except Exception as e:
+            self.status = 'error'
+            self.save()
+            return False, f"Exception during import: {str(e)}"
+    
+    def _import_csv(self, csv_path, mapping):
+        """Stream a CSV into the datastore with COPY, building geometries from the mapped columns"""
+        from .csv_loader import load_csv
+        
+        try:
+            import uuid
+            self.table_name = f"shapefile_{uuid.uuid4().hex[:8]}"
+            
+            rows, note = load_csv(self, csv_path, mapping)
+            self._finish_import()
+            return True, f"CSV imported successfully ({rows} rows). SRS: {self.srs}.{note}"
+            
+        except Exception as e:
+            self.status = 'error'
+            self.save()
+            return False, f"Exception during CSV import: {str(e)}"
+    
     def import_shapefile(self, shapefile_path):
         """Import shapefile and create dynamic table in datastore database"""
         try:
@@ -32,46 +203,203 @@ class ShapefileImport(models.Model):
             self.table_name = f"shapefile_{uuid.uuid4().hex[:8]}"
             
             # Use ogr2ogr to import shapefile to PostgreSQL
-            datastore_config = settings.DATABASES['datastore']
-            
-            # Build connection string
-            conn_str = f"PG:host={datastore_config['HOST']} port={datastore_config['PORT']} dbname={datastore_config['NAME']} user={datastore_config['USER']} password={datastore_config['PASSWORD']}"
+            conn_str = self._get_datastore_conn_str()
             
             # First, get geometry type information
             geometry_type = self._detect_geometry_type(shapefile_path)
             
+            # Preflight: read the .prj to avoid no-op reprojection
+            source_srid = self._detect_source_srid(shapefile_path)
+            
+            # Very large layers are split into FID ranges and loaded concurrently
+            if partitioned_loader.should_partition(shapefile_path):
+                success, message = partitioned_loader.load_partitioned(self, shapefile_path, conn_str, source_srid)
+                if success:
+                    self._finish_import()
+                    return True, f"Shapefile imported successfully. Geometry type: {geometry_type}. SRS: {self.srs}. {message}"
+                print(f"Partitioned load of {shapefile_path} failed, loading serially: {message}")
+            
             # ogr2ogr command with dynamic geometry type handling
-            cmd = [
-                'ogr2ogr',
-                '-f', 'PostgreSQL',
-                conn_str,
-                shapefile_path,
-                '-nln', self.table_name,
-                '-overwrite',
-                '-lco', 'GEOMETRY_NAME=geom',
-                '-lco', 'FID=gid',
-                '-nlt', 'PROMOTE_TO_MULTI',  # Promote single geometries to multi
-                '-lco', 'SPATIAL_INDEX=GIST',  # Add spatial index
-                '-lco', 'PRECISION=NO',  # Don't round coordinates
-                '-t_srs', 'EPSG:4326'  # Ensure WGS84 projection
-            ]
+            cmd = self._build_ogr2ogr_cmd(
+                shapefile_path, conn_str,
+                'PROMOTE_TO_MULTI',  # Promote single geometries to multi
+                source_srid
+            )
             
             # Execute ogr2ogr
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
-                self.status = 'success'
-                self.save()
-                return True, f"Shapefile imported successfully. Geometry type: {geometry_type}"
+                self._finish_import()
+                return True, f"Shapefile imported successfully. Geometry type: {geometry_type}. SRS: {self.srs}"
             else:
                 # If first attempt fails, try with GEOMETRY type (most flexible)
-                return self._import_with_geometry_type(shapefile_path, conn_str, geometry_type)
+                return self._import_with_geometry_type(shapefile_path, conn_str, geometry_type, source_srid)
                 
         except Exception as e:
             self.status = 'error'
             self.save()
             return False, f"Exception during import: {str(e)}"
     
+    def _finish_import(self):
+        """Mark a freshly loaded table as imported and run the post-load steps"""
+        self._reduce_precision(self.table_name)
+        if self.storage_mode == 'partitioned':
+            shared_storage.attach_import(self)
+            self.srid = shared_storage.SHARED_SRID
+        else:
+            self._analyze_if_needed(self.table_name)
+            self._narrow_types(self.table_name)
+            self.srid = self._read_table_srid()
+        self.table_version += 1
+        self.status = 'success'
+        self.save()
+        self._after_load()
+    
+    def _analyze_if_needed(self, table_name):
+        """ANALYZE a table loaded by ogr2ogr, which leaves the planner row estimate unset"""
+        connection = connections['datastore']
+        table = connection.ops.quote_name(table_name)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [table])
+            row = cursor.fetchone()
+            if row and row[0] < 0:
+                cursor.execute(f"ANALYZE {table}")
+    
+    def _narrow_types(self, table_name):
+        """Narrow the column types of a loaded table when requested, recording the size reduction
+        
+        Partitioned imports keep their attributes in JSONB and are not narrowed.
+        """
+        if not self.narrow_types or self.storage_mode == 'partitioned':
+            return
+        
+        from .type_narrowing import narrow_table
+        try:
+            self.narrowing_report = narrow_table(table_name)
+        except Exception as e:
+            print(f"Could not narrow column types of {table_name}: {str(e)}")
+    
+    def _reduce_precision(self, table_name):
+        """Snap the coordinates of a loaded table to snap_grid when set, recording the reduction"""
+        if not self.snap_grid:
+            return
+        
+        from .geometry_precision import snap_table
+        try:
+            self.precision_report = snap_table(table_name, self.snap_grid)
+        except Exception as e:
+            print(f"Could not reduce the precision of {table_name}: {str(e)}")
+    
+    def _after_load(self):
+        """Work done once the table holds new data"""
+        from .layer_extent import compute_extent
+        try:
+            compute_extent(self)
+        except Exception as e:
+            print(f"Could not compute extent of {self.table_name}: {str(e)}")
+        
+        if getattr(settings, 'GEOIMPORTER_STATS_ON_IMPORT', False) and self.storage_mode != 'partitioned':
+            from .layer_stats import compute_statistics
+            try:
+                compute_statistics(self)
+            except Exception as e:
+                print(f"Could not compute statistics for {self.table_name}: {str(e)}")
+        
+        if getattr(settings, 'GEOIMPORTER_THUMBNAILS_ON_IMPORT', True):
+            from .thumbnails import generate_thumbnail
+            try:
+                generate_thumbnail(self)
+            except Exception as e:
+                print(f"Could not render thumbnail of {self.table_name}: {str(e)}")
+    
+    def _get_datastore_conn_str(self):
+        """Build the OGR connection string of the datastore database"""
+        datastore_config = settings.DATABASES['datastore']
+        return f"PG:host={datastore_config['HOST']} port={datastore_config['PORT']} dbname={datastore_config['NAME']} user={datastore_config['USER']} password={datastore_config['PASSWORD']}"
+    
+    def _build_ogr2ogr_cmd(self, shapefile_path, conn_str, geometry_type_flag, source_srid,
+                           table_name=None, append=False, layer_options=None, where=None,
+                           target_srid=None, layer=None):
+        """Build the ogr2ogr command loading a shapefile (or one layer of a dataset) into the datastore"""
+        cmd = [
+            'ogr2ogr',
+            '-f', 'PostgreSQL',
+            conn_str,
+            shapefile_path,
+        ]
+        if layer:
+            cmd.append(layer)
+        cmd += [
+            '-nln', table_name or self.table_name,
+            '-nlt', geometry_type_flag,
+        ]
+        
+        if append:
+            # Load into an existing table, keeping source FIDs as gid
+            cmd += ['-append', '-preserve_fid']
+        else:
+            options = {
+                'GEOMETRY_NAME': 'geom',
+                'FID': 'gid',
+                'SPATIAL_INDEX': 'GIST',  # Add spatial index
+                'PRECISION': 'NO',  # Don't round coordinates
+            }
+            options.update(layer_options or {})
+            
+            cmd.append('-overwrite')
+            for key, value in options.items():
+                cmd += ['-lco', f'{key}={value}']
+        
+        if where:
+            cmd += ['-where', where]
+        
+        # Reproject to WGS84 (or target_srid) unless the native CRS is kept or already matches
+        if target_srid is None and not self.keep_native_crs:
+            target_srid = 4326
+        if target_srid and source_srid != target_srid:
+            cmd += ['-t_srs', f'EPSG:{target_srid}']
+        
+        return cmd
+    
+    def _detect_source_srid(self, shapefile_path, layer=None):
+        """Detect the EPSG code of the shapefile's .prj (or a dataset layer) using ogrinfo, None if unknown"""
+        try:
+            cmd = ['ogrinfo', '-so', shapefile_path] + ([layer] if layer else ['-al'])
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            
+            if result.returncode != 0 or 'Layer SRS WKT:' not in result.stdout:
+                return None
+            
+            # Collect the WKT block, which ends when its brackets are balanced
+            wkt = ''
+            depth = 0
+            for char in result.stdout.split('Layer SRS WKT:', 1)[1].lstrip():
+                wkt += char
+                if char == '[':
+                    depth += 1
+                elif char == ']':
+                    depth -= 1
+                    if depth == 0:
+                        break
+            
+            # The root authority closes the WKT (WKT2: ID["EPSG",4326], WKT1: AUTHORITY["EPSG","4326"])
+            match = re.search(r'(?:ID\["EPSG",|AUTHORITY\["EPSG",")(\d+)"?\]\]$', wkt)
+            return int(match.group(1)) if match else None
+        except Exception as e:
+            print(f"Could not detect CRS of {shapefile_path}: {str(e)}")
+            return None
+    
+    def _read_table_srid(self):
+        """Read the SRID of the geometry column of the imported table"""
+        try:
+            with connections['datastore'].cursor() as cursor:
+                cursor.execute("SELECT Find_SRID('public', %s, 'geom')", [self.table_name])
+                return cursor.fetchone()[0] or None
+        except Exception as e:
+            print(f"Could not read SRID of {self.table_name}: {str(e)}")
+            return None
+    
     def _detect_geometry_type(self, shapefile_path):
         """Detect geometry type of shapefile using ogrinfo"""
         try:
@@ -99,30 +427,16 @@ class ShapefileImport(models.Model):
         except Exception as e:
             return f"Error detecting geometry: {str(e)}"
     
-    def _import_with_geometry_type(self, shapefile_path, conn_str, geometry_type):
+    def _import_with_geometry_type(self, shapefile_path, conn_str, geometry_type, source_srid=None):
         """Fallback method to import with GEOMETRY type (most flexible)"""
         try:
             # Try with GEOMETRY type (accepts any geometry type)
-            cmd = [
-                'ogr2ogr',
-                '-f', 'PostgreSQL',
-                conn_str,
-                shapefile_path,
-                '-nln', self.table_name,
-                '-overwrite',
-                '-lco', 'GEOMETRY_NAME=geom',
-                '-lco', 'FID=gid',
-                '-nlt', 'GEOMETRY',  # Use generic GEOMETRY type
-                '-lco', 'SPATIAL_INDEX=GIST',
-                '-lco', 'PRECISION=NO',
-                '-t_srs', 'EPSG:4326'
-            ]
+            cmd = self._build_ogr2ogr_cmd(shapefile_path, conn_str, 'GEOMETRY', source_srid)
             
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
-                self.status = 'success'
-                self.save()
+                self._finish_import()
                 return True, f"Shapefile imported successfully with GEOMETRY type. Detected: {geometry_type}"
             else:
                 self.status = 'error'
@@ -134,6 +448,146 @@ class ShapefileImport(models.Model):
             self.save()
             return False, f"Exception during fallback import: {str(e)}"
     
+    def replace_data(self, shapefile_path):
+        """Replace the table contents without downtime: load a staging table, then swap it in"""
+        import uuid
+        staging_table = f"{self.table_name}_stg_{uuid.uuid4().hex[:6]}"
+        
+        try:
+            conn_str = self._get_datastore_conn_str()
+            source_srid = self._detect_source_srid(shapefile_path)
+            
+            # Keep the SRS the layer is published with
+            target_srid = self.srid or (None if self.keep_native_crs else 4326)
+            
+            # Load and index the staging table while readers keep using the live one
+            loaded = False
+            if partitioned_loader.should_partition(shapefile_path):
+                loaded, message = partitioned_loader.load_partitioned(
+                    self, shapefile_path, conn_str, source_srid,
+                    table_name=staging_table, target_srid=target_srid
+                )
+            if not loaded:
+                for geometry_type_flag in ('PROMOTE_TO_MULTI', 'GEOMETRY'):
+                    cmd = self._build_ogr2ogr_cmd(
+                        shapefile_path, conn_str, geometry_type_flag, source_srid,
+                        table_name=staging_table, target_srid=target_srid
+                    )
+                    result = subprocess.run(cmd, capture_output=True, text=True)
+                    if result.returncode == 0:
+                        loaded = True
+                        break
+                    message = result.stderr
+            
+            if not loaded:
+                partitioned_loader.drop_table(staging_table)
+                return False, f"Error loading replacement data: {message}"
+            
+            self._reduce_precision(staging_table)
+            if self.storage_mode == 'partitioned':
+                shared_storage.swap_partition(self, staging_table)
+            else:
+                self._narrow_types(staging_table)
+                self._swap_in_table(staging_table)
+            
+        except Exception as e:
+            try:
+                partitioned_loader.drop_table(staging_table)
+            except Exception:
+                pass
+            return False, f"Exception during replace: {str(e)}"
+        
+        self.file_path = shapefile_path
+        self.table_version += 1
+        self.save()
+        self._after_load()
+        
+        if self.published_to_geoserver and self.geoserver_layer:
+            from .geoserver_service import GeoServerService
+            
+            geoserver = GeoServerService()
+            if self.storage_mode == 'partitioned':
+                # The shared layer schema is unchanged, only this import's tiles are stale
+                geoserver.truncate_tile_cache(self.geoserver_layer, viewparams=self.viewparams)
+            else:
+                geoserver.reset_featuretype(geoserver.datastore_name, self.geoserver_layer)
+                if self.extent and self.latlon_extent:
+                    geoserver.update_bounds(geoserver.datastore_name, self.geoserver_layer,
+                                            self.extent, self.latlon_extent, self.srs)
+                geoserver.truncate_tile_cache(self.geoserver_layer)
+            
+            # Frame the preview URLs on the new extent
+            self.geoserver_wms_url = geoserver.get_wms_url(self.geoserver_layer, self.viewparams, self.latlon_extent)
+            self.geoserver_wfs_url = geoserver.get_wfs_url(self.geoserver_layer, self.viewparams, self.extent)
+            self.save(update_fields=['geoserver_wms_url', 'geoserver_wfs_url'])
+        
+        return True, "Layer data replaced successfully"
+    
+    def _swap_in_table(self, staging_table):
+        """Atomically replace the live table with a fully loaded staging table"""
+        from django.db import transaction
+        
+        connection = connections['datastore']
+        quote = connection.ops.quote_name
+        live_table = self.table_name
+        old_table = f"{staging_table}_old"
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {quote(staging_table)}")
+        
+        with transaction.atomic(using='datastore'):
+            with connection.cursor() as cursor:
+                # Queries block on the rename instead of failing, don't wait forever for long readers
+                cursor.execute("SET LOCAL lock_timeout = %s", [getattr(settings, 'GEOIMPORTER_SWAP_LOCK_TIMEOUT', '10s')])
+                cursor.execute(f"ALTER TABLE {quote(live_table)} RENAME TO {quote(old_table)}")
+                cursor.execute(f"ALTER TABLE {quote(staging_table)} RENAME TO {quote(live_table)}")
+                cursor.execute(f"DROP TABLE {quote(old_table)}")
+                
+                # Give the swapped-in indexes and sequence the names of the live table
+                for suffix in ('pkey', 'geom_geom_idx'):
+                    cursor.execute(
+                        f"ALTER INDEX IF EXISTS {quote(f'{staging_table}_{suffix}')} "
+                        f"RENAME TO {quote(f'{live_table}_{suffix}')}"
+                    )
+                cursor.execute(
+                    f"ALTER SEQUENCE IF EXISTS {quote(f'{staging_table}_gid_seq')} "
+                    f"RENAME TO {quote(f'{live_table}_gid_seq')}"
+                )
+    
+    def publish(self, geoserver=None):
+        """Publish as its own layer, or as a view of the shared layer for partitioned storage
+        
+        Expects the workspace and datastore to exist. The stored extent is
+        declared to GeoServer so it does not scan the table for bounds.
+        """
+        from .geoserver_service import GeoServerService
+        from .layer_extent import compute_extent
+        
+        geoserver = geoserver or GeoServerService()
+        datastore_name = geoserver.datastore_name
+        
+        # Imports loaded before extents were stored
+        if self.extent is None:
+            compute_extent(self)
+        
+        layer_name = self.geoserver_layer_name
+        if self.storage_mode == 'partitioned':
+            if not geoserver.publish_sql_view(datastore_name, layer_name, shared_storage.get_view_sql(),
+                                              shared_storage.VIEW_PARAMETERS, srid=shared_storage.SHARED_SRID):
+                return False, "Failed to publish shared layer to GeoServer"
+        else:
+            if not geoserver.publish_layer(datastore_name, self.table_name, layer_name, self.srs,
+                                           self.extent, self.latlon_extent):
+                return False, "Failed to publish layer to GeoServer"
+        
+        # Update import record with GeoServer info
+        self.geoserver_layer = layer_name
+        self.geoserver_wms_url = geoserver.get_wms_url(layer_name, self.viewparams, self.latlon_extent)
+        self.geoserver_wfs_url = geoserver.get_wfs_url(layer_name, self.viewparams, self.extent)
+        self.published_to_geoserver = True
+        self.save()
+        return True, "Layer published to GeoServer successfully"
+    
     def get_table_info(self):
         """Get information about the created table"""
         try:
@@ -171,3 +625,121 @@ class ShapefileImport(models.Model):
                 return info
         except Exception as e:
             return {'error': str(e)}
+
+
+class GeoServerImportTask(models.Model):
+    """Local mirror of a GeoServer Importer import context"""
+    # Import context states after which GeoServer will not change the import any more
+    TERMINAL_STATES = ('COMPLETE', 'INIT_ERROR')
+    
+    geoserver_import_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=255)
+    state = models.CharField(max_length=50, default='PENDING')
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Poller bookkeeping
+    last_polled_at = models.DateTimeField(blank=True, null=True)
+    next_poll_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    poll_interval = models.FloatField(default=1.0)
+    poll_failures = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} - {self.geoserver_import_id} ({self.state})"
+    
+    @property
+    def is_terminal(self):
+        return self.state in self.TERMINAL_STATES
+    
+    def apply_payload(self, payload):
+        """Update the mirror from an import JSON returned by GeoServer"""
+        self.payload = payload
+        self.state = payload.get('import', {}).get('state', self.state)
+    
+    def refresh_from_geoserver(self, importer=None):
+        """Poll GeoServer once and schedule the next poll with adaptive backoff"""
+        from django.utils import timezone
+        from datetime import timedelta
+        from .geoserver_importer_service import GeoServerImporterService
+        
+        importer = importer or GeoServerImporterService()
+        min_interval = getattr(settings, 'GEOSERVER_IMPORTER_POLL_MIN_INTERVAL', 1.0)
+        max_interval = getattr(settings, 'GEOSERVER_IMPORTER_POLL_MAX_INTERVAL', 60.0)
+        max_age = getattr(settings, 'GEOSERVER_IMPORTER_POLL_MAX_AGE', 24 * 3600)
+        
+        previous_state = self.state
+        now = timezone.now()
+        payload = importer.get_import_status(self.geoserver_import_id)
+        
+        if payload is None:
+            self.poll_failures += 1
+        else:
+            self.poll_failures = 0
+            self.apply_payload(payload)
+        
+        # Reset to the fastest interval while the import is moving, back off while it is idle
+        if payload is not None and self.state != previous_state:
+            self.poll_interval = min_interval
+        else:
+            self.poll_interval = min(max(self.poll_interval, min_interval) * 2, max_interval)
+        
+        self.last_polled_at = now
+        if self.is_terminal or (now - self.created_at).total_seconds() > max_age:
+            self.next_poll_at = None
+        else:
+            self.next_poll_at = now + timedelta(seconds=self.poll_interval)
+        self.save()
+        return self.state
+
+
+class OrphanCandidate(models.Model):
+    """Datastore table or GeoServer feature type without a live import, reaped after a grace period"""
+    KINDS = [
+        ('table', 'Datastore table'),
+        ('layer', 'GeoServer feature type'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KINDS)
+    name = models.CharField(max_length=255)
+    size_bytes = models.BigIntegerField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = [('kind', 'name')]
+    
+    def __str__(self):
+        return f"{self.kind} {self.name}"
+
+
+class RequestProfile(models.Model):
+    """Profile of one API request, kept in a ring buffer of GEOIMPORTER_PROFILING_MAX_PROFILES"""
+    TRIGGERS = [
+        ('header', 'Signed header'),
+        ('sample', 'Sampled'),
+    ]
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.IntegerField(blank=True, null=True)
+    trigger = models.CharField(max_length=20, choices=TRIGGERS)
+    duration_ms = models.FloatField()
+    
+    # SQL on both databases and outbound GeoServer calls, totals and the first entries
+    sql_count = models.IntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    queries = models.JSONField(default=list)
+    http_count = models.IntegerField(default=0)
+    http_ms = models.FloatField(default=0)
+    http_calls = models.JSONField(default=list)
+    
+    # cProfile statistics sorted by cumulative time
+    profile = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,318 @@
+import math
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+from django.conf import settings
+from django.db import connections
+from . import partitioned_loader
+from .format_loader import launder_column_name
+from .spatial_query import is_geographic, metres_per_unit
+
+OVERLAY_OPERATIONS = ('intersection', 'spatial_join', 'within_distance', 'point_in_polygon')
+
+# Topological dimension of the PostGIS geometry types
+DIMENSIONS = {
+    'POINT': 0, 'MULTIPOINT': 0,
+    'LINESTRING': 1, 'MULTILINESTRING': 1,
+    'POLYGON': 2, 'MULTIPOLYGON': 2,
+}
+MULTI_TYPES = {0: 'MultiPoint', 1: 'MultiLineString', 2: 'MultiPolygon'}
+
+# Less than a degree of latitude (110574 m at the equator) or of longitude at the
+# equator, so distances converted with it bound geodesic distances from above
+METRES_PER_DEGREE = 110000.0
+# Edges of the outer tiles, which must catch features outside an estimated extent
+UNBOUNDED = 1e300
+
+
+class OverlayError(ValueError):
+    """Raised for invalid overlay parameters"""
+
+
+def _geometry_column(cursor, table_name: str) -> Tuple[Optional[int], str]:
+    """Dimension of the geometry type of a table (None when mixed) and its full column type"""
+    cursor.execute(
+        "SELECT type FROM geometry_columns WHERE f_table_schema = 'public' AND f_table_name = %s "
+        "AND f_geometry_column = 'geom'",
+        [table_name]
+    )
+    row = cursor.fetchone()
+    cursor.execute(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'geom'",
+        [connections['datastore'].ops.quote_name(table_name)]
+    )
+    return DIMENSIONS.get(row[0].upper() if row else None), cursor.fetchone()[0]
+
+
+def _attribute_columns(cursor, table_name: str) -> List[str]:
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = %s "
+        "AND column_name NOT IN ('gid', 'geom') AND udt_name <> 'geometry' ORDER BY ordinal_position",
+        [table_name]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _tiles(extent: List[float], count: int) -> List[Tuple[Optional[float], ...]]:
+    """Split an extent into about count tiles; the outer edges are left open"""
+    columns = max(int(math.ceil(math.sqrt(count))), 1)
+    rows = max(int(math.ceil(count / columns)), 1)
+    minx, miny, maxx, maxy = extent
+    xs = [minx + (maxx - minx) * i / columns for i in range(columns + 1)]
+    ys = [miny + (maxy - miny) * j / rows for j in range(rows + 1)]
+    xs[0] = ys[0] = xs[-1] = ys[-1] = None
+    return [
+        (xs[i], ys[j], xs[i + 1], ys[j + 1])
+        for i in range(columns) for j in range(rows)
+    ]
+
+
+def _tile_condition(tile, srid: int) -> Tuple[str, List[Any]]:
+    """Left features whose lower left bbox corner is in the tile, so each lands in exactly one tile
+
+    The && on the tile envelope lets the GiST index of the left table pick
+    the candidates.
+    """
+    x0, y0, x1, y1 = tile
+    conditions = ["a.geom && ST_MakeEnvelope(%s, %s, %s, %s, %s)"]
+    params = [
+        -UNBOUNDED if x0 is None else x0, -UNBOUNDED if y0 is None else y0,
+        UNBOUNDED if x1 is None else x1, UNBOUNDED if y1 is None else y1,
+        srid,
+    ]
+    for value, condition in ((x0, "ST_XMin(a.geom) >= %s"), (x1, "ST_XMin(a.geom) < %s"),
+                             (y0, "ST_YMin(a.geom) >= %s"), (y1, "ST_YMin(a.geom) < %s")):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    return ' AND '.join(conditions), params
+
+
+class Overlay:
+    """SQL of an overlay of a left and a right imported layer
+
+    Joins run in the SRS of the right layer so that its GiST index answers
+    the predicate for each left feature; results are in the SRS of the left
+    layer, and keep the attributes of both layers (right names made unique).
+    """
+
+    def __init__(self, cursor, left, right, operation: str, distance: Optional[float] = None):
+        if operation not in OVERLAY_OPERATIONS:
+            raise OverlayError(f"operation must be one of {', '.join(OVERLAY_OPERATIONS)}")
+        if operation == 'within_distance' and not (distance and distance > 0):
+            raise OverlayError("within_distance needs a positive distance in metres")
+
+        self.left, self.right = left, right
+        self.operation = operation
+        self.distance = distance
+        self.left_srid = left.srid or 4326
+        self.right_srid = right.srid or 4326
+        # Distances are tested in the units of the right layer, None when in degrees
+        self.metres_per_unit = None
+        if operation == 'within_distance' and not is_geographic(self.right_srid):
+            self.metres_per_unit = metres_per_unit(self.right_srid)
+            if not self.metres_per_unit:
+                raise OverlayError(f"EPSG:{self.right_srid} of the right layer has no known linear unit for distances")
+
+        self.left_dimension, self.left_geometry_type = _geometry_column(cursor, left.table_name)
+        self.right_dimension, _ = _geometry_column(cursor, right.table_name)
+        if operation == 'point_in_polygon' and (self.left_dimension not in (2, None) or self.right_dimension not in (0, None)):
+            raise OverlayError("point_in_polygon counts the points of the right layer in the polygons of the left layer")
+
+        quote = connections['datastore'].ops.quote_name
+        taken = set()
+        self.columns = [
+            (f"a.{quote(column)}", launder_column_name(column, taken))
+            for column in _attribute_columns(cursor, left.table_name)
+        ]
+        if operation != 'point_in_polygon':
+            self.columns += [
+                (f"b.{quote(column)}", launder_column_name(column, taken))
+                for column in _attribute_columns(cursor, right.table_name)
+            ]
+        self.extra_column = {
+            'within_distance': launder_column_name('distance', taken),
+            'point_in_polygon': launder_column_name('point_count', taken),
+        }.get(operation)
+
+    def _left_in_right_srs(self) -> str:
+        if self.left_srid == self.right_srid:
+            return "a.geom"
+        return f"ST_Transform(a.geom, {int(self.right_srid)})"
+
+    def _right_in_left_srs(self) -> str:
+        if self.left_srid == self.right_srid:
+            return "b.geom"
+        return f"ST_Transform(b.geom, {int(self.left_srid)})"
+
+    def _degrees_bound(self) -> float:
+        """Distance in degrees covering self.distance metres anywhere over both layers"""
+        latitudes = [
+            abs(value)
+            for extent in (self.left.latlon_extent, self.right.latlon_extent) if extent
+            for value in (extent[1], extent[3])
+        ] or [89.0]
+        latitude = min(max(latitudes), 89.0)
+        return self.distance / (METRES_PER_DEGREE * math.cos(math.radians(latitude)))
+
+    def _distance_sql(self) -> Tuple[str, str, List[Any]]:
+        """Join predicate and distance expression within self.distance metres"""
+        left_geom = self._left_in_right_srs()
+        if self.metres_per_unit is None:
+            # The planar prefilter uses the index, the geodesic test is exact
+            return (
+                f"ST_DWithin({left_geom}, b.geom, %s) AND ST_DWithin({left_geom}::geography, b.geom::geography, %s)",
+                f"ST_Distance({left_geom}::geography, b.geom::geography)",
+                [self._degrees_bound(), self.distance]
+            )
+        # Projected units (metres, US feet...) converted to and from metres
+        return (
+            f"ST_DWithin({left_geom}, b.geom, %s)",
+            f"ST_Distance({left_geom}, b.geom) * {self.metres_per_unit!r}",
+            [self.distance / self.metres_per_unit]
+        )
+
+    def select_sql(self, result_geometry_type: str) -> Tuple[str, List[Any]]:
+        """SELECT of the overlay rows, to be completed with a tile condition on the left table"""
+        quote = connections['datastore'].ops.quote_name
+        left_table, right_table = quote(self.left.table_name), quote(self.right.table_name)
+        columns = [f"{expression} AS {quote(name)}" for expression, name in self.columns]
+        intersects = f"ST_Intersects({self._left_in_right_srs()}, b.geom)"
+        params = []
+
+        if self.operation == 'intersection':
+            right_geom = self._right_in_left_srs()
+            geometry = (
+                f"CASE WHEN ST_CoveredBy(a.geom, {right_geom}) THEN a.geom "
+                f"ELSE ST_Intersection(a.geom, {right_geom}) END"
+            )
+            if self.left_dimension is not None and self.right_dimension is not None:
+                # Keep the parts of the lowest dimension, dropping touching edges and corners
+                dimension = min(self.left_dimension, self.right_dimension)
+                geometry = f"ST_Multi(ST_CollectionExtract({geometry}, {dimension + 1}))"
+            source = f"{left_table} a JOIN {right_table} b ON {intersects}"
+        elif self.operation == 'spatial_join':
+            geometry = "a.geom"
+            source = f"{left_table} a LEFT JOIN {right_table} b ON {intersects}"
+        elif self.operation == 'within_distance':
+            predicate, distance, params = self._distance_sql()
+            geometry = "a.geom"
+            columns.append(f"{distance} AS {quote(self.extra_column)}")
+            source = f"{left_table} a JOIN {right_table} b ON {predicate}"
+        else:
+            geometry = "a.geom"
+            columns.append(f"c.point_count AS {quote(self.extra_column)}")
+            source = (
+                f"{left_table} a CROSS JOIN LATERAL "
+                f"(SELECT count(*) AS point_count FROM {right_table} b WHERE {intersects}) c"
+            )
+
+        columns.append(f"({geometry})::{result_geometry_type} AS geom")
+        return f"SELECT {', '.join(columns)} FROM {source}", params
+
+    def column_names(self) -> List[str]:
+        """Columns of the result table filled by select_sql(), in order"""
+        names = [name for _, name in self.columns]
+        if self.extra_column:
+            names.append(self.extra_column)
+        return names + ['geom']
+
+    def result_geometry_type(self) -> str:
+        if self.operation == 'intersection' and self.left_dimension is not None and self.right_dimension is not None:
+            dimension = min(self.left_dimension, self.right_dimension)
+            return f"geometry({MULTI_TYPES[dimension]}, {int(self.left_srid)})"
+        if self.operation == 'intersection' or self.left_geometry_type == 'geometry':
+            return f"geometry(Geometry, {int(self.left_srid)})"
+        return self.left_geometry_type
+
+
+def _insert_tile(table_name: str, columns: List[str], select: str, params: List[Any], tile, srid: int,
+                 skip_empty: bool) -> int:
+    """Insert the overlay rows of one tile on this thread's own connection"""
+    connection = connections['datastore']
+    try:
+        condition, tile_params = _tile_condition(tile, srid)
+        query = f"{select} WHERE {condition}"
+        if skip_empty:
+            query = f"SELECT * FROM ({query}) s WHERE NOT ST_IsEmpty(s.geom)"
+        with connection.cursor() as cursor:
+            quote = connection.ops.quote_name
+            cursor.execute(
+                f"INSERT INTO {quote(table_name)} ({', '.join(quote(column) for column in columns)}) {query}",
+                params + tile_params
+            )
+            return cursor.rowcount
+    finally:
+        connection.close()
+
+
+def run_overlay(left, right, operation: str, distance: Optional[float] = None, name: Optional[str] = None):
+    """Overlay two imported layers in PostGIS and save the result as a new import
+
+    The extent of the left layer is cut into tiles that are processed in
+    parallel, each on its own connection, by INSERT ... SELECT statements
+    whose joins use the GiST indexes of both tables. The result table is
+    indexed once at the end and returned as a successful ShapefileImport
+    that can be published like any other.
+    """
+    from .models import ShapefileImport
+    from .layer_extent import compute_extent
+
+    for record in (left, right):
+        if record.status != 'success':
+            raise OverlayError(f"Import {record.id} is not ready (status: {record.status})")
+        if record.storage_mode == 'partitioned':
+            raise OverlayError(f"Import {record.id} is partitioned; overlays need imports with their own table")
+
+    started = time.monotonic()
+    if left.extent is None:
+        compute_extent(left)
+
+    connection = connections['datastore']
+    quote = connection.ops.quote_name
+    table_name = f"shapefile_{uuid.uuid4().hex[:8]}"
+
+    with connection.cursor() as cursor:
+        overlay = Overlay(cursor, left, right, operation, distance)
+    geometry_type = overlay.result_geometry_type()
+    select, params = overlay.select_sql(geometry_type)
+
+    workers = partitioned_loader.get_worker_count()
+    tiles = _tiles(left.extent, workers * getattr(settings, 'GEOIMPORTER_OVERLAY_TILES_PER_WORKER', 4)) \
+        if left.extent else [(None, None, None, None)]
+
+    record = ShapefileImport.objects.create(
+        name=name or f"{operation} of {left.name} and {right.name}",
+        file_path=f"overlay:{operation}:{left.id}:{right.id}",
+        table_name=table_name,
+        status='processing',
+        keep_native_crs=left.keep_native_crs,
+        source_format='overlay'
+    )
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {quote(table_name)} AS {select} WHERE false",
+                params
+            )
+            cursor.execute(f"ALTER TABLE {quote(table_name)} ADD COLUMN gid serial PRIMARY KEY")
+
+        skip_empty = operation == 'intersection'
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rows = sum(executor.map(
+                lambda tile: _insert_tile(table_name, overlay.column_names(), select, params, tile,
+                                          overlay.left_srid, skip_empty),
+                tiles
+            ))
+        partitioned_loader.finalize_table(table_name)
+    except Exception:
+        partitioned_loader.drop_table(table_name)
+        record.status = 'error'
+        record.save()
+        raise
+
+    record.load_seconds = time.monotonic() - started
+    record._finish_import()
+    return record, f"{operation} produced {rows} features using {len(tiles)} tiles on {workers} workers."
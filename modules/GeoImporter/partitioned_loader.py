@@ -0,0 +1,149 @@
+import os
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.db import connections
+
+# .shx layout: 100 byte header, then one 8 byte record per feature holding the
+# record offset and content length in the .shp, both big-endian 16-bit words
+SHX_HEADER_SIZE = 100
+SHX_RECORD_SIZE = 8
+
+
+def _get_shx_path(shapefile_path: str) -> Optional[str]:
+    """Find the .shx index next to a .shp file"""
+    base_path = os.path.splitext(shapefile_path)[0]
+    for ext in ('.shx', '.SHX'):
+        if os.path.exists(base_path + ext):
+            return base_path + ext
+    return None
+
+
+def get_feature_count(shapefile_path: str) -> int:
+    """Number of records in a shapefile, read from the size of its .shx"""
+    shx_path = _get_shx_path(shapefile_path)
+    if not shx_path:
+        return 0
+    return max(os.path.getsize(shx_path) - SHX_HEADER_SIZE, 0) // SHX_RECORD_SIZE
+
+
+def get_worker_count() -> int:
+    """Number of concurrent ogr2ogr processes for a partitioned load"""
+    return max(int(getattr(settings, 'GEOIMPORTER_PARALLEL_WORKERS', 0) or os.cpu_count() or 1), 1)
+
+
+def should_partition(shapefile_path: str) -> bool:
+    """Whether a shapefile is large enough to be worth loading in parallel"""
+    min_features = getattr(settings, 'GEOIMPORTER_PARALLEL_MIN_FEATURES', 1000000)
+    return get_worker_count() > 1 and get_feature_count(shapefile_path) >= min_features
+
+
+def plan_fid_ranges(shapefile_path: str, partitions: int) -> List[Tuple[int, int]]:
+    """Split a shapefile into [start, end) FID ranges holding roughly equal bytes
+
+    Record offsets in the .shx are positions in the .shp, so a binary search
+    over them balances the ranges by geometry size rather than feature count
+    without reading the whole index.
+    """
+    count = get_feature_count(shapefile_path)
+    if count == 0:
+        return []
+    partitions = max(min(partitions, count), 1)
+
+    with open(_get_shx_path(shapefile_path), 'rb') as f:
+        def record_offset(index):
+            f.seek(SHX_HEADER_SIZE + index * SHX_RECORD_SIZE)
+            return struct.unpack('>i', f.read(4))[0] * 2
+
+        first_offset = record_offset(0)
+        total = record_offset(count - 1) - first_offset
+
+        bounds = [0]
+        for k in range(1, partitions):
+            target = first_offset + total * k // partitions
+            low, high = bounds[-1], count
+            while low < high:
+                mid = (low + high) // 2
+                if record_offset(mid) < target:
+                    low = mid + 1
+                else:
+                    high = mid
+            bounds.append(low)
+        bounds.append(count)
+
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _run_ogr2ogr(cmd: List[str]):
+    """Run one ogr2ogr process and raise with its stderr on failure"""
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ogr2ogr exited with {result.returncode}")
+
+
+def finalize_table(table_name: str):
+    """Make a bulk-loaded UNLOGGED table durable, then index and analyze it once"""
+    connection = connections['datastore']
+    table = connection.ops.quote_name(table_name)
+    index = connection.ops.quote_name(f"{table_name}_geom_geom_idx")
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} SET LOGGED")
+        cursor.execute(f"CREATE INDEX {index} ON {table} USING GIST (geom)")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'gid'), COALESCE(MAX(gid), 0) + 1, false) FROM {table}",
+            [table_name]
+        )
+        cursor.execute(f"ANALYZE {table}")
+
+
+def drop_table(table_name: str):
+    """Drop a partially loaded table"""
+    connection = connections['datastore']
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(table_name)}")
+
+
+def load_partitioned(import_record, shapefile_path: str, conn_str: str, source_srid: Optional[int],
+                     table_name: str = None, target_srid: Optional[int] = None) -> Tuple[bool, str]:
+    """Load a large shapefile with a pool of ogr2ogr processes, one per FID range"""
+    table_name = table_name or import_record.table_name
+    workers = get_worker_count()
+    ranges = plan_fid_ranges(shapefile_path, workers * 2)
+
+    try:
+        # Create the empty UNLOGGED table without an index; workers then only append
+        _run_ogr2ogr(import_record._build_ogr2ogr_cmd(
+            shapefile_path, conn_str, 'PROMOTE_TO_MULTI', source_srid,
+            table_name=table_name,
+            layer_options={'SPATIAL_INDEX': 'NONE', 'UNLOGGED': 'ON'},
+            where='FID < 0',
+            target_srid=target_srid
+        ))
+
+        commands = []
+        for start, end in ranges:
+            cmd = import_record._build_ogr2ogr_cmd(
+                shapefile_path, conn_str, 'PROMOTE_TO_MULTI', source_srid,
+                table_name=table_name,
+                append=True,
+                where=f'FID >= {start} AND FID < {end}',
+                target_srid=target_srid
+            )
+            commands.append(cmd + ['--config', 'PG_USE_COPY', 'YES', '-gt', '65536'])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Consume results so the first failing range raises
+            list(executor.map(_run_ogr2ogr, commands))
+
+        finalize_table(table_name)
+        return True, f"Loaded {len(ranges)} FID ranges with {workers} workers."
+
+    except Exception as e:
+        try:
+            drop_table(table_name)
+        except Exception:
+            pass
+        return False, str(e)
@@ -0,0 +1,327 @@
+import contextvars
+import cProfile
+import io
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db.backends.signals import connection_created
+import requests
+
+# Requests carrying a valid token in this header are profiled
+HEADER = 'X-GeoImporter-Profile'
+# Id of the stored RequestProfile, set on profiled responses
+PROFILE_ID_HEADER = 'X-GeoImporter-Profile-Id'
+SIGNING_SALT = 'geoimporter.profiling'
+PROFILED_DATABASES = ('default', 'datastore')
+
+# Recorder of the request being profiled, None when profiling is off
+_current_recorder = contextvars.ContextVar('geoimporter_profile_recorder', default=None)
+_original_send = None
+
+
+def make_token() -> str:
+    """Signed value of the profiling header, valid for GEOIMPORTER_PROFILING_TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+
+def _token_valid(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=getattr(settings, 'GEOIMPORTER_PROFILING_TOKEN_MAX_AGE', 3600)
+        )
+        return True
+    except signing.BadSignature:
+        return False
+
+
+class Recorder:
+    """cProfile stats, SQL queries and outbound HTTP calls of one profiled request"""
+
+    def __init__(self, trigger: str):
+        self.trigger = trigger
+        self.max_entries = getattr(settings, 'GEOIMPORTER_PROFILING_MAX_QUERIES', 500)
+        self.queries = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.http_calls = []
+        self.http_count = 0
+        self.http_ms = 0.0
+        self.duration_ms = 0.0
+        self.profiler = cProfile.Profile()
+        self.profiled = False
+        self.profile_id = None
+
+    def record_query(self, alias: str, sql: str, ms: float):
+        self.sql_count += 1
+        self.sql_ms += ms
+        if len(self.queries) < self.max_entries:
+            self.queries.append({'database': alias, 'sql': sql[:2000], 'ms': round(ms, 3)})
+
+    def record_http(self, method: str, url: str, status_code, ms: float):
+        self.http_count += 1
+        self.http_ms += ms
+        if len(self.http_calls) < self.max_entries:
+            self.http_calls.append({'method': method, 'url': url, 'status': status_code, 'ms': round(ms, 3)})
+
+    @contextmanager
+    def capture(self):
+        """Record everything the request does in this context while the block runs
+
+        SQL and HTTP calls are recorded from every thread the context is
+        copied to, such as the one sync_to_async runs a sync view in. Can be
+        entered again, e.g. for each chunk of a streamed response; the
+        cProfile stats and durations add up.
+        """
+        token = _current_recorder.set(self)
+        started = time.perf_counter()
+        enabled = False
+        try:
+            self.profiler.enable()
+            enabled = self.profiled = True
+        except ValueError:
+            # Another profiler is active: a concurrent profiled request (process-wide
+            # on Python 3.12+, where cProfile runs on sys.monitoring) or async view
+            pass
+        try:
+            yield self
+        finally:
+            if enabled:
+                self.profiler.disable()
+            self.duration_ms += (time.perf_counter() - started) * 1000
+            _current_recorder.reset(token)
+
+    def stats_text(self) -> str:
+        if not self.profiled:
+            return "No cProfile: another request was being profiled at the same time."
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(getattr(settings, 'GEOIMPORTER_PROFILING_TOP_FUNCTIONS', 40))
+        return stream.getvalue()
+
+    def _fields(self):
+        return {
+            'duration_ms': self.duration_ms,
+            'sql_count': self.sql_count,
+            'sql_ms': self.sql_ms,
+            'http_count': self.http_count,
+            'http_ms': self.http_ms,
+            'queries': self.queries,
+            'http_calls': self.http_calls,
+            'profile': self.stats_text(),
+        }
+
+    def save(self, request, response):
+        """Store the profile, drop the oldest beyond GEOIMPORTER_PROFILING_MAX_PROFILES"""
+        from .models import RequestProfile
+
+        try:
+            profile = RequestProfile.objects.create(
+                method=request.method,
+                path=request.get_full_path()[:500],
+                status_code=getattr(response, 'status_code', None),
+                trigger=self.trigger,
+                **self._fields()
+            )
+            self.profile_id = profile.id
+            max_profiles = getattr(settings, 'GEOIMPORTER_PROFILING_MAX_PROFILES', 200)
+            RequestProfile.objects.filter(id__lte=profile.id - max_profiles).delete()
+            response[PROFILE_ID_HEADER] = str(profile.id)
+        except Exception as e:
+            print(f"Could not store request profile: {str(e)}")
+
+    def update(self):
+        """Store what was recorded since save(), once a streamed body is sent"""
+        from .models import RequestProfile
+
+        if self.profile_id is None:
+            return
+        try:
+            RequestProfile.objects.filter(id=self.profile_id).update(**self._fields())
+        except Exception as e:
+            print(f"Could not update request profile: {str(e)}")
+
+    def record_stream(self, response):
+        """Keep recording while the body of a streaming response is produced
+
+        The body is generated after the view returned, so each chunk is read
+        inside capture() and the stored profile is updated at the end.
+        """
+        content = response.streaming_content
+        recorder = self
+
+        if response.is_async:
+            async def stream():
+                iterator = aiter(content)
+                try:
+                    while True:
+                        with recorder.capture():
+                            try:
+                                chunk = await anext(iterator)
+                            except StopAsyncIteration:
+                                break
+                        yield chunk
+                finally:
+                    await sync_to_async(recorder.update)()
+        else:
+            def stream():
+                iterator = iter(content)
+                try:
+                    while True:
+                        with recorder.capture():
+                            chunk = next(iterator, None)
+                        if chunk is None:
+                            break
+                        yield chunk
+                finally:
+                    recorder.update()
+
+        response.streaming_content = stream()
+
+
+def _record_query(execute, sql, params, many, context):
+    """Execute wrapper of every connection, timing queries while a request is profiled"""
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record_query(context['connection'].alias, sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    """Add _record_query to a connection of a profiled database, in whichever thread opens it"""
+    if connection.alias in PROFILED_DATABASES and _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _instrument_requests():
+    """Time the outbound calls made with requests while a request is profiled"""
+    global _original_send
+    if _original_send is not None:
+        return
+    _original_send = requests.Session.send
+
+    def send(session, prepared_request, **kwargs):
+        recorder = _current_recorder.get()
+        if recorder is None:
+            return _original_send(session, prepared_request, **kwargs)
+
+        started = time.perf_counter()
+        status_code = None
+        try:
+            response = _original_send(session, prepared_request, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            recorder.record_http(prepared_request.method, prepared_request.url, status_code,
+                                 (time.perf_counter() - started) * 1000)
+
+    requests.Session.send = send
+
+
+def _httpx_request_started(request):
+    if _current_recorder.get() is not None:
+        request.extensions['geoimporter_started'] = time.perf_counter()
+
+
+def _httpx_response_received(response):
+    recorder = _current_recorder.get()
+    started = response.request.extensions.get('geoimporter_started')
+    if recorder is not None and started is not None:
+        recorder.record_http(response.request.method, str(response.request.url), response.status_code,
+                             (time.perf_counter() - started) * 1000)
+
+
+async def _ahttpx_request_started(request):
+    _httpx_request_started(request)
+
+
+async def _ahttpx_response_received(response):
+    _httpx_response_received(response)
+
+
+def httpx_event_hooks(asynchronous: bool = True):
+    """Event hooks timing the calls of the shared HTTP clients while a request is profiled"""
+    if asynchronous:
+        return {'request': [_ahttpx_request_started], 'response': [_ahttpx_response_received]}
+    return {'request': [_httpx_request_started], 'response': [_httpx_response_received]}
+
+
+class ProfilingMiddleware:
+    """Profile API requests carrying a signed header, or a sampled fraction of them
+
+    Requests under GEOIMPORTER_PROFILING_PATH_PREFIX with a valid
+    X-GeoImporter-Profile token (see the profiling_token command), or picked
+    with probability GEOIMPORTER_PROFILING_SAMPLE_RATE, get a cProfile, the
+    SQL run on both databases and the outbound GeoServer calls recorded as a
+    RequestProfile, including those made while a streamed body is produced.
+    Other requests only pay for the header lookup.
+
+    On Python 3.12+ (the Docker image runs 3.13) cProfile is built on the
+    process-wide sys.monitoring: under the threaded runserver a profile also
+    holds the calls other threads make meanwhile, and a request profiled
+    while another one is gets no cProfile, only its SQL and HTTP calls.
+    SQL is recorded by a wrapper on every connection that reads the recorder
+    from the context, so queries of sync views that ASGI runs in a worker
+    thread are recorded. cProfile only sees the Python calls of that thread on
+    3.12+.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        _instrument_requests()
+        connection_created.connect(_install_query_recorder, dispatch_uid='geoimporter_profiling')
+
+    def _trigger(self, request):
+        """Why the request is profiled, None when it is not"""
+        if not request.path.startswith(getattr(settings, 'GEOIMPORTER_PROFILING_PATH_PREFIX', '/api/geoimporter/')):
+            return None
+        token = request.headers.get(HEADER)
+        if token and _token_valid(token):
+            return 'header'
+        sample_rate = getattr(settings, 'GEOIMPORTER_PROFILING_SAMPLE_RATE', 0)
+        if sample_rate and random.random() < sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        recorder = Recorder(trigger)
+        with recorder.capture():
+            response = self.get_response(request)
+        recorder.save(request, response)
+        if getattr(response, 'streaming', False):
+            recorder.record_stream(response)
+        return response
+
+    async def __acall__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+
+        recorder = Recorder(trigger)
+        with recorder.capture():
+            response = await self.get_response(request)
+        await sync_to_async(recorder.save)(request, response)
+        if getattr(response, 'streaming', False):
+            recorder.record_stream(response)
+        return response
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from .models import ShapefileImport, OrphanCandidate
+from .geoserver_service import GeoServerService
+from . import shared_storage
+
+# Prefix of the feature types published per import (see ShapefileImport.publish)
+LAYER_PREFIX = 'layer_shapefile_'
+
+
+def list_datastore_tables() -> Dict[str, int]:
+    """Import tables in the datastore with their total size, including leftover staging tables"""
+    like_shared = shared_storage.get_table_name().replace('_', r'\_') + r'\_%'
+    with connections['datastore'].cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_total_relation_size(c.oid) "
+            "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = 'public' AND c.relkind = 'r' "
+            "AND (c.relname LIKE %s OR c.relname LIKE %s)",
+            [r'shapefile\_%', like_shared]
+        )
+        return dict(cursor.fetchall())
+
+
+def _live_tables():
+    return set(ShapefileImport.objects.exclude(status='error').values_list('table_name', flat=True))
+
+
+def _live_layers():
+    layers = set(
+        ShapefileImport.objects.filter(published_to_geoserver=True).values_list('geoserver_layer', flat=True)
+    )
+    layers.add(shared_storage.get_layer_name())
+    return layers
+
+
+def _track(kind: str, orphans: Dict[str, int]):
+    """Record newly seen orphans and forget candidates that are no longer orphaned"""
+    OrphanCandidate.objects.filter(kind=kind).exclude(name__in=list(orphans)).delete()
+    OrphanCandidate.objects.bulk_create(
+        [OrphanCandidate(kind=kind, name=name, size_bytes=size) for name, size in orphans.items()],
+        ignore_conflicts=True
+    )
+
+
+def drop_tables(table_names) -> int:
+    """Drop datastore tables in one statement and return the number dropped"""
+    connection = connections['datastore']
+    quote = connection.ops.quote_name
+    table_names = list(table_names)
+    if table_names:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {', '.join(quote(name) for name in table_names)}")
+    return len(table_names)
+
+
+def reap_orphans(dry_run: bool = False, grace_seconds: Optional[int] = None,
+                 batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Reconcile datastore tables and GeoServer feature types with the live imports
+
+    Tables and per-import feature types without a live ShapefileImport become
+    candidates; those still orphaned after the grace period (which protects
+    imports in progress) are dropped in batches. Returns a report of what was
+    reaped, the space reclaimed and what is still waiting out its grace period.
+    """
+    if grace_seconds is None:
+        grace_seconds = getattr(settings, 'GEOIMPORTER_REAPER_GRACE_SECONDS', 24 * 3600)
+    batch_size = batch_size or getattr(settings, 'GEOIMPORTER_REAPER_BATCH_SIZE', 50)
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+
+    report = {
+        'dry_run': dry_run,
+        'tables_dropped': 0,
+        'layers_deleted': 0,
+        'bytes_reclaimed': 0,
+        'pending_tables': 0,
+        'pending_layers': 0,
+        'errors': [],
+    }
+
+    # Diff both catalogs against the import rows in memory
+    tables = list_datastore_tables()
+    live_tables = _live_tables()
+    _track('table', {name: size for name, size in tables.items() if name not in live_tables})
+
+    geoserver = GeoServerService()
+    datastore_name = geoserver.datastore_name
+    featuretypes = geoserver.list_featuretypes(datastore_name)
+    if featuretypes is None:
+        report['errors'].append("Could not list GeoServer feature types, layers were not reconciled")
+    else:
+        live_layers = _live_layers()
+        _track('layer', {
+            name: 0 for name in featuretypes
+            if name.startswith(LAYER_PREFIX) and name not in live_layers
+        })
+
+    due = OrphanCandidate.objects.filter(first_seen__lte=cutoff)
+    report['pending_tables'] = OrphanCandidate.objects.filter(kind='table', first_seen__gt=cutoff).count()
+    report['pending_layers'] = OrphanCandidate.objects.filter(kind='layer', first_seen__gt=cutoff).count()
+
+    due_tables = list(due.filter(kind='table').order_by('name'))
+    for start in range(0, len(due_tables), batch_size):
+        batch = due_tables[start:start + batch_size]
+        # An import may have claimed the table since the scan
+        live_tables = _live_tables()
+        batch = [candidate for candidate in batch if candidate.name not in live_tables]
+        if not dry_run:
+            try:
+                drop_tables(candidate.name for candidate in batch)
+            except Exception as e:
+                report['errors'].append(f"Could not drop tables: {str(e)}")
+                continue
+            OrphanCandidate.objects.filter(id__in=[candidate.id for candidate in batch]).delete()
+        report['tables_dropped'] += len(batch)
+        report['bytes_reclaimed'] += sum(tables.get(candidate.name, candidate.size_bytes) for candidate in batch)
+
+    if featuretypes is not None:
+        live_layers = _live_layers()
+        for candidate in due.filter(kind='layer').order_by('name'):
+            if candidate.name in live_layers:
+                continue
+            if not dry_run:
+                if not geoserver.delete_featuretype(datastore_name, candidate.name):
+                    report['errors'].append(f"Could not delete feature type {candidate.name}")
+                    continue
+                candidate.delete()
+            report['layers_deleted'] += 1
+
+    return report
+
+
+def cleanup_import(table_name: str, geoserver_layer: Optional[str] = None, storage_mode: str = 'table'):
+    """Drop the table and per-import GeoServer layer of a deleted import
+
+    Anything left behind on failure is picked up later by reap_orphans().
+    """
+    if table_name:
+        try:
+            drop_tables([table_name])
+        except Exception as e:
+            print(f"Could not drop table {table_name}: {str(e)}")
+
+    # The shared layer of partitioned imports stays published for the others
+    if geoserver_layer and storage_mode != 'partitioned':
+        geoserver = GeoServerService()
+        geoserver.delete_featuretype(geoserver.datastore_name, geoserver_layer)
@@ -13,6 +13,10 @@ class ShapefileImportSchema(Schema):
     geoserver_wms_url: Optional[str] = None
     geoserver_wfs_url: Optional[str] = None
     published_to_geoserver: bool = False
+    srid: Optional[int] = None
+    source_format: str = 'shapefile'
+    storage_mode: str = 'table'
+    thumbnail_url: Optional[str] = None
 
 
 class ShapefileImportCreateSchema(Schema):
@@ -36,17 +40,60 @@ class ImportStatusResponse(Schema):
     geoserver_wms_url: Optional[str] = None
     geoserver_wfs_url: Optional[str] = None
     published_to_geoserver: bool = False
+    srid: Optional[int] = None
+    status_version: int = 0
+    narrowing_report: Optional[Dict[str, Any]] = None
+    precision_report: Optional[Dict[str, Any]] = None
+    thumbnail_url: Optional[str] = None
     table_info: Optional[TableInfoSchema] = None
 
 
+class StatusWaitSchema(Schema):
+    versions: Dict[int, int]
+    timeout: float = 25
+
+
+class StatusChangeSchema(Schema):
+    id: int
+    name: str
+    status: str
+    status_version: int
+    table_name: str
+    geoserver_layer: Optional[str] = None
+    geoserver_wms_url: Optional[str] = None
+    geoserver_wfs_url: Optional[str] = None
+    published_to_geoserver: bool = False
+    srid: Optional[int] = None
+
+
+class StatusChangesResponse(Schema):
+    changed: List[StatusChangeSchema]
+    deleted: List[int]
+    timed_out: bool
+
+
 class ImportListResponse(Schema):
     imports: List[ShapefileImportSchema]
 
 
+class LayerCatalogSchema(Schema):
+    import_id: int
+    table_name: str
+    columns: List[List[str]]
+    geometry_type: Optional[str] = None
+    srid: Optional[int] = None
+    estimated_row_count: int = 0
+
+
+class CatalogResponse(Schema):
+    layers: List[LayerCatalogSchema]
+
+
 class SuccessResponse(Schema):
     success: bool = True
     message: str
     import_id: Optional[int] = None
+    import_ids: Optional[List[int]] = None
     table_name: Optional[str] = None
     geoserver_layer: Optional[str] = None
     wms_url: Optional[str] = None
@@ -83,3 +130,27 @@ class GeoServerUserResponseSchema(Schema):
     success: bool
     message: str
     username: Optional[str] = None
+
+
+class SpatialQuerySchema(Schema):
+    """Spatial query over an imported table; geometries are GeoJSON in `srid`"""
+    bbox: Optional[List[float]] = None
+    intersects: Optional[Dict[str, Any]] = None
+    near: Optional[Dict[str, Any]] = None
+    distance: Optional[float] = None
+    nearest: Optional[int] = None
+    filters: Optional[Dict[str, Any]] = None
+    srid: int = 4326
+    limit: int = 100
+    after: Optional[int] = None
+    explain: bool = False
+
+
+class OverlaySchema(Schema):
+    """Overlay of two imports saved as a new import; distance is in metres for within_distance"""
+    left_id: int
+    right_id: int
+    operation: str
+    distance: Optional[float] = None
+    name: Optional[str] = None
+    publish: bool = False
@@ -0,0 +1,266 @@
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from contextlib import contextmanager
+from typing import Iterable
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+
+class ScratchQuotaExceeded(Exception):
+    """Raised when a reservation does not fit in the scratch quota
+
+    Answered with 429 and Retry-After, or 413 when the request is larger than
+    the whole quota and would never fit.
+    """
+
+    def __init__(self, requested: int, available: int, fits: bool = True):
+        if fits:
+            message = f"Import scratch space is busy: {requested} bytes needed, {max(available, 0)} available. Retry later."
+        else:
+            message = f"Upload needs {requested} bytes of scratch space, more than the {get_quota()} byte quota"
+        super().__init__(message)
+        self.requested = requested
+        self.available = available
+        self.fits = fits
+        self.retry_after = getattr(settings, 'GEOIMPORTER_SCRATCH_RETRY_AFTER', 30)
+
+
+def get_root() -> str:
+    return getattr(settings, 'GEOIMPORTER_SCRATCH_ROOT', None) or os.path.join(tempfile.gettempdir(), 'geoimporter')
+
+
+def get_quota() -> int:
+    return getattr(settings, 'GEOIMPORTER_SCRATCH_QUOTA_BYTES', 20 * 1024 ** 3)
+
+
+def _reservations_dir() -> str:
+    return os.path.join(get_root(), '.reservations')
+
+
+@contextmanager
+def _quota_lock():
+    """Exclusive lock over the reservations of every process sharing the scratch root"""
+    os.makedirs(_reservations_dir(), exist_ok=True)
+    with open(os.path.join(get_root(), '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def reserved_bytes() -> int:
+    """Bytes reserved by live processes; reservations of dead processes are cleaned up"""
+    total = 0
+    for entry in os.scandir(_reservations_dir()):
+        if entry.name.endswith('.tmp'):
+            continue
+        try:
+            with open(entry.path) as f:
+                reservation = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if _pid_alive(reservation['pid']):
+            total += reservation['bytes']
+        else:
+            # Left behind by a killed worker
+            shutil.rmtree(reservation.get('path') or '', ignore_errors=True)
+            os.remove(entry.path)
+    return total
+
+
+def estimate_upload_bytes(uploads: Iterable, extract: bool = True) -> int:
+    """Scratch bytes needed for uploads: the files, plus their expansion if zips are extracted
+
+    Uploads Django spooled to disk are already reserved by ScratchUploadMiddleware.
+    """
+    factor = getattr(settings, 'GEOIMPORTER_SCRATCH_ZIP_EXPANSION', 3)
+    total = 0
+    for upload in uploads:
+        if not hasattr(upload, 'temporary_file_path'):
+            total += upload.size
+        if extract and upload.name.lower().endswith('.zip'):
+            total += upload.size * factor
+    return total
+
+
+class ScratchSpace:
+    """A private scratch directory holding a byte reservation against the global quota
+
+    Used as a context manager: entering reserves the bytes (raising
+    ScratchQuotaExceeded when they do not fit) and creates the directory,
+    leaving removes both on every exit path. Small reservations go to the
+    GEOIMPORTER_SCRATCH_FAST_ROOT (e.g. a tmpfs) when one is configured.
+    """
+
+    def __init__(self, reserve_bytes: int, prefix: str = 'import'):
+        self.requested = reserve_bytes
+        self.prefix = prefix
+        self.reserved = 0
+        self.used = 0
+        self.path = None
+        self._reservation_path = os.path.join(_reservations_dir(), uuid.uuid4().hex)
+
+    def __enter__(self):
+        fast_root = getattr(settings, 'GEOIMPORTER_SCRATCH_FAST_ROOT', None)
+        fast_max = getattr(settings, 'GEOIMPORTER_SCRATCH_FAST_MAX_BYTES', 64 * 1024 ** 2)
+        root = fast_root if fast_root and self.requested <= fast_max else get_root()
+
+        self.reserve(self.requested)
+        try:
+            os.makedirs(root, exist_ok=True)
+            self.path = tempfile.mkdtemp(prefix=f'{self.prefix}_', dir=root)
+            self._write_reservation()
+        except Exception:
+            self._release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+        self._release()
+        return False
+
+    def _write_reservation(self):
+        """Replace the reservation file atomically, so reserved_bytes() never reads it half written"""
+        temporary_path = f"{self._reservation_path}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'bytes': self.reserved, 'path': self.path}, f)
+        os.replace(temporary_path, self._reservation_path)
+
+    def _release(self):
+        try:
+            os.remove(self._reservation_path)
+        except FileNotFoundError:
+            pass
+
+    def reserve(self, extra_bytes: int):
+        """Grow the reservation by extra_bytes if the quota allows it"""
+        if self.reserved + extra_bytes > get_quota():
+            raise ScratchQuotaExceeded(self.reserved + extra_bytes, get_quota(), fits=False)
+        
+        with _quota_lock():
+            available = get_quota() - reserved_bytes()
+            if extra_bytes > available:
+                raise ScratchQuotaExceeded(extra_bytes, available)
+            self.reserved += extra_bytes
+            self._write_reservation()
+
+    def _account(self, size: int):
+        """Count bytes about to be written, growing the reservation when the estimate was short"""
+        if self.used + size > self.reserved:
+            self.reserve(self.used + size - self.reserved)
+        self.used += size
+
+    def save_upload(self, uploaded_file) -> str:
+        """Path on disk of an upload, written into the scratch directory if Django kept it in memory"""
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            return uploaded_file.temporary_file_path()
+
+        self._account(uploaded_file.size)
+        path = os.path.join(self.path, os.path.basename(uploaded_file.name) or 'upload')
+        with open(path, 'wb') as f:
+            for chunk in uploaded_file.chunks():
+                f.write(chunk)
+        return path
+
+    def extract_zip(self, zip_path: str) -> str:
+        """Extract a zip into the scratch directory after checking its uncompressed size"""
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            self._account(sum(info.file_size for info in zip_ref.infolist()))
+            extract_dir = tempfile.mkdtemp(prefix='extract_', dir=self.path)
+            zip_ref.extractall(extract_dir)
+        return extract_dir
+
+
+class ScratchUploadMiddleware:
+    """Reserve large multipart request bodies before Django spools them to disk
+
+    Django writes uploads above FILE_UPLOAD_MAX_MEMORY_SIZE to
+    FILE_UPLOAD_TEMP_DIR, inside the scratch root, while the view parses the
+    body. The Content-Length is reserved first, so a body that does not fit
+    is turned away with 429 (413 if it never fits) before it is read; the
+    reservation is released when the response is closed, along with the
+    spooled files.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _reserve(self, request):
+        """Reservation for the body of the request, None when it is kept in memory"""
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if request.content_type != 'multipart/form-data' or length <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            return None
+        return ScratchSpace(length, prefix='request').__enter__()
+
+    def _quota_exceeded(self, exc: ScratchQuotaExceeded):
+        response = JsonResponse({'success': False, 'error': str(exc)}, status=429 if exc.fits else 413)
+        if exc.fits:
+            response['Retry-After'] = str(exc.retry_after)
+        return response
+
+    def _release_on_close(self, response, scratch: ScratchSpace):
+        # Run by the server with the other closers of the response
+        response._resource_closers.append(lambda: scratch.__exit__(None, None, None))
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        try:
+            scratch = self._reserve(request)
+        except ScratchQuotaExceeded as e:
+            return self._quota_exceeded(e)
+        if scratch is None:
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            scratch.__exit__(None, None, None)
+            raise
+        return self._release_on_close(response, scratch)
+
+    async def __acall__(self, request):
+        try:
+            scratch = await sync_to_async(self._reserve)(request)
+        except ScratchQuotaExceeded as e:
+            return self._quota_exceeded(e)
+        if scratch is None:
+            return await self.get_response(request)
+
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            scratch.__exit__(None, None, None)
+            raise
+        return self._release_on_close(response, scratch)
@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db import connections, transaction
+
+# Imports stored as list partitions of one shared table are always in this SRID
+SHARED_SRID = 4326
+
+# GeoServer SQL view over the shared table, filtered to one import by the
+# import_id view parameter (WMS/WFS viewparams=import_id:<id>)
+VIEW_PARAMETERS = [
+    {'name': 'import_id', 'defaultValue': '0', 'regexpValidator': r'^\d+$'},
+]
+
+
+def get_table_name() -> str:
+    return getattr(settings, 'GEOIMPORTER_SHARED_TABLE', 'geograph_features')
+
+
+def get_layer_name() -> str:
+    return getattr(settings, 'GEOIMPORTER_SHARED_LAYER', None) or get_table_name()
+
+
+def get_view_sql() -> str:
+    """SQL of the shared GeoServer layer, attributes exposed as JSON text"""
+    table = connections['datastore'].ops.quote_name(get_table_name())
+    return f"SELECT gid, geom, attributes::text AS attributes FROM {table} WHERE import_id = %import_id%"
+
+
+def partition_name(import_id: int) -> str:
+    return f"{get_table_name()}_{import_id}"
+
+
+def ensure_shared_table(cursor):
+    """Create the shared table partitioned by import_id, with its partitioned indexes"""
+    quote = connections['datastore'].ops.quote_name
+    table_name = get_table_name()
+    table = quote(table_name)
+
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {table} ("
+        f"import_id integer NOT NULL, "
+        f"gid integer NOT NULL, "
+        f"geom geometry CONSTRAINT enforce_srid_geom CHECK (ST_SRID(geom) = {SHARED_SRID}), "
+        f"attributes jsonb NOT NULL DEFAULT '{{}}', "
+        f"PRIMARY KEY (import_id, gid)"
+        f") PARTITION BY LIST (import_id)"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {quote(f'{table_name}_geom_geom_idx')} ON {table} USING GIST (geom)")
+
+
+def _build_partition(cursor, import_id: int, source_table: str, partition: str):
+    """Copy a loaded table into a detached partition table, already indexed
+
+    The CHECK constraint matching the partition bound lets ATTACH PARTITION
+    skip its validation scan, and indexes equivalent to the parent's are
+    attached instead of being rebuilt.
+    """
+    quote = connections['datastore'].ops.quote_name
+    table = quote(get_table_name())
+
+    cursor.execute(f"CREATE TABLE {quote(partition)} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(
+        f"ALTER TABLE {quote(partition)} ADD CONSTRAINT {quote(f'{partition}_bound')} CHECK (import_id = {int(import_id)})"
+    )
+    cursor.execute(
+        f"INSERT INTO {quote(partition)} (import_id, gid, geom, attributes) "
+        f"SELECT %s, t.gid, t.geom, to_jsonb(t) - 'gid' - 'geom' FROM {quote(source_table)} t",
+        [import_id]
+    )
+    cursor.execute(f"ALTER TABLE {quote(partition)} ADD CONSTRAINT {quote(f'{partition}_pkey')} PRIMARY KEY (import_id, gid)")
+    cursor.execute(f"CREATE INDEX {quote(f'{partition}_geom_geom_idx')} ON {quote(partition)} USING GIST (geom)")
+    cursor.execute(f"ANALYZE {quote(partition)}")
+
+
+def _attach(cursor, import_id: int, partition: str, built_as: str = None):
+    """Attach a built partition table and drop its now redundant bound constraint"""
+    quote = connections['datastore'].ops.quote_name
+    cursor.execute(
+        f"ALTER TABLE {quote(get_table_name())} ATTACH PARTITION {quote(partition)} FOR VALUES IN ({int(import_id)})"
+    )
+    cursor.execute(f"ALTER TABLE {quote(partition)} DROP CONSTRAINT {quote(f'{built_as or partition}_bound')}")
+
+
+def attach_import(import_record):
+    """Move a freshly loaded per-import table into its partition of the shared table
+
+    Attributes are stored in the attributes JSONB column, so imports with any
+    schema share one table and one GeoServer layer. import_record.table_name
+    is switched to the partition, which can still be queried on its own.
+    """
+    connection = connections['datastore']
+    source_table = import_record.table_name
+    partition = partition_name(import_record.id)
+
+    try:
+        with transaction.atomic(using='datastore'):
+            with connection.cursor() as cursor:
+                ensure_shared_table(cursor)
+                _build_partition(cursor, import_record.id, source_table, partition)
+                _attach(cursor, import_record.id, partition)
+                cursor.execute(f"DROP TABLE {connection.ops.quote_name(source_table)}")
+    except Exception:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(source_table)}")
+        raise
+
+    import_record.table_name = partition
+
+
+def swap_partition(import_record, staging_table: str):
+    """Replace the partition of an import with a fully loaded staging table"""
+    connection = connections['datastore']
+    quote = connection.ops.quote_name
+    partition = import_record.table_name
+    new_partition = f"{partition}_new"
+    old_partition = f"{partition}_old"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {quote(new_partition)}")
+        _build_partition(cursor, import_record.id, staging_table, new_partition)
+        cursor.execute(f"DROP TABLE {quote(staging_table)}")
+
+    with transaction.atomic(using='datastore'):
+        with connection.cursor() as cursor:
+            # Queries on the shared table wait for the detach, don't wait forever for long readers
+            cursor.execute("SET LOCAL lock_timeout = %s", [getattr(settings, 'GEOIMPORTER_SWAP_LOCK_TIMEOUT', '10s')])
+            cursor.execute(f"ALTER TABLE {quote(get_table_name())} DETACH PARTITION {quote(partition)}")
+            cursor.execute(f"ALTER TABLE {quote(partition)} RENAME TO {quote(old_partition)}")
+            cursor.execute(f"ALTER TABLE {quote(new_partition)} RENAME TO {quote(partition)}")
+            _attach(cursor, import_record.id, partition, built_as=new_partition)
+            cursor.execute(f"DROP TABLE {quote(old_partition)}")
+
+            # Give the swapped-in indexes the names of the live partition
+            for suffix in ('pkey', 'geom_geom_idx'):
+                cursor.execute(
+                    f"ALTER INDEX IF EXISTS {quote(f'{new_partition}_{suffix}')} "
+                    f"RENAME TO {quote(f'{partition}_{suffix}')}"
+                )
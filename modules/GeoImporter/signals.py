@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import ShapefileImport
+from . import status_events
+
+
+@receiver(post_delete, sender=ShapefileImport)
+def drop_import_data(sender, instance, **kwargs):
+    """Drop the table and GeoServer layer of a deleted import once the delete is committed"""
+    from .reaper import cleanup_import
+    
+    table_name = instance.table_name
+    geoserver_layer = instance.geoserver_layer if instance.published_to_geoserver else None
+    storage_mode = instance.storage_mode
+    transaction.on_commit(lambda: cleanup_import(table_name, geoserver_layer, storage_mode))
+    if instance.thumbnail:
+        thumbnail_storage, thumbnail_name = instance.thumbnail.storage, instance.thumbnail.name
+        transaction.on_commit(lambda: thumbnail_storage.delete(thumbnail_name))
+    # Wakes status waiters, who then report the import as deleted
+    status_events.notify(instance.id, instance.status_version)
@@ -0,0 +1,261 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from .catalog import get_catalog
+
+
+class SpatialQueryError(ValueError):
+    """Raised for invalid spatial query parameters"""
+
+
+def is_geographic(srid: int) -> bool:
+    """Whether an SRID uses longitude/latitude degrees, cached forever"""
+    key = f"geoimporter:srid_geographic:{srid}"
+    geographic = cache.get(key)
+    if geographic is None:
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute("SELECT proj4text LIKE '%%+proj=longlat%%' FROM spatial_ref_sys WHERE srid = %s", [srid])
+            row = cursor.fetchone()
+        geographic = bool(row and row[0])
+        cache.set(key, geographic, None)
+    return geographic
+
+
+# Metres per unit of the PROJ +units values of projected SRSs
+PROJ_UNITS = {
+    'mm': 0.001, 'cm': 0.01, 'm': 1.0, 'km': 1000.0,
+    'in': 0.0254, 'ft': 0.3048, 'yd': 0.9144, 'mi': 1609.344,
+    'us-in': 1 / 39.37, 'us-ft': 1200 / 3937, 'us-yd': 3600 / 3937, 'us-mi': 6336000 / 3937,
+    'fath': 1.8288, 'ch': 20.1168, 'link': 0.201168,
+}
+
+
+def parse_metres_per_unit(proj4text: str) -> Optional[float]:
+    """Metres per linear unit of a PROJ definition, None when it has none"""
+    params = dict(part[1:].partition('=')[::2] for part in proj4text.split() if part.startswith('+'))
+    if params.get('to_meter'):
+        try:
+            return float(params['to_meter'])
+        except ValueError:
+            return None
+    return PROJ_UNITS.get(params.get('units'))
+
+
+def metres_per_unit(srid: int) -> Optional[float]:
+    """Metres per linear unit of a projected SRID, None when unknown; cached forever"""
+    key = f"geoimporter:srid_metres_per_unit:{srid}"
+    metres = cache.get(key)
+    if metres is None:
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute("SELECT proj4text FROM spatial_ref_sys WHERE srid = %s", [srid])
+            row = cursor.fetchone()
+        metres = (parse_metres_per_unit(row[0]) if row and row[0] else None) or 0.0
+        cache.set(key, metres, None)
+    return metres or None
+
+
+def _page_size(query) -> int:
+    """Requested number of features, capped at GEOIMPORTER_QUERY_MAX_LIMIT"""
+    return max(min(query.limit, getattr(settings, 'GEOIMPORTER_QUERY_MAX_LIMIT', 1000)), 1)
+
+
+def _geometry_sql(geometry: Dict[str, Any], srid: int, layer_srid: int) -> Tuple[str, List[Any]]:
+    """SQL for a GeoJSON geometry in the request SRID, transformed to the layer SRID"""
+    return "ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(%s), %s), %s)", [json.dumps(geometry), srid, layer_srid]
+
+
+def _json_text(value: Any) -> str:
+    """A filter value as ->> renders the JSON value it should match"""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def properties_sql(import_record, include_gid: bool = True) -> str:
+    """JSONB attributes of a feature; partitioned imports keep theirs in the attributes column"""
+    if import_record.storage_mode == 'partitioned':
+        return "jsonb_build_object('gid', t.gid) || t.attributes" if include_gid else "t.attributes"
+    return "to_jsonb(t) - 'geom'" if include_gid else "to_jsonb(t) - 'geom' - 'gid'"
+
+
+def build_where(import_record, query, columns: List[str]) -> Tuple[List[str], List[Any]]:
+    """WHERE conditions for bbox and attribute filters, shared by query and export paths"""
+    layer_srid = import_record.srid or 4326
+    conditions, params = [], []
+    quote = connections['datastore'].ops.quote_name
+
+    if query.bbox:
+        if len(query.bbox) != 4:
+            raise SpatialQueryError("bbox must be [minx, miny, maxx, maxy]")
+        # && is answered by the GiST index
+        conditions.append("t.geom && ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, %s), %s)")
+        params += list(query.bbox) + [query.srid, layer_srid]
+
+    for column, value in (query.filters or {}).items():
+        if import_record.storage_mode == 'partitioned':
+            # Attribute names are keys of the JSONB attributes column, compared as text
+            if value is None:
+                conditions.append("t.attributes->>%s IS NULL")
+                params.append(column)
+            elif isinstance(value, list):
+                conditions.append("t.attributes->>%s = ANY(%s)")
+                params += [column, [_json_text(item) for item in value]]
+            else:
+                conditions.append("t.attributes->>%s = %s")
+                params += [column, _json_text(value)]
+            continue
+        if column not in columns or column == 'geom':
+            raise SpatialQueryError(f"Unknown attribute: {column}")
+        if value is None:
+            conditions.append(f"t.{quote(column)} IS NULL")
+        elif isinstance(value, list):
+            conditions.append(f"t.{quote(column)} = ANY(%s)")
+            params.append(value)
+        else:
+            conditions.append(f"t.{quote(column)} = %s")
+            params.append(value)
+
+    return conditions, params
+
+
+def build_query(import_record, query) -> Tuple[str, List[Any]]:
+    """Build the parameterized SQL of a spatial query over an imported table"""
+    catalog = get_catalog([import_record]).get(import_record.id)
+    if not catalog:
+        raise SpatialQueryError("Table not found in datastore")
+    columns = [column[0] for column in catalog['columns']]
+
+    layer_srid = import_record.srid or 4326
+    geographic = is_geographic(layer_srid)
+    quote = connections['datastore'].ops.quote_name
+    limit = _page_size(query)
+
+    conditions, where_params = build_where(import_record, query, columns)
+
+    if query.intersects:
+        geom_sql, geom_params = _geometry_sql(query.intersects, query.srid, layer_srid)
+        conditions.append(f"ST_Intersects(t.geom, {geom_sql})")
+        where_params += geom_params
+
+    distance_sql, distance_params = None, []
+    near_sql, near_params = None, []
+    if query.near:
+        near_sql, near_params = _geometry_sql(query.near, query.srid, layer_srid)
+        if geographic:
+            distance_sql = f"ST_Distance(t.geom::geography, ({near_sql})::geography)"
+        else:
+            distance_sql = f"ST_Distance(t.geom, {near_sql})"
+        distance_params = near_params
+
+        if query.distance is not None:
+            if geographic:
+                # Distance in meters: an index-assisted box prefilter in degrees
+                # (widened by latitude), then the exact geography test
+                conditions.append(
+                    f"t.geom && ST_Expand({near_sql}, %s / (110000 * cos(radians(LEAST(89.9, "
+                    f"GREATEST(abs(ST_YMin({near_sql})), abs(ST_YMax({near_sql}))))))))"
+                )
+                where_params += near_params + [query.distance] + near_params + near_params
+                conditions.append(f"ST_DWithin(t.geom::geography, ({near_sql})::geography, %s)")
+                where_params += near_params + [query.distance]
+            else:
+                conditions.append(f"ST_DWithin(t.geom, {near_sql}, %s)")
+                where_params += near_params + [query.distance]
+    elif query.nearest or query.distance is not None:
+        raise SpatialQueryError("nearest and distance require a near geometry")
+
+    select = [
+        "t.gid",
+        "ST_AsGeoJSON(ST_Transform(t.geom, %s))::json AS geometry",
+        f"{properties_sql(import_record)} AS properties",
+    ]
+    select_params = [query.srid]
+    if distance_sql:
+        select.append(f"{distance_sql} AS distance")
+        select_params += distance_params
+
+    order_params = []
+    if query.nearest and query.near:
+        # k-nearest neighbours, ordered by the GiST index through <->
+        order_by = f"t.geom <-> {near_sql}"
+        order_params = near_params
+        limit = min(limit, query.nearest)
+    else:
+        # Keyset paging on the primary key
+        if query.after is not None:
+            conditions.append("t.gid > %s")
+            where_params.append(query.after)
+        order_by = "t.gid"
+        limit += 1  # one extra row tells whether there is a next page
+
+    sql = (
+        f"SELECT {', '.join(select)} "
+        f"FROM {quote(import_record.table_name)} t "
+        f"WHERE {' AND '.join(conditions) or 'TRUE'} "
+        f"ORDER BY {order_by} LIMIT %s"
+    )
+    return sql, select_params + where_params + order_params + [limit]
+
+
+def _plan_uses_index(plan: Dict[str, Any], index_names: List[str]) -> bool:
+    """Whether a JSON plan node or any of its children scans one of the given indexes"""
+    if plan.get('Index Name') in index_names:
+        return True
+    return any(_plan_uses_index(child, index_names) for child in plan.get('Plans', []))
+
+
+def explain_query(import_record, sql: str, params: List[Any]) -> Dict[str, Any]:
+    """EXPLAIN a query and check that it is answered through the geometry GiST index"""
+    with connections['datastore'].cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s "
+            "AND indexdef ILIKE '%%USING gist%%'",
+            [import_record.table_name]
+        )
+        spatial_indexes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]['Plan']
+    return {
+        'uses_spatial_index': _plan_uses_index(plan, spatial_indexes),
+        'plan': plan
+    }
+
+
+def run_query(import_record, query) -> Dict[str, Any]:
+    """Run a spatial query and return the matching features as a GeoJSON FeatureCollection"""
+    sql, params = build_query(import_record, query)
+
+    if query.explain:
+        return explain_query(import_record, sql, params)
+
+    with connections['datastore'].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    next_after: Optional[int] = None
+    if not query.nearest and len(rows) > _page_size(query):
+        rows = rows[:-1]
+        next_after = rows[-1][0]
+
+    features = []
+    for row in rows:
+        feature = {
+            'type': 'Feature',
+            'id': row[0],
+            'geometry': row[1],
+            'properties': row[2],
+        }
+        if len(row) > 3:
+            feature['properties']['distance'] = row[3]
+        features.append(feature)
+
+    return {
+        'type': 'FeatureCollection',
+        'features': features,
+        'next_after': next_after
+    }
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import psycopg
+from django.conf import settings
+from django.db import connections
+
+# NOTIFY channel carrying '<import id>:<status_version>' on every status change
+CHANNEL = 'geoimporter_status'
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def notify(import_id: int, status_version: int):
+    """Announce a status change; delivered to listeners when the current transaction commits"""
+    with connections['default'].cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, f"{import_id}:{status_version}"])
+
+
+class StatusListener:
+    """One LISTEN connection per process, waking the coroutines waiting on an import
+
+    Waiters register an asyncio future per import id; the listener thread
+    resolves them on the waiter's own event loop. When the connection drops,
+    every waiter is woken so it re-reads the versions it may have missed.
+    """
+
+    def __init__(self):
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _connect(self):
+        database = settings.DATABASES['default']
+        connection = psycopg.connect(
+            dbname=database['NAME'],
+            user=database.get('USER') or None,
+            password=database.get('PASSWORD') or None,
+            host=database.get('HOST') or None,
+            port=database.get('PORT') or None,
+            autocommit=True
+        )
+        connection.execute(f"LISTEN {CHANNEL}")
+        return connection
+
+    def _run(self):
+        retry_seconds = getattr(settings, 'GEOIMPORTER_STATUS_LISTEN_RETRY_SECONDS', 5)
+        while True:
+            try:
+                with self._connect() as connection:
+                    for event in connection.notifies():
+                        import_id, _, _ = event.payload.partition(':')
+                        if import_id.isdigit():
+                            self._wake([int(import_id)])
+            except Exception as e:
+                print(f"Exception in status listener: {str(e)}")
+            self._wake(None)
+            time.sleep(retry_seconds)
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='geoimporter-status-listener', daemon=True)
+                self._thread.start()
+
+    def _wake(self, import_ids: Optional[Iterable[int]]):
+        """Resolve the futures waiting on import_ids, or on every import when None"""
+        with self._lock:
+            if import_ids is None:
+                waiters = [waiter for futures in self._waiters.values() for waiter in futures]
+            else:
+                waiters = [waiter for import_id in import_ids for waiter in self._waiters.get(import_id, ())]
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def register(self, import_ids: Iterable[int]) -> Tuple[asyncio.AbstractEventLoop, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            for import_id in import_ids:
+                self._waiters.setdefault(import_id, set()).add(waiter)
+        return waiter
+
+    def unregister(self, import_ids: Iterable[int], waiter):
+        with self._lock:
+            for import_id in import_ids:
+                futures = self._waiters.get(import_id)
+                if futures is not None:
+                    futures.discard(waiter)
+                    if not futures:
+                        del self._waiters[import_id]
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def get_listener() -> StatusListener:
+    """The process-wide listener, started on first use"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = StatusListener()
+    _listener.ensure_running()
+    return _listener
+
+
+async def _changed(versions: Dict[int, int]) -> Tuple[List[dict], List[int]]:
+    """Imports whose status_version differs from the client's, and ids that no longer exist"""
+    from .models import ShapefileImport
+
+    records = {
+        record.id: record
+        async for record in ShapefileImport.objects.filter(id__in=list(versions))
+    }
+    changed = [
+        record for import_id, record in records.items()
+        if record.status_version != versions[import_id]
+    ]
+    deleted = [import_id for import_id in versions if import_id not in records]
+    return changed, deleted
+
+
+async def wait_for_changes(versions: Dict[int, int], timeout: float) -> Tuple[list, List[int]]:
+    """Block until one of the imports changes status or timeout seconds pass
+
+    versions maps import ids to the status_version the client last saw. The
+    waiter is registered before the versions are read, so a change committed
+    in between is not lost. Returns the changed imports and the deleted ids,
+    both empty on timeout.
+    """
+    listener = get_listener()
+    import_ids = list(versions)
+    deadline = time.monotonic() + timeout
+
+    while True:
+        waiter = listener.register(import_ids)
+        try:
+            changed, deleted = await _changed(versions)
+            remaining = deadline - time.monotonic()
+            if changed or deleted or remaining <= 0:
+                return changed, deleted
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                return [], []
+        finally:
+            listener.unregister(import_ids, waiter)
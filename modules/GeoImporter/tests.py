@@ -1,3 +1,602 @@
-from django.test import TestCase
+import datetime
+import functools
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from unittest import mock
+import pyarrow as pa
+from asgiref.sync import async_to_sync, sync_to_async
+from psycopg.adapt import Transformer
+from django.db import models
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from .bulk_import import _record_layer, append_checkpoint, discover, read_checkpoint
+from .csv_loader import CsvMapping, WIDENING, _value_type, infer_types
+from .exporter import ScratchStreamingResponse, aiter_in_thread, iter_file
+from .format_loader import encode_copy_rows
+from .geoserver_service import GeoServerService
+from .overlay import UNBOUNDED, Overlay, OverlayError, _tile_condition, _tiles
+from .partitioned_loader import SHX_HEADER_SIZE, plan_fid_ranges
+from .profiling import Recorder, _install_query_recorder, _record_query
+from .scratch import ScratchQuotaExceeded, ScratchSpace, ScratchUploadMiddleware, estimate_upload_bytes, reserved_bytes
+from .spatial_query import build_where, parse_metres_per_unit
+from .type_narrowing import _target_type
 
-# Create your tests here.
+
+class OverlayTilesTests(SimpleTestCase):
+    """Tiles of the left extent and the condition assigning features to them"""
+
+    CONDITIONS = {
+        "ST_XMin(a.geom) >= %s": lambda bbox, value: bbox[0] >= value,
+        "ST_XMin(a.geom) < %s": lambda bbox, value: bbox[0] < value,
+        "ST_YMin(a.geom) >= %s": lambda bbox, value: bbox[1] >= value,
+        "ST_YMin(a.geom) < %s": lambda bbox, value: bbox[1] < value,
+    }
+
+    def _matches(self, tile, bbox):
+        """Evaluate the SQL of _tile_condition for a feature bbox"""
+        sql, params = _tile_condition(tile, 4326)
+        envelope, *conditions = sql.split(' AND ')
+        self.assertTrue(envelope.startswith('a.geom && ST_MakeEnvelope'))
+        x0, y0, x1, y1, srid = params[:5]
+        self.assertEqual(srid, 4326)
+        intersects = bbox[0] <= x1 and bbox[2] >= x0 and bbox[1] <= y1 and bbox[3] >= y0
+        return intersects and all(
+            self.CONDITIONS[condition](bbox, value) for condition, value in zip(conditions, params[5:])
+        )
+
+    def test_tile_count_and_open_outer_edges(self):
+        tiles = _tiles([0, 0, 10, 10], 9)
+        self.assertEqual(len(tiles), 9)
+        self.assertEqual(tiles[0][:2], (None, None))
+        self.assertEqual(tiles[-1][2:], (None, None))
+        self.assertIn((10 / 3, 10 / 3, 20 / 3, 20 / 3), tiles)
+
+    def test_single_tile_has_no_bounds(self):
+        self.assertEqual(_tiles([0, 0, 10, 10], 1), [(None, None, None, None)])
+        sql, params = _tile_condition((None, None, None, None), 4326)
+        self.assertEqual(sql, "a.geom && ST_MakeEnvelope(%s, %s, %s, %s, %s)")
+        self.assertEqual(params, [-UNBOUNDED, -UNBOUNDED, UNBOUNDED, UNBOUNDED, 4326])
+
+    def test_each_feature_lands_in_exactly_one_tile(self):
+        tiles = _tiles([0, 0, 10, 10], 16)
+        features = [
+            [1, 1, 2, 2],
+            [2.5, 2.5, 2.5, 2.5],    # on tile corners
+            [0, 0, 10, 10],          # spanning every tile
+            [2.4, 7.4, 8.1, 9.9],    # spanning several tiles
+            [-5, -5, -4, -4],        # outside an estimated extent
+            [9, 9, 12, 12],
+            [10, 10, 10, 10],
+        ]
+        for bbox in features:
+            with self.subTest(bbox=bbox):
+                self.assertEqual(sum(self._matches(tile, bbox) for tile in tiles), 1)
+
+
+class OverlayDistanceTests(SimpleTestCase):
+    """within_distance converts metres to the linear unit of a projected right layer"""
+
+    class Import:
+        srid = 2263
+        table_name = 'shapefile_1'
+
+    def test_linear_units(self):
+        cases = {
+            '+proj=utm +zone=33 +datum=WGS84 +units=m +no_defs': 1.0,
+            '+proj=lcc +lat_0=40.17 +datum=NAD83 +units=us-ft +no_defs': 1200 / 3937,
+            '+proj=tmerc +lat_0=49 +to_meter=0.3047972654 +no_defs': 0.3047972654,
+            '+proj=longlat +datum=WGS84 +no_defs': None,
+        }
+        for proj4text, expected in cases.items():
+            with self.subTest(proj4text=proj4text):
+                self.assertEqual(parse_metres_per_unit(proj4text), expected)
+
+    def _overlay(self, metres_per_unit):
+        with mock.patch('modules.GeoImporter.overlay.is_geographic', return_value=False), \
+                mock.patch('modules.GeoImporter.overlay.metres_per_unit', return_value=metres_per_unit), \
+                mock.patch('modules.GeoImporter.overlay._geometry_column', return_value=(0, 'geometry')), \
+                mock.patch('modules.GeoImporter.overlay._attribute_columns', return_value=[]):
+            return Overlay(None, self.Import, self.Import, 'within_distance', 100)
+
+    def test_distance_in_feet(self):
+        predicate, distance, params = self._overlay(1200 / 3937)._distance_sql()
+        self.assertEqual(predicate, "ST_DWithin(a.geom, b.geom, %s)")
+        self.assertAlmostEqual(params[0], 328.0833, places=4)
+        self.assertTrue(distance.startswith("ST_Distance(a.geom, b.geom) * 0.3048"))
+
+    def test_unknown_unit_is_rejected(self):
+        with self.assertRaises(OverlayError):
+            self._overlay(None)
+
+
+class TargetTypeTests(SimpleTestCase):
+    """Type chosen for a column from its profile (integral, min, max, exact float, other)"""
+
+    def test_text_of_small_integers_becomes_smallint(self):
+        self.assertEqual(_target_type('character varying', (True, 1, 300, True, None)), 'smallint')
+
+    def test_integer_range_picks_the_tightest_type(self):
+        self.assertEqual(_target_type('numeric', (True, -40000, 10, True, None)), 'integer')
+        self.assertEqual(_target_type('numeric', (True, 0, 2 ** 40, True, None)), 'bigint')
+
+    def test_text_of_floats_becomes_double_precision(self):
+        self.assertEqual(_target_type('text', (False, None, None, True, None)), 'double precision')
+
+    def test_text_of_booleans_or_dates(self):
+        self.assertEqual(_target_type('text', (False, None, None, False, 'boolean')), 'boolean')
+        self.assertEqual(_target_type('character varying', (False, None, None, False, 'date')), 'date')
+
+    def test_empty_or_mixed_columns_are_kept(self):
+        self.assertIsNone(_target_type('text', (None, None, None, None, None)))
+        self.assertIsNone(_target_type('text', (False, None, None, False, None)))
+
+    def test_never_widens_a_fixed_width_column(self):
+        self.assertEqual(_target_type('double precision', (True, 0, 100, True, None)), 'smallint')
+        self.assertIsNone(_target_type('real', (False, None, None, True, None)))
+        self.assertIsNone(_target_type('integer', (True, 0, 2 ** 40, True, None)))
+
+
+@override_settings(GEOSERVER_URL='http://geoserver/geoserver', GEOSERVER_WORKSPACE='ws')
+class GeoServerUrlTests(SimpleTestCase):
+    """WMS/WFS preview URLs framed on the layer extent"""
+
+    def _params(self, url):
+        return dict(part.split('=', 1) for part in url.split('?', 1)[1].split('&'))
+
+    def test_format_viewparams(self):
+        geoserver = GeoServerService()
+        self.assertEqual(geoserver._format_viewparams({'import_id': 12}), 'import_id:12')
+        self.assertEqual(geoserver._format_viewparams({'a': 1, 'b': 'x'}), 'a:1;b:x')
+
+    def test_wms_defaults_to_the_world(self):
+        params = self._params(GeoServerService().get_wms_url('layer_t'))
+        self.assertEqual(params['bbox'], '-180,-90,180,90')
+        self.assertEqual((params['width'], params['height']), ('768', '384'))
+        self.assertEqual(params['layers'], 'ws:layer_t')
+        self.assertNotIn('viewparams', params)
+
+    def test_wms_is_framed_on_the_extent(self):
+        params = self._params(GeoServerService().get_wms_url('layer_t', latlon_bbox=[0, 0, 10, 2.5]))
+        self.assertEqual(params['bbox'], '0,0,10,2.5')
+        self.assertEqual(params['height'], '192')
+
+    def test_wms_pads_point_extents_and_caps_height(self):
+        params = self._params(GeoServerService().get_wms_url('layer_t', latlon_bbox=[5, 5, 5, 5]))
+        minx, miny, maxx, maxy = (float(value) for value in params['bbox'].split(','))
+        self.assertAlmostEqual(maxx - minx, 0.002)
+        self.assertAlmostEqual(maxy - miny, 0.002)
+
+        params = self._params(GeoServerService().get_wms_url('layer_t', latlon_bbox=[0, -80, 1, 80]))
+        self.assertEqual(params['height'], '2048')
+
+    def test_viewparams_are_appended(self):
+        geoserver = GeoServerService()
+        self.assertTrue(geoserver.get_wms_url('shared', {'import_id': 3}).endswith('&viewparams=import_id:3'))
+        self.assertIn('&bbox=1,2,3,4', geoserver.get_wfs_url('shared', {'import_id': 3}, [1, 2, 3, 4]))
+
+
+class ScratchSpaceTests(SimpleTestCase):
+    """Scratch reservations against the quota shared by every process"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(GEOIMPORTER_SCRATCH_ROOT=self.root,
+                                              GEOIMPORTER_SCRATCH_QUOTA_BYTES=1000,
+                                              GEOIMPORTER_SCRATCH_FAST_ROOT=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_reservation_is_held_until_exit(self):
+        with ScratchSpace(600) as scratch:
+            self.assertTrue(os.path.isdir(scratch.path))
+            self.assertEqual(reserved_bytes(), 600)
+            self.assertFalse([name for name in os.listdir(os.path.join(self.root, '.reservations'))
+                              if name.endswith('.tmp')])
+        self.assertFalse(os.path.exists(scratch.path))
+        self.assertEqual(reserved_bytes(), 0)
+
+    def test_busy_quota_is_retryable(self):
+        with ScratchSpace(600):
+            with self.assertRaises(ScratchQuotaExceeded) as raised:
+                ScratchSpace(500).__enter__()
+            self.assertTrue(raised.exception.fits)
+            self.assertEqual(raised.exception.available, 400)
+            # The failed attempt leaves no reservation behind
+            self.assertEqual(reserved_bytes(), 600)
+
+    def test_request_larger_than_quota_never_fits(self):
+        with self.assertRaises(ScratchQuotaExceeded) as raised:
+            ScratchSpace(1001).__enter__()
+        self.assertFalse(raised.exception.fits)
+
+    def test_reservation_grows_with_writes(self):
+        with ScratchSpace(100) as scratch:
+            scratch.reserve(300)
+            self.assertEqual(reserved_bytes(), 400)
+            with self.assertRaises(ScratchQuotaExceeded):
+                scratch.reserve(700)
+            self.assertEqual(scratch.reserved, 400)
+
+    def test_reservations_of_dead_processes_are_cleaned_up(self):
+        reservations = os.path.join(self.root, '.reservations')
+        os.makedirs(reservations)
+        leftover = tempfile.mkdtemp(dir=self.root)
+        with open(os.path.join(reservations, 'dead'), 'w') as f:
+            json.dump({'pid': 2 ** 22 + 1, 'bytes': 900, 'path': leftover}, f)
+
+        self.assertEqual(reserved_bytes(), 0)
+        self.assertFalse(os.path.exists(leftover))
+        self.assertEqual(os.listdir(reservations), [])
+
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100)
+class ScratchUploadMiddlewareTests(SimpleTestCase):
+    """Upload bodies are reserved from their Content-Length before Django reads them"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(GEOIMPORTER_SCRATCH_ROOT=self.root,
+                                              GEOIMPORTER_SCRATCH_QUOTA_BYTES=1000,
+                                              GEOIMPORTER_SCRATCH_FAST_ROOT=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.root, '.reservations'))
+        self.seen = []
+
+    def _view(self, request):
+        self.seen.append(reserved_bytes())
+        return HttpResponse()
+
+    def _post(self, length):
+        request = RequestFactory().post('/api/geoimporter/upload/', data={'name': 'x'})
+        request.META['CONTENT_LENGTH'] = str(length)
+        return ScratchUploadMiddleware(self._view)(request)
+
+    def test_body_is_reserved_until_the_response_is_closed(self):
+        response = self._post(600)
+        self.assertEqual(self.seen, [600])
+        self.assertEqual(reserved_bytes(), 600)
+        response.close()
+        self.assertEqual(reserved_bytes(), 0)
+
+    def test_small_bodies_are_not_reserved(self):
+        self._post(100).close()
+        self.assertEqual(self.seen, [0])
+
+    def test_busy_and_oversized_bodies_are_turned_away_unread(self):
+        with ScratchSpace(600):
+            response = self._post(500)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self._post(1001).status_code, 413)
+        self.assertEqual(self.seen, [])
+
+    def test_spooled_uploads_are_not_reserved_twice(self):
+        class Upload:
+            name = 'roads.zip'
+            size = 100
+
+        class SpooledUpload(Upload):
+            def temporary_file_path(self):
+                return '/tmp/roads.zip'
+
+        self.assertEqual(estimate_upload_bytes([Upload()]), 400)
+        self.assertEqual(estimate_upload_bytes([SpooledUpload()]), 300)
+
+
+class ScratchStreamingResponseTests(SimpleTestCase):
+    """Export files are removed with their reservation when the response is closed"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(GEOIMPORTER_SCRATCH_ROOT=self.root,
+                                              GEOIMPORTER_SCRATCH_QUOTA_BYTES=1000,
+                                              GEOIMPORTER_SCRATCH_FAST_ROOT=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _response(self):
+        scratch = ScratchSpace(100, prefix='export').__enter__()
+        path = os.path.join(scratch.path, 'layer.fgb')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        return scratch, ScratchStreamingResponse(iter_file(path, chunk_size=64), scratch)
+
+    def test_closing_an_unread_response_releases_the_scratch_space(self):
+        scratch, response = self._response()
+        response.close()
+        self.assertFalse(os.path.exists(scratch.path))
+        self.assertEqual(reserved_bytes(), 0)
+
+    def test_streamed_file_then_released(self):
+        scratch, response = self._response()
+        self.assertEqual(b''.join(response.streaming_content), b'x' * 100)
+        self.assertEqual(reserved_bytes(), 100)
+        response.close()
+        self.assertFalse(os.path.exists(scratch.path))
+        self.assertEqual(reserved_bytes(), 0)
+
+
+class BulkImportCheckpointTests(SimpleTestCase):
+    """Discovery of files and the resumable checkpoint of bulk_import"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.jsonl')
+
+    def test_missing_checkpoint_is_empty(self):
+        self.assertEqual(read_checkpoint(self.checkpoint), {})
+
+    def test_last_result_per_file_with_layer_progress(self):
+        _record_layer(self.checkpoint, '/data/a.gpkg', 'roads', 1, 'processing')
+        _record_layer(self.checkpoint, '/data/a.gpkg', 'roads', 1, 'success')
+        _record_layer(self.checkpoint, '/data/a.gpkg', 'rivers', 2, 'processing')
+        with open(self.checkpoint, 'a') as f:
+            append_checkpoint(f, {'path': '/data/b.zip', 'status': 'error', 'import_ids': [3]})
+            append_checkpoint(f, {'path': '/data/b.zip', 'status': 'success', 'import_ids': [4]})
+            # Cut short by an interrupted run
+            f.write('{"path": "/data/c.zip", "sta')
+
+        results = read_checkpoint(self.checkpoint)
+        self.assertEqual(set(results), {'/data/a.gpkg', '/data/b.zip'})
+        self.assertNotIn('status', results['/data/a.gpkg'])
+        self.assertEqual(
+            {key: entry['status'] for key, entry in results['/data/a.gpkg']['layers'].items()},
+            {'roads': 'success', 'rivers': 'processing'}
+        )
+        self.assertEqual(results['/data/b.zip']['status'], 'success')
+        self.assertEqual(results['/data/b.zip']['import_ids'], [4])
+
+    def test_discover_walks_directories(self):
+        os.makedirs(os.path.join(self.directory, 'nested'))
+        for name in ('a.zip', 'nested/b.FGB', 'nested/c.gpkg', 'notes.txt', 'd.shx'):
+            open(os.path.join(self.directory, name), 'w').close()
+
+        found = discover([self.directory, os.path.join(self.directory, 'a.zip')])
+        self.assertEqual(
+            [os.path.relpath(path, self.directory) for path in found],
+            ['a.zip', 'nested/b.FGB', 'nested/c.gpkg']
+        )
+
+
+class CsvTypeInferenceTests(SimpleTestCase):
+    """Column types inferred from sampled CSV values"""
+
+    def test_value_type(self):
+        cases = {
+            '42': 'bigint',
+            str(2 ** 64): 'numeric',
+            '-1.5': 'double precision',
+            '1e3': 'double precision',
+            'yes': 'boolean',
+            '2024-02-29': 'date',
+            '2023-02-29': 'text',
+            '2024-01-01T10:00:00': 'timestamp',
+            '2024-01-01T10:00:00+02:00': 'timestamptz',
+            'Main Street': 'text',
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(_value_type(value), expected)
+
+    def test_widening(self):
+        self.assertEqual(WIDENING[frozenset(['bigint', 'double precision'])], 'double precision')
+        self.assertEqual(WIDENING[frozenset(['date', 'timestamp'])], 'timestamp')
+        self.assertNotIn(frozenset(['bigint', 'text']), WIDENING)
+
+    def test_infer_types(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'points.csv')
+        with open(path, 'w') as f:
+            f.write('id,value,when,label,x,y\n')
+            f.write('1,2,2024-01-01,a,1.5,2\n')
+            f.write('2,2.5,2024-01-01T00:00:00,,1,2\n')
+            f.write('3,,2024-01-02,7,1,2\n')
+
+        header = ['id', 'value', 'when', 'label', 'x', 'y']
+        self.assertEqual(
+            infer_types(path, CsvMapping(x_column='x', y_column='y'), header),
+            ['bigint', 'double precision', 'timestamp', 'text', 'double precision', 'bigint']
+        )
+
+
+class PlanFidRangesTests(SimpleTestCase):
+    """FID ranges of a parallel shapefile load, balanced on record offsets in the .shx"""
+
+    def _write_shx(self, sizes):
+        """Write a .shx indexing records of the given byte sizes, return the .shp path"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        offset = 100
+        with open(os.path.join(directory, 'layer.shx'), 'wb') as f:
+            f.write(b'\0' * SHX_HEADER_SIZE)
+            for size in sizes:
+                # Offsets and lengths are counted in 16-bit words
+                f.write(struct.pack('>ii', offset // 2, size // 2))
+                offset += size
+        return os.path.join(directory, 'layer.shp')
+
+    def test_no_index_no_ranges(self):
+        self.assertEqual(plan_fid_ranges('/nonexistent/layer.shp', 4), [])
+
+    def test_ranges_cover_every_feature_once(self):
+        ranges = plan_fid_ranges(self._write_shx([16] * 100), 4)
+        self.assertEqual(ranges, [(0, 25), (25, 50), (50, 75), (75, 100)])
+
+    def test_ranges_are_balanced_by_bytes(self):
+        # One geometry larger than the 1000 small ones together gets a range of its own
+        ranges = plan_fid_ranges(self._write_shx([40000] + [16] * 1000), 2)
+        self.assertEqual(ranges, [(0, 1), (1, 1001)])
+
+    def test_more_partitions_than_features(self):
+        self.assertEqual(plan_fid_ranges(self._write_shx([16] * 3), 8), [(0, 1), (1, 2), (2, 3)])
+
+
+class PartitionedFilterTests(SimpleTestCase):
+    """Attribute filters of partitioned imports read the JSONB attributes column"""
+
+    class Query:
+        bbox = None
+        srid = 4326
+        filters = {'name': 'Main', 'lanes': [1, 2], 'closed': None, 'paved': True}
+
+    def test_filters_use_attribute_keys(self):
+        from .models import ShapefileImport
+
+        import_record = ShapefileImport(id=1, table_name='geograph_features_1', storage_mode='partitioned')
+        conditions, params = build_where(import_record, self.Query, ['import_id', 'gid', 'geom', 'attributes'])
+        self.assertEqual(conditions, [
+            "t.attributes->>%s = %s",
+            "t.attributes->>%s = ANY(%s)",
+            "t.attributes->>%s IS NULL",
+            "t.attributes->>%s = %s",
+        ])
+        self.assertEqual(params, ['name', 'Main', 'lanes', ['1', '2'], 'closed', 'paved', 'true'])
+
+
+class StatusVersionTests(SimpleTestCase):
+    """status_version is bumped and announced only when the status changes"""
+
+    def _loaded(self, **values):
+        from .models import ShapefileImport
+
+        names = [field.attname for field in ShapefileImport._meta.concrete_fields]
+        defaults = {'id': 1, 'name': 'roads', 'table_name': 'shapefile_1', 'status': 'success', 'status_version': 3}
+        defaults.update(values)
+        return ShapefileImport.from_db('default', names, [defaults.get(name, models.DEFERRED) for name in names])
+
+    def _save(self, import_record, **kwargs):
+        with mock.patch.object(models.Model, 'save'), \
+                mock.patch('modules.GeoImporter.models.status_events.notify') as notify:
+            import_record.save(**kwargs)
+        return notify
+
+    def test_unchanged_status_is_not_announced(self):
+        import_record = self._loaded()
+        import_record.name = 'streets'
+        self.assertFalse(self._save(import_record).called)
+        self.assertEqual(import_record.status_version, 3)
+
+    def test_status_change_is_announced(self):
+        import_record = self._loaded()
+        import_record.status = 'error'
+        self._save(import_record).assert_called_once_with(1, 4)
+        self.assertFalse(self._save(import_record).called)
+
+    def test_deferred_status_is_not_a_change(self):
+        import_record = self._loaded(status=models.DEFERRED, status_version=models.DEFERRED)
+        import_record.name = 'streets'
+        self.assertFalse(self._save(import_record, update_fields=['name']).called)
+        self.assertNotIn('status', import_record.__dict__)
+
+
+class RequestProfilingTests(SimpleTestCase):
+    """SQL is recorded in whichever thread runs it for the profiled request"""
+
+    class Connection:
+        def __init__(self, alias):
+            self.alias = alias
+            self.execute_wrappers = []
+
+        def execute(self, sql):
+            """Run sql through the execute wrappers like a cursor does, returning the thread it ran in"""
+            execute = lambda sql, params, many, context: threading.get_ident()  # noqa: E731
+            for wrapper in reversed(self.execute_wrappers):
+                execute = functools.partial(wrapper, execute)
+            return execute(sql, None, False, {'connection': self})
+
+    def _connection(self, alias='datastore'):
+        connection = self.Connection(alias)
+        _install_query_recorder(None, connection)
+        _install_query_recorder(None, connection)
+        return connection
+
+    def test_recorder_is_installed_once_on_profiled_databases(self):
+        self.assertEqual(self._connection().execute_wrappers, [_record_query])
+        self.assertEqual(self._connection('other').execute_wrappers, [])
+
+    def test_queries_outside_a_profiled_request_are_not_recorded(self):
+        self._connection().execute("SELECT 1")
+        recorder = Recorder('header')
+        self.assertEqual(recorder.sql_count, 0)
+
+    def test_sync_view_run_in_a_worker_thread(self):
+        connection = self._connection()
+        recorder = Recorder('header')
+
+        async def asgi_request():
+            with recorder.capture():
+                return await sync_to_async(connection.execute, thread_sensitive=False)("SELECT 1")
+
+        thread = async_to_sync(asgi_request)()
+        self.assertNotEqual(thread, threading.get_ident())
+        self.assertEqual(recorder.sql_count, 1)
+        self.assertEqual(recorder.queries[0]['database'], 'datastore')
+
+    def test_body_streamed_from_a_worker_thread(self):
+        connection = self._connection()
+        recorder = Recorder('header')
+
+        def rows():
+            for sql in ("SELECT 1", "SELECT 2"):
+                yield str(connection.execute(sql)).encode()
+
+        async def asgi_stream():
+            with recorder.capture():
+                return [chunk async for chunk in aiter_in_thread(rows())]
+
+        self.assertEqual(len(async_to_sync(asgi_stream)()), 2)
+        self.assertEqual([query['sql'] for query in recorder.queries], ["SELECT 1", "SELECT 2"])
+
+
+class CopyEncodingTests(SimpleTestCase):
+    """Arrow batches encoded column by column into binary COPY rows"""
+
+    def _field(self, value: bytes) -> bytes:
+        return struct.pack('>i', len(value)) + value
+
+    def test_rows_of_a_sliced_batch_with_nulls(self):
+        batch = pa.record_batch({
+            'skipped': pa.array([0, 1, 2], pa.int8()),
+            'lanes': pa.array([9, 1, None], pa.int32()),
+            'name': pa.array(['x', 'Rue de l\u2019\xc9glise', 'ab']),
+            'opened': pa.array([None, datetime.date(2000, 1, 2), None]),
+            'at': pa.array([0, 946684800000001, 946684800000000], pa.timestamp('us', tz='UTC')),
+            'duration': pa.array([None, datetime.time(0, 0, 1), None]),
+            'geom': pa.array([b'', b'\x01\x00', b''], pa.binary()),
+        }).slice(1)
+        copy_fields = [(1, 'int4'), (2, 'text'), (3, 'date'), (4, 'timestamptz'), (5, 'time'), (6, 'bytea')]
+
+        null = b'\xff\xff\xff\xff'
+        expected = (
+            b'\x00\x06' + self._field(struct.pack('>i', 1)) + self._field('Rue de l\u2019\xc9glise'.encode())
+            + self._field(struct.pack('>i', 1)) + self._field(struct.pack('>q', 1))
+            + self._field(struct.pack('>q', 1000000)) + self._field(b'\x01\x00')
+            + b'\x00\x06' + null + self._field(b'ab') + null + self._field(struct.pack('>q', 0)) + null
+            + self._field(b'')
+        )
+        self.assertEqual(bytes(encode_copy_rows(batch, copy_fields, Transformer())), expected)
+
+    def test_booleans_floats_and_dictionaries(self):
+        batch = pa.record_batch({
+            'closed': pa.array([True, None]),
+            'width': pa.array([-2.5, 1.0], pa.float32()),
+            'kind': pa.array(['road', 'road']).dictionary_encode(),
+        })
+        expected = (
+            b'\x00\x03' + self._field(b'\x01') + self._field(struct.pack('>f', -2.5)) + self._field(b'road')
+            + b'\x00\x03' + b'\xff\xff\xff\xff' + self._field(struct.pack('>f', 1.0)) + self._field(b'road')
+        )
+        self.assertEqual(
+            bytes(encode_copy_rows(batch, [(0, 'boolean'), (1, 'float4'), (2, 'text')], Transformer())),
+            expected
+        )
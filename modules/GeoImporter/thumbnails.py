@@ -0,0 +1,118 @@
+from typing import Optional
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from .catalog import get_catalog
+
+# Margin around the layer extent, in pixels
+MARGIN = 4
+
+SVG_TEMPLATE = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="{viewbox}">'
+    '<rect x="{minx}" y="{miny}" width="{width}" height="{height}" fill="#f4f4f0"/>'
+    '{paths}</svg>'
+)
+# Styles of the polygon, line and point paths
+POLYGON_PATH = '<path fill="#9ab8d6" fill-opacity="0.7" fill-rule="evenodd" stroke="#2f5d8a" stroke-width="0.5" d="{d}"/>'
+LINE_PATH = '<path fill="none" stroke="#2f5d8a" stroke-width="1" stroke-linejoin="round" d="{d}"/>'
+# Zero-length subpaths with round caps draw as dots
+POINT_PATH = '<path fill="none" stroke="#c0392b" stroke-width="3" stroke-linecap="round" d="{d}"/>'
+
+
+def _point_paths(cursor, table: str, origin, pixel: float, max_features: int) -> Optional[str]:
+    """One dot per distinct pixel holding a point"""
+    minx, maxy = origin
+    cursor.execute(
+        f"SELECT string_agg(p, '') FROM ("
+        f"SELECT DISTINCT 'M' || round((ST_X(d.geom) - %s) / %s) || ' ' || round((%s - ST_Y(d.geom)) / %s) || 'h0' AS p "
+        f"FROM {table}, LATERAL ST_Dump(geom) d WHERE geom IS NOT NULL LIMIT %s) s",
+        [minx, pixel, maxy, pixel, max_features]
+    )
+    d = cursor.fetchone()[0]
+    return POINT_PATH.format(d=d) if d else None
+
+
+def _shape_paths(cursor, table: str, origin, pixel: float, max_features: int) -> str:
+    """Line and polygon paths, the max_features largest features simplified to a pixel"""
+    minx, maxy = origin
+    cursor.execute(
+        f"SELECT ST_Dimension(g), string_agg(ST_AsSVG(g, 0, 1), ' ') FROM ("
+        f"SELECT ST_Simplify(ST_Scale(ST_Translate(geom, %s, %s), %s, %s), 0.5, true) AS g FROM {table} "
+        f"WHERE geom IS NOT NULL "
+        f"ORDER BY ST_XMax(geom) - ST_XMin(geom) + ST_YMax(geom) - ST_YMin(geom) DESC LIMIT %s) s "
+        f"WHERE ST_Dimension(g) > 0 GROUP BY 1 ORDER BY 1 DESC",
+        [-minx, -maxy, 1 / pixel, 1 / pixel, max_features]
+    )
+    return ''.join(
+        (POLYGON_PATH if dimension == 2 else LINE_PATH).format(d=d)
+        for dimension, d in cursor.fetchall()
+        if d
+    )
+
+
+def render_svg(import_record) -> str:
+    """Render an SVG thumbnail of an imported layer in PostGIS
+
+    Features are moved to pixel coordinates, simplified to half a pixel and
+    serialized with ST_AsSVG on the server, so only the finished path data is
+    fetched. Point layers draw one dot per occupied pixel. At most
+    GEOIMPORTER_THUMBNAIL_MAX_FEATURES features are drawn, the largest first.
+    """
+    from .layer_extent import compute_extent
+
+    size = getattr(settings, 'GEOIMPORTER_THUMBNAIL_SIZE', 256)
+    max_features = getattr(settings, 'GEOIMPORTER_THUMBNAIL_MAX_FEATURES', 5000)
+
+    extent = import_record.extent or compute_extent(import_record)
+    paths = ''
+    width = height = size
+    if extent:
+        minx, miny, maxx, maxy = extent
+        span = max(maxx - minx, maxy - miny)
+        pixel = span / size if span > 0 else 1.0
+        width = max((maxx - minx) / pixel, 1)
+        height = max((maxy - miny) / pixel, 1)
+
+        catalog = get_catalog([import_record]).get(import_record.id) or {}
+        table = connections['datastore'].ops.quote_name(import_record.table_name)
+        with connections['datastore'].cursor() as cursor:
+            if 'POINT' in (catalog.get('geometry_type') or '').upper():
+                paths = _point_paths(cursor, table, (minx, maxy), pixel, max_features) or ''
+            else:
+                paths = _shape_paths(cursor, table, (minx, maxy), pixel, max_features)
+
+    return SVG_TEMPLATE.format(
+        size=size,
+        viewbox=f"{-MARGIN} {-MARGIN} {width + 2 * MARGIN:g} {height + 2 * MARGIN:g}",
+        minx=-MARGIN,
+        miny=-MARGIN,
+        width=f"{width + 2 * MARGIN:g}",
+        height=f"{height + 2 * MARGIN:g}",
+        paths=paths
+    )
+
+
+def generate_thumbnail(import_record) -> bytes:
+    """Render the thumbnail of an import and store it for the current table_version"""
+    content = render_svg(import_record).encode()
+    if import_record.thumbnail:
+        import_record.thumbnail.delete(save=False)
+    import_record.thumbnail.save(f"{import_record.table_name}.svg", ContentFile(content), save=False)
+    import_record.thumbnail_version = import_record.table_version
+    import_record.save(update_fields=['thumbnail', 'thumbnail_version'])
+    return content
+
+
+def get_thumbnail(import_record, refresh: bool = False) -> bytes:
+    """Stored thumbnail of an import, rendered again when the table changed since"""
+    if (
+        not refresh
+        and import_record.thumbnail
+        and import_record.thumbnail_version == import_record.table_version
+    ):
+        try:
+            with import_record.thumbnail.open('rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+    return generate_thumbnail(import_record)
@@ -0,0 +1,165 @@
+from typing import Any, Dict, List, Optional, Tuple
+from django.db import DataError, connections
+
+# Integer types from the tightest, with their range
+INTEGER_TYPES = [
+    ('smallint', -2 ** 15, 2 ** 15 - 1),
+    ('integer', -2 ** 31, 2 ** 31 - 1),
+    ('bigint', -2 ** 63, 2 ** 63 - 1),
+]
+
+# Storage size of the fixed-width types; numeric and text are treated as wider than all of them
+TYPE_SIZES = {
+    'boolean': 1,
+    'smallint': 2,
+    'integer': 4,
+    'date': 4,
+    'real': 4,
+    'bigint': 8,
+    'double precision': 8,
+}
+
+NUMBER_TYPES = ('numeric', 'double precision', 'real', 'bigint', 'integer')
+TEXT_TYPES = ('character varying', 'character', 'text')
+
+INTEGER_PATTERN = r'^-?[0-9]{1,18}$'
+FLOAT_PATTERN = r'^-?[0-9]+(\.[0-9]+)?$'
+DATE_PATTERN = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'
+BOOLEAN_VALUES = ('true', 'false', 't', 'f', 'yes', 'no', 'y', 'n')
+
+
+def _attribute_columns(cursor, table_name: str) -> List[Tuple[str, str]]:
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s AND column_name <> 'gid' "
+        "AND data_type = ANY(%s) ORDER BY ordinal_position",
+        [table_name, list(NUMBER_TYPES + TEXT_TYPES)]
+    )
+    return cursor.fetchall()
+
+
+def _profile_sql(column: str, data_type: str) -> List[str]:
+    """Aggregates profiling one column, always five of them so results can be split evenly
+
+    Numbers: all integral, min, max, exact as float8. Text: all integers
+    (written canonically, so leading zeros are kept as text), min, max, all
+    canonical floats, and the first of all booleans / all ISO dates. NULL and
+    blank values are skipped by every test.
+    """
+    if data_type in NUMBER_TYPES:
+        exact_float = (
+            f"bool_and({column}::float8::numeric = {column})" if data_type == 'numeric' else "true"
+        )
+        return [
+            f"bool_and({column} = trunc({column}))",
+            f"min({column})::numeric",
+            f"max({column})::numeric",
+            exact_float,
+            "NULL",
+        ]
+
+    value = f"NULLIF(btrim({column}), '')"
+    integer = f"CASE WHEN {value} ~ '{INTEGER_PATTERN}' THEN {value}::int8 END"
+    return [
+        f"bool_and(CASE WHEN {value} IS NULL THEN NULL WHEN {value} ~ '{INTEGER_PATTERN}' THEN {value}::int8::text = {value} ELSE false END)",
+        f"min({integer})::numeric",
+        f"max({integer})::numeric",
+        f"bool_and(CASE WHEN {value} IS NULL THEN NULL WHEN {value} ~ '{FLOAT_PATTERN}' THEN {value}::float8::text = {value} ELSE false END)",
+        f"CASE WHEN bool_and(lower({value}) IN ({', '.join(repr(v) for v in BOOLEAN_VALUES)})) THEN 'boolean' "
+        f"WHEN bool_and({value} ~ '{DATE_PATTERN}') THEN 'date' END",
+    ]
+
+
+def _integer_type(minimum, maximum) -> Optional[str]:
+    for type_name, low, high in INTEGER_TYPES:
+        if low <= minimum and maximum <= high:
+            return type_name
+    return None
+
+
+def _target_type(data_type: str, profile: tuple) -> Optional[str]:
+    """Tightest type holding every value of a profiled column, None to keep it"""
+    integral, minimum, maximum, exact_float, other = profile
+    if integral is None and other is None:
+        # No values at all
+        return None
+
+    if integral and minimum is not None:
+        target = _integer_type(minimum, maximum)
+    elif exact_float:
+        target = 'double precision'
+    else:
+        target = other
+
+    if target is None or target == data_type:
+        return None
+    if data_type in TYPE_SIZES and TYPE_SIZES[target] >= TYPE_SIZES[data_type]:
+        return None
+    return target
+
+
+def _using(column: str, data_type: str, target: str) -> str:
+    if data_type in TEXT_TYPES:
+        value = f"NULLIF(btrim({column}), '')"
+        if target == 'boolean':
+            value = f"lower({value})"
+        return f"{value}::{target}"
+    return f"{column}::{target}"
+
+
+def _table_size(cursor, table_name: str) -> int:
+    cursor.execute("SELECT pg_total_relation_size(to_regclass(%s))", [connections['datastore'].ops.quote_name(table_name)])
+    return cursor.fetchone()[0] or 0
+
+
+def narrow_table(table_name: str) -> Dict[str, Any]:
+    """Convert attribute columns to the tightest type their values allow
+
+    Every numeric and text attribute is profiled in one scan of the table,
+    then all the narrowed columns are converted by one ALTER TABLE, so the
+    table is rewritten once. Returns the conversions and the table size
+    before and after.
+    """
+    quote = connections['datastore'].ops.quote_name
+    table = quote(table_name)
+
+    with connections['datastore'].cursor() as cursor:
+        bytes_before = _table_size(cursor, table_name)
+        columns = _attribute_columns(cursor, table_name)
+        report = {'columns': {}, 'bytes_before': bytes_before, 'bytes_after': bytes_before}
+        if not columns:
+            return report
+
+        aggregates = [sql for name, data_type in columns for sql in _profile_sql(quote(name), data_type)]
+        cursor.execute(f"SELECT {', '.join(aggregates)} FROM {table}")
+        row = cursor.fetchone()
+
+        targets = {}
+        for index, (name, data_type) in enumerate(columns):
+            target = _target_type(data_type, row[index * 5:index * 5 + 5])
+            if target:
+                targets[name] = (data_type, target)
+
+        while targets:
+            alterations = ', '.join(
+                f"ALTER COLUMN {quote(name)} TYPE {target} USING {_using(quote(name), data_type, target)}"
+                for name, (data_type, target) in targets.items()
+            )
+            try:
+                cursor.execute(f"ALTER TABLE {table} {alterations}")
+                break
+            except DataError as e:
+                # A date shaped string that is not a valid date, keep those columns as text
+                dates = [name for name, (_, target) in targets.items() if target == 'date']
+                if not dates:
+                    raise
+                print(f"Keeping date columns of {table_name} as text: {str(e).splitlines()[0]}")
+                for name in dates:
+                    del targets[name]
+
+        if targets:
+            cursor.execute(f"ANALYZE {table}")
+            report['bytes_after'] = _table_size(cursor, table_name)
+        report['columns'] = {name: list(types) for name, types in targets.items()}
+
+    return report